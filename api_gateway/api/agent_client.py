@@ -0,0 +1,130 @@
+# api/agent_client.py
+import asyncio
+import importlib.util
+
+import httpx
+from django.conf import settings
+
+from .agent_pool import AgentPool
+from .metrics import on_agent_request, on_agent_response
+from .redis_client import close_redis
+
+# HTTP/2 solo si el paquete 'h2' está instalado (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+agent_pool = AgentPool(
+    settings.AGENT_URLS,
+    vnodes=settings.AGENT_RING_VNODES,
+    down_cooldown=settings.AGENT_DOWN_COOLDOWN,
+)
+
+# Un cliente por réplica, todos ligados al mismo event loop
+_clients = {}
+_clients_loop = None
+_health_task = None
+
+
+def _create_client(url: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=url,
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(
+            settings.AGENT_READ_TIMEOUT,
+            connect=settings.AGENT_CONNECT_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.AGENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AGENT_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.AGENT_KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={"request": [on_agent_request], "response": [on_agent_response]},
+    )
+
+
+def get_agent_client(thread_id: str = None) -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP compartido hacia la réplica del agente que
+    atiende `thread_id` (hashing consistente, ver api/agent_pool.py).
+
+    Los clientes se crean una sola vez por event loop y se reutilizan en
+    vistas y consumers, de modo que las conexiones (keep-alive) se mantienen
+    entre peticiones y turnos de chat en lugar de abrir una conexión TCP
+    nueva cada vez. Con varias réplicas se arranca además el health check.
+    """
+    global _clients, _clients_loop, _health_task
+    loop = asyncio.get_running_loop()
+
+    if _clients_loop is not loop:
+        _clients = {}
+        _clients_loop = loop
+        _health_task = None
+    if _health_task is None and len(agent_pool.urls) > 1:
+        _health_task = loop.create_task(_health_check_loop())
+
+    url = agent_pool.route(thread_id)
+    client = _clients.get(url)
+    if client is None or client.is_closed:
+        client = _clients[url] = _create_client(url)
+    return client
+
+
+def report_agent_failure(client: httpx.AsyncClient) -> None:
+    """
+    Saca del anillo la réplica de `client` tras un error de conexión, para
+    que los siguientes turnos de sus hilos vayan a la siguiente réplica.
+    """
+    for url, pooled in _clients.items():
+        if pooled is client:
+            agent_pool.mark_down(url)
+
+
+async def _check_replica(url: str) -> None:
+    client = _clients.get(url)
+    if client is None or client.is_closed:
+        client = _clients[url] = _create_client(url)
+    try:
+        response = await client.get("/ok", timeout=settings.AGENT_HEALTH_TIMEOUT)
+        healthy = response.status_code == 200
+    except httpx.HTTPError:
+        healthy = False
+
+    if healthy:
+        agent_pool.mark_up(url)
+    else:
+        agent_pool.mark_down(url)
+
+
+async def _health_check_loop() -> None:
+    """Comprueba periódicamente el endpoint '/ok' de cada réplica."""
+    while True:
+        await asyncio.gather(*(_check_replica(url) for url in agent_pool.urls))
+        await asyncio.sleep(settings.AGENT_HEALTH_INTERVAL)
+
+
+async def close_agent_client() -> None:
+    """Cierra los clientes compartidos y libera sus conexiones."""
+    global _clients, _clients_loop, _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+    for client in _clients.values():
+        if not client.is_closed:
+            await client.aclose()
+    _clients = {}
+    _clients_loop = None
+    _health_task = None
+
+
+async def lifespan_app(scope, receive, send):
+    """
+    Aplicación ASGI para los eventos 'lifespan'.
+    Cierra los clientes compartidos (agente y Redis) cuando el servidor se apaga.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_agent_client()
+            await close_redis()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,85 @@
+# api/agent_pool.py
+import bisect
+import hashlib
+import time
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Anillo de hashing consistente sobre las URLs de las réplicas del agente.
+
+    Cada réplica ocupa `vnodes` puntos del anillo, así que al añadir o quitar
+    una réplica solo cambia de destino la fracción de hilos que le
+    corresponde (~1/N); el resto sigue yendo a la misma réplica.
+    """
+
+    def __init__(self, nodes, vnodes: int = 100):
+        self.nodes = list(dict.fromkeys(nodes))
+        self._points = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    def nodes_for(self, key: str) -> list:
+        """Réplicas en orden de preferencia para `key` (sentido horario)."""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._keys, _hash(key))
+        ordered = []
+        for offset in range(len(self._points)):
+            node = self._points[(start + offset) % len(self._points)][1]
+            if node not in ordered:
+                ordered.append(node)
+                if len(ordered) == len(self.nodes):
+                    break
+        return ordered
+
+
+class AgentPool:
+    """
+    Pool de réplicas del agente con afinidad por hilo.
+
+    Los turnos de un mismo `thread_id` van siempre a la misma réplica
+    (cachés calientes). Si está caída, se usa la siguiente del anillo y el
+    hilo vuelve a su réplica en cuanto ésta pasa el health check.
+    """
+
+    def __init__(self, urls, vnodes: int = 100, down_cooldown: float = 30):
+        self.ring = HashRing(urls, vnodes)
+        self.down_cooldown = down_cooldown
+        self._down_until = {}
+
+    @property
+    def urls(self) -> list:
+        return self.ring.nodes
+
+    def is_healthy(self, url: str) -> bool:
+        return self._down_until.get(url, 0) <= time.monotonic()
+
+    def mark_down(self, url: str) -> None:
+        if self.is_healthy(url):
+            print(f"Réplica del agente no disponible: {url}")
+        self._down_until[url] = time.monotonic() + self.down_cooldown
+
+    def mark_up(self, url: str) -> None:
+        if self._down_until.pop(url, None) is not None:
+            print(f"Réplica del agente recuperada: {url}")
+
+    def any_healthy(self) -> bool:
+        return any(self.is_healthy(url) for url in self.urls)
+
+    def route(self, thread_id: str = None) -> str:
+        """
+        URL de la réplica para `thread_id` (la primera sana en el anillo).
+        Sin `thread_id` se usa la primera réplica sana de la lista. Si todas
+        están caídas se devuelve la preferida y el error llega al llamador.
+        """
+        candidates = self.ring.nodes_for(thread_id) if thread_id else self.urls
+        for url in candidates:
+            if self.is_healthy(url):
+                return url
+        return candidates[0]
@@ -0,0 +1,145 @@
+# api/agent_stream.py
+import json
+import time
+
+import httpx
+from django.conf import settings
+
+from .redis_client import get_redis
+from .tracing import current_traceparent
+
+# Modos de streaming pedidos al servidor de LangGraph:
+# - updates: qué nodo terminó y qué escribió (incluye '__interrupt__')
+# - messages-tuple: tokens del LLM a medida que se generan
+# - custom: eventos de progreso estructurados de los nodos (agent/progress.py)
+STREAM_MODES = ["updates", "messages-tuple", "custom"]
+
+# Misma clave que lee el agente (agent/cancellation.py)
+CANCEL_KEY_PREFIX = "agent_cancel:"
+
+
+async def request_cancel(cancel_key: str) -> None:
+    """
+    Pide al agente que cancele la ejecución con esa clave. Los nodos de la
+    búsqueda de financiación la leen, abortan sus llamadas en curso y el hilo
+    termina en la selección con los resultados parciales.
+    """
+    await get_redis().set(f"{CANCEL_KEY_PREFIX}{cancel_key}", "1", ex=settings.AGENT_CANCEL_TTL)
+
+
+async def stream_agent_run(client: httpx.AsyncClient, thread_id: str, resume_value, user_id: str,
+                           cancel_key: str = None):
+    """
+    Reanuda el hilo en el agente usando el endpoint de streaming y
+    produce los eventos SSE como tuplas (evento, datos).
+    """
+    body = {
+        "assistant_id": settings.AGENT_ASSISTANT_ID,
+        "command": {"resume": resume_value},
+        # Presupuesto diario del usuario en el agente (agent/budget.py) y
+        # clave para cancelar la ejecución (agent/cancellation.py)
+        "config": {"configurable": {"user_id": user_id, "cancel_key": cancel_key}},
+        # Si se corta el stream, la ejecución sigue hasta un checkpoint
+        # coherente; para pararla antes se usa request_cancel
+        "on_disconnect": "continue",
+        "stream_mode": STREAM_MODES,
+        # La traza del agente continúa la del gateway (ver api/tracing.py)
+        "metadata": current_traceparent(),
+    }
+    timeout = httpx.Timeout(settings.AGENT_STREAM_READ_TIMEOUT, connect=settings.AGENT_CONNECT_TIMEOUT)
+
+    async with client.stream("POST", f"/threads/{thread_id}/runs/stream", json=body, timeout=timeout) as response:
+        response.raise_for_status()
+
+        event, data_lines = None, []
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
+            elif not line and event:
+                # Línea vacía: fin del evento SSE
+                raw = "\n".join(data_lines)
+                try:
+                    data = json.loads(raw) if raw else None
+                except json.JSONDecodeError:
+                    data = raw
+                yield event, data
+                event, data_lines = None, []
+
+
+def frames_for_event(event: str, data) -> list:
+    """
+    Traduce un evento del agente (que no sea de tokens) a frames para el WebSocket.
+    Nunca reenvía el estado completo: solo el nodo, las claves escritas y los mensajes nuevos.
+    """
+    frames = []
+    if event == "updates" and isinstance(data, dict):
+        for node, update in data.items():
+            if node == "__interrupt__":
+                frames.append({
+                    'type': 'interrupt',
+                    'payload': [item.get("value") if isinstance(item, dict) else item for item in update]
+                })
+                continue
+
+            update = update if isinstance(update, dict) else {}
+            frames.append({
+                'type': 'node_progress',
+                'payload': {'node': node, 'keys': sorted(update.keys())}
+            })
+            for message in update.get("messages") or []:
+                content = message.get("content") if isinstance(message, dict) else None
+                if content and message.get("type", message.get("role")) in ("ai", "assistant"):
+                    frames.append({'type': 'agent_message', 'payload': {'node': node, 'content': content}})
+
+    elif event == "custom" and isinstance(data, dict) and data.get("type") == "progress":
+        frames.append({'type': 'progress', 'payload': data})
+
+    elif event == "error":
+        frames.append({'type': 'error', 'message': data})
+
+    return frames
+
+
+class TokenCoalescer:
+    """
+    Agrupa los tokens del LLM para no enviar un frame por token.
+    Se vacía cuando pasa 'interval' segundos o se acumulan 'max_chars' caracteres.
+    """
+
+    def __init__(self, interval: float, max_chars: int = 400):
+        self.interval = interval
+        self.max_chars = max_chars
+        self._node = None
+        self._parts = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, data) -> list:
+        """Añade un evento 'messages' y devuelve los frames que toque enviar."""
+        if not isinstance(data, list) or len(data) != 2:
+            return []
+        chunk, metadata = data
+        content = chunk.get("content") if isinstance(chunk, dict) else None
+        if not isinstance(content, str) or not content:
+            return []
+
+        node = (metadata or {}).get("langgraph_node")
+        frames = self.flush() if node != self._node else []
+        self._node = node
+        self._parts.append(content)
+        self._size += len(content)
+
+        if self._size >= self.max_chars or time.monotonic() - self._last_flush >= self.interval:
+            frames.extend(self.flush())
+        return frames
+
+    def flush(self) -> list:
+        """Devuelve el frame con los tokens pendientes (si hay) y reinicia el buffer."""
+        self._last_flush = time.monotonic()
+        if not self._parts:
+            return []
+        frame = {'type': 'token', 'payload': {'node': self._node, 'content': "".join(self._parts)}}
+        self._parts, self._size = [], 0
+        return [frame]
@@ -1,18 +1,35 @@
 # api/consumers.py
+import asyncio
 import json
+import uuid
 import httpx # Un cliente HTTP moderno y asíncrono. ¡Añádelo a requirements.txt!
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from opentelemetry.trace import Status, StatusCode
 
-# El nombre del servicio de tu agente en docker-compose
-AGENT_URL = "http://agent:8000"
+from .agent_client import get_agent_client, report_agent_failure
+from .agent_stream import stream_agent_run, frames_for_event, request_cancel, TokenCoalescer
+from .thread_status import mark_stale
+from .job_queue import get_user_key
+from .metrics import WS_MESSAGES, RUN_ERRORS, RUN_CANCELLATIONS
+from .tracing import tracer
 
 class ChatConsumer(AsyncWebsocketConsumer):
     # Se llama cuando el frontend intenta conectar
     async def connect(self):
         # Extrae el 'thread_id' de la URL que definimos en routing.py
         self.thread_id = self.scope['url_route']['kwargs']['thread_id']
+        client_address = self.scope.get('client')
+        self.user_key = get_user_key(self.scope.get('user'), client_address[0] if client_address else None)
         self.room_group_name = f'chat_{self.thread_id}'
 
+        # Cola de envío acotada por socket: si el cliente es lento, la lectura
+        # del stream del agente se frena en lugar de acumular memoria.
+        self.send_queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.sender_task = asyncio.create_task(self._drain_send_queue())
+        self.run_task = None
+        self.cancel_key = None
+
         # Une este WebSocket a un "grupo" específico.
         # Esto nos permitirá enviar mensajes a este cliente desde cualquier parte de Django.
         await self.channel_layer.group_add(
@@ -26,6 +43,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # Se llama cuando la conexión se cierra
     async def disconnect(self, close_code):
+        # Pedir al agente que pare la búsqueda en curso (deja el hilo en la
+        # selección con lo encontrado) y dejar de leer el stream
+        await self._cancel_run("disconnect")
+        for task in (self.run_task, self.sender_task):
+            if task and not task.done():
+                task.cancel()
+
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -39,36 +63,104 @@ class ChatConsumer(AsyncWebsocketConsumer):
         payload = data.get('payload')   # ej: el texto del chat, la lista de índices [0, 1]
 
         print(f"Recibido desde el cliente ({self.thread_id}): {data}")
+        WS_MESSAGES.labels("in", message_type or "unknown").inc()
+
+        if message_type == 'cancel':
+            if not await self._cancel_run("user"):
+                await self._enqueue({'type': 'error', 'message': "No hay ninguna ejecución en curso."})
+            return
 
-        # Aquí es donde orquestas la llamada al agente LangGraph.
-        # Por ahora, es una lógica simple. Esto se volverá más complejo
-        # para manejar los 'interrupts' y el streaming de eventos.
-        
-        # Ejemplo: reanudar una ejecución con el input del usuario
-        # LangServe expone endpoints para actualizar un estado existente
-        update_url = f"{AGENT_URL}/threads/{self.thread_id}/update"
+        if self.run_task and not self.run_task.done():
+            await self._enqueue({
+                'type': 'error',
+                'message': "El agente todavía está procesando la petición anterior."
+            })
+            return
 
-        async with httpx.AsyncClient(timeout=None) as client:
+        # La ejecución se retransmite en segundo plano: 'receive' vuelve enseguida
+        # y el socket sigue atendiendo mensajes mientras el agente trabaja.
+        # La tarea hereda el span del mensaje, así que su traza cuelga de él.
+        with tracer.start_as_current_span("ws.receive", attributes={"thread_id": self.thread_id, "ws.message_type": message_type or "unknown"}):
+            self.run_task = asyncio.create_task(self._relay_run(payload))
+
+    async def _relay_run(self, payload):
+        """
+        Reanuda el hilo con el input del usuario y reenvía al socket, a medida
+        que llegan, el progreso de los nodos, los tokens y las interrupciones.
+        """
+        coalescer = TokenCoalescer(interval=settings.WS_TOKEN_FLUSH_INTERVAL)
+        # Réplica del agente con afinidad por hilo
+        client = get_agent_client(self.thread_id)
+        # Clave con la que esta ejecución (y solo esta) se puede cancelar
+        self.cancel_key = uuid.uuid4().hex
+        with tracer.start_as_current_span("agent.run.relay", attributes={"thread_id": self.thread_id}) as span:
             try:
-                # El 'input' aquí es lo que el grafo espera para continuar
-                # desde una interrupción.
-                response = await client.post(update_url, json={"input": payload})
-                response.raise_for_status()
-                
-                # La respuesta del agente puede ser un flujo de eventos.
-                # Por simplicidad, aquí solo enviamos el resultado final.
-                # En la versión final, procesarías el stream.
-                agent_response = response.json()
-
-                # Enviar la respuesta del agente de vuelta al frontend
-                await self.send(text_data=json.dumps({
-                    'type': 'agent_response',
-                    'payload': agent_response
-                }))
-
-            except httpx.RequestError as e:
+                async for event, data in stream_agent_run(client, self.thread_id, payload, self.user_key, self.cancel_key):
+                    if event == "messages":
+                        frames = coalescer.add(data)
+                    else:
+                        frames = coalescer.flush() + frames_for_event(event, data)
+                    if event == "updates":
+                        # El estado compacto del hilo cambió: avisa a los clientes en long-polling
+                        await mark_stale(self.thread_id)
+                    for frame in frames:
+                        await self._enqueue(frame)
+
+                for frame in coalescer.flush():
+                    await self._enqueue(frame)
+                await mark_stale(self.thread_id)
+                await self._enqueue({'type': 'run_complete'})
+
+            except httpx.HTTPError as e:
                 # Manejar errores de conexión con el agente
-                await self.send(text_data=json.dumps({
+                RUN_ERRORS.labels(type(e).__name__).inc()
+                span.record_exception(e)
+                span.set_status(Status(StatusCode.ERROR, str(e)))
+                if isinstance(e, httpx.ConnectError):
+                    # El siguiente turno irá a otra réplica
+                    report_agent_failure(client)
+                await self._enqueue({
                     'type': 'error',
                     'message': f"Error comunicándose con el agente: {e}"
-                }))
\ No newline at end of file
+                })
+            except Exception as e:
+                # Cualquier otro fallo (un evento mal formado, Redis caído...) también
+                # se informa al cliente; si no, la tarea muere en silencio y el socket
+                # se queda esperando. CancelledError no es Exception: sigue propagándose.
+                print(f"Error reenviando la ejecución del hilo {self.thread_id}: {e!r}")
+                RUN_ERRORS.labels(type(e).__name__).inc()
+                span.record_exception(e)
+                span.set_status(Status(StatusCode.ERROR, str(e)))
+                await self._enqueue({
+                    'type': 'error',
+                    'message': "Error interno al procesar la respuesta del agente."
+                })
+
+    async def _cancel_run(self, reason: str) -> bool:
+        """
+        Pide al agente que cancele la ejecución en curso. El stream sigue
+        abierto: el cliente recibe los resultados parciales y la interrupción
+        en la que queda el hilo. Devuelve False si no había ejecución.
+        """
+        if not self.run_task or self.run_task.done() or not self.cancel_key:
+            return False
+        try:
+            await request_cancel(self.cancel_key)
+        except Exception as e:
+            print(f"No se pudo cancelar la ejecución del hilo {self.thread_id}: {e}")
+            return False
+        RUN_CANCELLATIONS.labels(reason).inc()
+        if reason == "user":
+            await self._enqueue({'type': 'cancelling'})
+        return True
+
+    async def _enqueue(self, frame):
+        """Encola un frame para el socket (espera si la cola está llena)."""
+        await self.send_queue.put(frame)
+
+    async def _drain_send_queue(self):
+        """Envía al socket, en orden, los frames encolados."""
+        while True:
+            frame = await self.send_queue.get()
+            WS_MESSAGES.labels("out", frame.get("type", "unknown")).inc()
+            await self.send(text_data=json.dumps(frame))
@@ -0,0 +1,242 @@
+# api/job_queue.py
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+from django.conf import settings
+from opentelemetry.propagate import extract
+
+from .agent_client import agent_pool, get_agent_client, report_agent_failure
+from .redis_client import get_redis
+from .metrics import JOBS
+from .tracing import current_traceparent, tracer
+
+# Claves en Redis
+USERS_KEY = "project_jobs:users"            # anillo de usuarios con trabajos pendientes (round-robin)
+USER_QUEUE_PREFIX = "project_jobs:queue:"   # una lista FIFO por usuario
+PENDING_KEY = "project_jobs:pending"        # total de trabajos en cola
+RUNNING_KEY = "project_jobs:running"        # ZSET thread_id -> fin de la concesión (lease)
+PAUSED_KEY = "project_jobs:paused"          # existe mientras el agente está saturado
+JOB_PREFIX = "project_job:"                 # hash con el estado de cada trabajo
+
+# Encola el trabajo en la lista del usuario y añade al usuario al anillo si
+# no estaba. Rechaza (-1) si la cola global está llena.
+ENQUEUE_SCRIPT = """
+local pending = tonumber(redis.call('GET', KEYS[1]) or '0')
+if pending >= tonumber(ARGV[3]) then
+    return -1
+end
+local queue = ARGV[4] .. ARGV[1]
+redis.call('RPUSH', queue, ARGV[2])
+if redis.call('LLEN', queue) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+end
+return redis.call('INCR', KEYS[1])
+"""
+
+# Saca el siguiente trabajo respetando el límite global de ejecuciones:
+# toma el primer usuario del anillo, extrae su trabajo más antiguo y, si le
+# quedan más, lo devuelve al final del anillo (reparto justo entre usuarios).
+DEQUEUE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[2]) then
+    return false
+end
+local user = redis.call('LPOP', KEYS[1])
+if not user then
+    return false
+end
+local queue = ARGV[4] .. user
+local job = redis.call('LPOP', queue)
+if redis.call('LLEN', queue) > 0 then
+    redis.call('RPUSH', KEYS[1], user)
+end
+if not job then
+    return false
+end
+redis.call('DECR', KEYS[2])
+redis.call('ZADD', KEYS[3], ARGV[3], cjson.decode(job)['thread_id'])
+return job
+"""
+
+# Devuelve un trabajo al principio de la cola de su usuario (el agente estaba saturado)
+REQUEUE_SCRIPT = """
+local queue = ARGV[3] .. ARGV[1]
+redis.call('LPUSH', queue, ARGV[2])
+if redis.call('LLEN', queue) == 1 then
+    redis.call('LPUSH', KEYS[1], ARGV[1])
+end
+redis.call('INCR', KEYS[2])
+redis.call('ZREM', KEYS[3], cjson.decode(ARGV[2])['thread_id'])
+"""
+
+
+class QueueFullError(Exception):
+    """La cola de proyectos alcanzó PROJECT_QUEUE_MAX_PENDING."""
+
+
+class AgentSaturatedError(Exception):
+    """El agente rechazó la ejecución por estar sobrecargado."""
+
+
+def get_user_key(user, remote_addr) -> str:
+    """
+    Clave del usuario para el reparto de la cola y los presupuestos del agente:
+    su pk si hay sesión, si no su IP.
+    """
+    if user is not None and user.is_authenticated:
+        return str(user.pk)
+    return remote_addr or "anonymous"
+
+
+async def _set_job_status(thread_id: str, job_status: str, **fields) -> None:
+    redis_client = get_redis()
+    key = JOB_PREFIX + thread_id
+    await redis_client.hset(key, mapping={"status": job_status, f"{job_status}_at": time.time(), **fields})
+    await redis_client.expire(key, settings.THREAD_STATUS_EXPIRY)
+
+
+async def enqueue_project_start(user_key: str, thread_id: str, project_input: dict) -> int:
+    """
+    Encola el inicio de un proyecto y devuelve cuántos trabajos hay en cola.
+    Lanza QueueFullError si la cola está llena (backpressure hacia el cliente).
+    """
+    job = json.dumps({
+        "thread_id": thread_id,
+        "user": user_key,
+        "input": project_input,
+        # Contexto de traza de la petición original, para que el despacho cuelgue de ella
+        "trace": current_traceparent(),
+    })
+    pending = await get_redis().eval(
+        ENQUEUE_SCRIPT, 2, PENDING_KEY, USERS_KEY,
+        user_key, job, settings.PROJECT_QUEUE_MAX_PENDING, USER_QUEUE_PREFIX,
+    )
+    if pending < 0:
+        JOBS.labels("rejected").inc()
+        raise QueueFullError()
+    JOBS.labels("queued").inc()
+    await _set_job_status(thread_id, "queued", user=user_key)
+    return pending
+
+
+async def get_job_status(thread_id: str) -> dict:
+    """Estado del trabajo de inicio de un proyecto ({} si no existe)."""
+    return await get_redis().hgetall(JOB_PREFIX + thread_id)
+
+
+async def dequeue_job():
+    """Saca el siguiente trabajo si hay hueco bajo el límite global, o None."""
+    now = time.time()
+    job = await get_redis().eval(
+        DEQUEUE_SCRIPT, 3, USERS_KEY, PENDING_KEY, RUNNING_KEY,
+        now, settings.PROJECT_MAX_CONCURRENCY, now + settings.PROJECT_JOB_TIMEOUT + 60, USER_QUEUE_PREFIX,
+    )
+    return json.loads(job) if job else None
+
+
+async def requeue_job(job: dict) -> None:
+    """Devuelve un trabajo a la cabeza de la cola de su usuario."""
+    await get_redis().eval(
+        REQUEUE_SCRIPT, 3, USERS_KEY, PENDING_KEY, RUNNING_KEY,
+        job["user"], json.dumps(job), USER_QUEUE_PREFIX,
+    )
+    await _set_job_status(job["thread_id"], "queued")
+
+
+async def run_job(job: dict) -> None:
+    """
+    Crea el hilo en el servidor de LangGraph y lanza su primera ejecución.
+    La llamada dura hasta la primera interrupción, por eso usa
+    PROJECT_JOB_TIMEOUT y no el timeout normal.
+    """
+    with tracer.start_as_current_span("project_job", context=extract(job.get("trace", {})),
+                                      attributes={"thread_id": job["thread_id"]}):
+        await _start_thread(job)
+
+
+async def _post_to_agent(client: httpx.AsyncClient, path: str, body: dict, **kwargs) -> httpx.Response:
+    response = await client.post(path, json=body, **kwargs)
+    if response.status_code in (429, 503):
+        raise AgentSaturatedError(f"HTTP {response.status_code}")
+    response.raise_for_status()
+    return response
+
+
+async def _start_thread(job: dict) -> None:
+    thread_id = job["thread_id"]
+    # Clave para cancelar la ejecución (agent/cancellation.py), como en stream_agent_run
+    cancel_key = uuid.uuid4().hex
+    await _set_job_status(thread_id, "running", cancel_key=cancel_key)
+    client = get_agent_client(thread_id)
+    try:
+        # El hilo se crea con el id que ya tiene el cliente; si se reencoló, ya existe
+        await _post_to_agent(client, "/threads", {"thread_id": thread_id, "if_exists": "do_nothing"})
+        response = await _post_to_agent(
+            client,
+            f"/threads/{thread_id}/runs/wait",
+            {
+                "assistant_id": settings.AGENT_ASSISTANT_ID,
+                "input": job["input"],
+                "config": {
+                    # 'user_id' identifica el presupuesto diario del usuario en el agente
+                    "configurable": {"thread_id": thread_id, "user_id": job["user"], "cancel_key": cancel_key},
+                },
+                # Si el despacho se corta, la ejecución sigue hasta un checkpoint coherente
+                "on_disconnect": "continue",
+                "metadata": current_traceparent(),
+            },
+            timeout=httpx.Timeout(settings.PROJECT_JOB_TIMEOUT, connect=settings.AGENT_CONNECT_TIMEOUT),
+        )
+        result = response.json()
+        # /runs/wait responde 200 aunque la ejecución falle: el error viene en el cuerpo
+        if isinstance(result, dict) and result.get("__error__"):
+            raise httpx.HTTPError(f"La ejecución falló: {result['__error__']}")
+    except (AgentSaturatedError, httpx.ConnectError, httpx.PoolTimeout) as e:
+        # El agente no admite más trabajo: devolver el trabajo a la cola y pausar el despacho
+        print(f"Agente saturado al iniciar {thread_id} ({e}). Reencolando...")
+        JOBS.labels("requeued").inc()
+        await requeue_job(job)
+        if isinstance(e, httpx.ConnectError):
+            report_agent_failure(client)
+        if not isinstance(e, httpx.ConnectError) or not agent_pool.any_healthy():
+            # Solo se pausa si no queda otra réplica a la que enviar trabajo
+            await get_redis().set(PAUSED_KEY, "1", px=int(settings.PROJECT_QUEUE_BACKOFF * 1000))
+        return
+    except httpx.HTTPError as e:
+        print(f"Error al iniciar el proyecto {thread_id}: {e}")
+        JOBS.labels("failed").inc()
+        await _set_job_status(thread_id, "failed", error=str(e))
+    else:
+        JOBS.labels("started").inc()
+        await _set_job_status(thread_id, "started")
+    await get_redis().zrem(RUNNING_KEY, thread_id)
+
+
+async def run_dispatcher() -> None:
+    """
+    Bucle del despachador: vacía la cola hacia el agente.
+
+    El límite de ejecuciones simultáneas (PROJECT_MAX_CONCURRENCY) es global
+    porque se lleva en Redis, así que pueden correr varios despachadores.
+    Mientras el agente está saturado (PAUSED_KEY) no se saca ningún trabajo.
+    """
+    redis_client = get_redis()
+    tasks = set()
+    print(f"Despachador de proyectos iniciado (máx. {settings.PROJECT_MAX_CONCURRENCY} en paralelo).")
+    while True:
+        if await redis_client.exists(PAUSED_KEY):
+            await asyncio.sleep(settings.PROJECT_QUEUE_POLL_INTERVAL)
+            continue
+
+        job = await dequeue_job()
+        if job is None:
+            await asyncio.sleep(settings.PROJECT_QUEUE_POLL_INTERVAL)
+            continue
+
+        print(f"Despachando proyecto {job['thread_id']} (usuario {job['user']}).")
+        task = asyncio.create_task(run_job(job))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
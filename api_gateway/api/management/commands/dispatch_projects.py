@@ -0,0 +1,13 @@
+# api/management/commands/dispatch_projects.py
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from api.job_queue import run_dispatcher
+
+
+class Command(BaseCommand):
+    help = "Despacha hacia el agente los inicios de proyecto encolados en Redis."
+
+    def handle(self, *args, **options):
+        asyncio.run(run_dispatcher())
@@ -0,0 +1,69 @@
+# api/metrics.py
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+HTTP_DURATION = Histogram(
+    "gateway_http_request_duration_seconds", "Duración de las peticiones HTTP al gateway.",
+    ["view", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+AGENT_REQUEST_DURATION = Histogram(
+    "gateway_agent_request_duration_seconds", "Duración de las peticiones del gateway al agente (hasta las cabeceras).",
+    ["replica", "status"], buckets=LATENCY_BUCKETS,
+)
+WS_MESSAGES = Counter("gateway_ws_messages_total", "Mensajes de WebSocket.", ["direction", "type"])
+RUN_ERRORS = Counter("gateway_agent_run_errors_total", "Ejecuciones retransmitidas que fallaron.", ["error"])
+RUN_CANCELLATIONS = Counter("gateway_agent_run_cancellations_total", "Cancelaciones pedidas al agente.", ["reason"])
+CACHE_REQUESTS = Counter("gateway_cache_requests_total", "Consultas a cachés del gateway.", ["cache", "result"])
+JOBS = Counter("gateway_project_jobs_total", "Trabajos de inicio de proyecto por resultado.", ["result"])
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def _observe(request, response, start: float) -> None:
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match else "unmatched"
+    HTTP_DURATION.labels(view, request.method, response.status_code).observe(time.perf_counter() - start)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Mide la duración de cada petición HTTP, por vista, método y código."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            _observe(request, response, start)
+            return response
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            response = get_response(request)
+            _observe(request, response, start)
+            return response
+    return middleware
+
+
+async def on_agent_request(request) -> None:
+    """Hook de httpx: marca el inicio de la petición al agente."""
+    request.extensions["metrics_start"] = time.perf_counter()
+
+
+async def on_agent_response(response) -> None:
+    """Hook de httpx: registra la latencia hasta recibir las cabeceras."""
+    start = response.request.extensions.get("metrics_start")
+    if start is not None:
+        replica = f"{response.request.url.host}:{response.request.url.port}"
+        AGENT_REQUEST_DURATION.labels(replica, response.status_code).observe(time.perf_counter() - start)
+
+
+def metrics_view(request):
+    """Métricas Prometheus del gateway."""
+    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
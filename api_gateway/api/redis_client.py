@@ -0,0 +1,31 @@
+# api/redis_client.py
+import asyncio
+
+import redis.asyncio as redis
+from django.conf import settings
+
+_redis = None
+_redis_loop = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Devuelve el cliente Redis compartido (el mismo Redis que usa la capa de
+    Channels). Como el cliente HTTP del agente, se crea una vez por event loop.
+    """
+    global _redis, _redis_loop
+    loop = asyncio.get_running_loop()
+
+    if _redis is None or _redis_loop is not loop:
+        _redis = redis.from_url(settings.REDIS_URI, decode_responses=True)
+        _redis_loop = loop
+    return _redis
+
+
+async def close_redis() -> None:
+    """Cierra el cliente compartido y su pool de conexiones."""
+    global _redis, _redis_loop
+    if _redis is not None:
+        await _redis.aclose()
+    _redis = None
+    _redis_loop = None
@@ -1,3 +1,251 @@
-from django.test import TestCase
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
 
-# Create your tests here.
+import httpx
+
+from django.test import SimpleTestCase
+
+from .agent_stream import TokenCoalescer, frames_for_event
+from .thread_status import project_status, etag_for
+from .agent_pool import AgentPool, HashRing
+from .job_queue import QueueFullError, run_job
+from .consumers import ChatConsumer
+from .metrics import RUN_ERRORS
+from . import agent_client
+
+
+class TokenCoalescerTests(SimpleTestCase):
+    def token(self, content, node="chat_responder"):
+        return [{"content": content}, {"langgraph_node": node}]
+
+    def test_tokens_are_grouped_until_flush(self):
+        coalescer = TokenCoalescer(interval=60)
+        self.assertEqual(coalescer.add(self.token("Hola")), [])
+        self.assertEqual(coalescer.add(self.token(", mundo")), [])
+        self.assertEqual(
+            coalescer.flush(),
+            [{'type': 'token', 'payload': {'node': 'chat_responder', 'content': 'Hola, mundo'}}],
+        )
+
+    def test_node_change_flushes_previous_node(self):
+        coalescer = TokenCoalescer(interval=60)
+        coalescer.add(self.token("a", node="chat_responder"))
+        frames = coalescer.add(self.token("b", node="generate_specific_report"))
+        self.assertEqual(frames[0]['payload'], {'node': 'chat_responder', 'content': 'a'})
+
+
+class FramesForEventTests(SimpleTestCase):
+    def test_interrupt_and_progress_frames(self):
+        frames = frames_for_event("updates", {"__interrupt__": [{"value": {"status": "ready"}}]})
+        self.assertEqual(frames, [{'type': 'interrupt', 'payload': [{"status": "ready"}]}])
+
+        frames = frames_for_event("updates", {"chat_responder": {
+            "next_action": "continue",
+            "messages": [{"role": "assistant", "content": "Hola"}],
+        }})
+        self.assertEqual(frames[0], {'type': 'node_progress', 'payload': {'node': 'chat_responder', 'keys': ['messages', 'next_action']}})
+        self.assertEqual(frames[1], {'type': 'agent_message', 'payload': {'node': 'chat_responder', 'content': 'Hola'}})
+
+
+class ProjectStatusTests(SimpleTestCase):
+    def test_interrupted_thread_is_projected_without_full_lists(self):
+        state = {
+            "values": {
+                "messages": [{"id": "m1"}, {"id": "m2"}],
+                "academic_papers": [{}, {}, {}],
+                "investment_opportunities": [{}],
+            },
+            "next": ["chat_responder"],
+            "tasks": [{"name": "chat_responder", "interrupts": [{"value": {"status": "ready"}}]}],
+        }
+        status = project_status("t1", state)
+        self.assertEqual(status["status"], "interrupted")
+        self.assertEqual(status["node"], "chat_responder")
+        self.assertEqual(status["interrupt"], {"status": "ready"})
+        self.assertEqual(status["last_message_id"], "m2")
+        self.assertEqual(status["counters"]["academic_papers"], 3)
+        self.assertEqual(status["counters"]["search_results"], 0)
+
+    def test_etag_follows_version(self):
+        self.assertEqual(etag_for({"thread_id": "t1", "version": 4}), '"t1-4"')
+
+
+
+class AgentPoolTests(SimpleTestCase):
+    urls = ["http://agent-1:8000", "http://agent-2:8000", "http://agent-3:8000"]
+
+    def test_adding_a_replica_only_moves_its_share_of_threads(self):
+        threads = [f"thread-{i}" for i in range(1000)]
+        before = HashRing(self.urls)
+        after = HashRing(self.urls + ["http://agent-4:8000"])
+        moved = [t for t in threads if before.nodes_for(t)[0] != after.nodes_for(t)[0]]
+        self.assertTrue(all(after.nodes_for(t)[0] == "http://agent-4:8000" for t in moved))
+        self.assertLess(len(moved), 400)
+
+    def test_failover_and_return_to_preferred_replica(self):
+        pool = AgentPool(self.urls)
+        preferred = pool.route("thread-42")
+        pool.mark_down(preferred)
+        self.assertNotEqual(pool.route("thread-42"), preferred)
+        pool.mark_up(preferred)
+        self.assertEqual(pool.route("thread-42"), preferred)
+
+
+class ProjectJobViewTests(SimpleTestCase):
+    payload = {"project_title": "Casco autónomo", "project_description": "Inspección de cascos con drones."}
+
+    def test_start_is_queued_with_202(self):
+        with patch("api.views.enqueue_project_start", AsyncMock(return_value=3)) as enqueue:
+            response = self.client.post("/api/projects/start/", self.payload, content_type="application/json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "queued")
+        self.assertEqual(response.json()["queued_jobs"], 3)
+        self.assertEqual(enqueue.await_args.args[1], response.json()["thread_id"])
+
+    def test_full_queue_answers_429_with_retry_after(self):
+        with patch("api.views.enqueue_project_start", AsyncMock(side_effect=QueueFullError())):
+            response = self.client.post("/api/projects/start/", self.payload, content_type="application/json")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+
+    def test_job_status(self):
+        job = {"status": "running", "user": "127.0.0.1"}
+        with patch("api.views.get_job_status", AsyncMock(return_value=job)):
+            response = self.client.get("/api/projects/t1/job/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"thread_id": "t1", **job})
+
+        with patch("api.views.get_job_status", AsyncMock(return_value={})):
+            self.assertEqual(self.client.get("/api/projects/t1/job/").status_code, 404)
+
+
+class FakePubSub:
+    """PubSub de Redis sin mensajes: get_message solo espera su timeout."""
+
+    async def subscribe(self, channel):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=0):
+        await asyncio.sleep(timeout)
+
+    async def unsubscribe(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class ThreadStatusViewTests(SimpleTestCase):
+    snapshot = {"thread_id": "t1", "version": 4, "status": "interrupted", "node": "chat_responder"}
+
+    def test_status_and_not_modified(self):
+        with patch("api.views.get_thread_status", AsyncMock(return_value=self.snapshot)):
+            response = self.client.get("/api/threads/t1/status/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), self.snapshot)
+            self.assertEqual(response.headers["ETag"], '"t1-4"')
+
+            response = self.client.get("/api/threads/t1/status/", HTTP_IF_NONE_MATCH='"t1-4"')
+            self.assertEqual(response.status_code, 304)
+
+    def test_long_poll_returns_the_same_version_after_timeout(self):
+        redis_client = MagicMock()
+        redis_client.pubsub.return_value = FakePubSub()
+        with patch("api.thread_status.get_thread_status", AsyncMock(return_value=self.snapshot)), \
+                patch("api.thread_status.get_redis", return_value=redis_client):
+            started = time.monotonic()
+            response = self.client.get("/api/threads/t1/status/?wait=4&timeout=0.2")
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 4)
+
+
+class RunJobTests(SimpleTestCase):
+    job = {"thread_id": "t1", "user": "u1", "input": {"project_title": "Casco"}, "trace": {}}
+
+    def run_job(self, *responses):
+        client = MagicMock()
+        request = httpx.Request("POST", "http://agent:8000")
+        client.post = AsyncMock(side_effect=[httpx.Response(code, json=body, request=request) for code, body in responses])
+        set_status = AsyncMock()
+        with patch("api.job_queue.get_agent_client", return_value=client), \
+                patch("api.job_queue._set_job_status", set_status), \
+                patch("api.job_queue.get_redis", return_value=AsyncMock()):
+            asyncio.run(run_job(self.job))
+        return client.post.await_args_list, set_status.await_args_list
+
+    def test_thread_is_created_and_run_on_the_langgraph_api(self):
+        calls, statuses = self.run_job((200, {"thread_id": "t1"}), (200, {"messages": []}))
+        self.assertEqual(calls[0].args[0], "/threads")
+        self.assertEqual(calls[0].kwargs["json"]["thread_id"], "t1")
+        self.assertEqual(calls[1].args[0], "/threads/t1/runs/wait")
+        configurable = calls[1].kwargs["json"]["config"]["configurable"]
+        self.assertEqual(configurable["thread_id"], "t1")
+        self.assertEqual(configurable["user_id"], "u1")
+        self.assertEqual(configurable["cancel_key"], statuses[0].kwargs["cancel_key"])
+        self.assertEqual(statuses[-1].args[1], "started")
+
+    def test_failed_run_marks_the_job_failed(self):
+        _, statuses = self.run_job((200, {"thread_id": "t1"}), (200, {"__error__": {"error": "ValueError"}}))
+        self.assertEqual(statuses[-1].args[1], "failed")
+
+
+class RelayRunTests(SimpleTestCase):
+    def relay(self, stream):
+        consumer = ChatConsumer()
+        consumer.thread_id, consumer.user_key = "t1", "u1"
+        consumer.send_queue = asyncio.Queue()
+        with patch("api.consumers.get_agent_client"), \
+                patch("api.consumers.stream_agent_run", stream), \
+                patch("api.consumers.mark_stale", AsyncMock()):
+            asyncio.run(consumer._relay_run({"message": "hola"}))
+        frames = []
+        while not consumer.send_queue.empty():
+            frames.append(consumer.send_queue.get_nowait())
+        return frames
+
+    def test_unexpected_error_is_reported_to_the_client(self):
+        async def stream(*args):
+            yield "updates", {"chat_responder": {"next_action": "continue"}}
+            raise KeyError("event")
+
+        errors = RUN_ERRORS.labels("KeyError")
+        before = errors._value.get()
+        frames = self.relay(stream)
+        self.assertEqual(frames[-1]["type"], "error")
+        self.assertEqual(errors._value.get(), before + 1)
+
+    def test_cancellation_propagates(self):
+        async def stream(*args):
+            raise asyncio.CancelledError()
+            yield
+
+        with self.assertRaises(asyncio.CancelledError):
+            self.relay(stream)
+
+
+class LifespanTests(SimpleTestCase):
+    def test_shutdown_closes_the_agent_clients(self):
+        from config.asgi import application
+
+        async def scenario():
+            client = agent_client.get_agent_client("t1")
+            messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+            sent = []
+
+            async def receive():
+                return messages.pop(0)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            with patch("api.agent_client.close_redis", AsyncMock()) as close_redis:
+                await application({"type": "lifespan"}, receive, send)
+            return client, sent, close_redis
+
+        client, sent, close_redis = asyncio.run(scenario())
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertTrue(client.is_closed)
+        self.assertEqual(agent_client._clients, {})
+        close_redis.assert_awaited_once()
@@ -0,0 +1,186 @@
+# api/thread_status.py
+import asyncio
+import hashlib
+import json
+import time
+
+import httpx
+from django.conf import settings
+
+from .agent_client import get_agent_client, report_agent_failure
+from .redis_client import get_redis
+from .metrics import record_cache
+
+# Listas del estado del agente que se resumen como contadores
+COUNTER_KEYS = (
+    "messages",
+    "academic_papers",
+    "search_results",
+    "relevant_results",
+    "investment_opportunities",
+    "report_paths",
+)
+
+
+def _key(thread_id: str) -> str:
+    return f"thread_status:{thread_id}"
+
+
+def _lock_key(thread_id: str) -> str:
+    return f"thread_status:{thread_id}:refresh"
+
+
+def _channel(thread_id: str) -> str:
+    return f"thread_status:{thread_id}:changed"
+
+
+def project_status(thread_id: str, state: dict) -> dict:
+    """
+    Proyecta la respuesta de `GET /threads/{id}/state` del agente sobre un
+    resumen compacto: nodo actual, interrupción pendiente, contadores e id
+    del último mensaje. No incluye mensajes, papers ni oportunidades.
+    """
+    values = state.get("values") or {}
+    next_nodes = state.get("next") or []
+
+    interrupts = state.get("interrupts") or [
+        interrupt
+        for task in state.get("tasks") or []
+        for interrupt in task.get("interrupts") or []
+    ]
+    interrupt = interrupts[0].get("value") if interrupts else None
+
+    messages = values.get("messages") or []
+    last_message = messages[-1] if messages else None
+
+    if interrupt is not None:
+        run_status = "interrupted"
+    elif next_nodes:
+        run_status = "running"
+    else:
+        run_status = "idle"
+
+    return {
+        "thread_id": thread_id,
+        "status": run_status,
+        "node": next_nodes[0] if next_nodes else None,
+        "interrupt": interrupt,
+        "counters": {key: len(values.get(key) or []) for key in COUNTER_KEYS},
+        "last_message_id": last_message.get("id") if isinstance(last_message, dict) else None,
+    }
+
+
+def etag_for(snapshot: dict) -> str:
+    """ETag de una instantánea: cambia exactamente cuando cambia su versión."""
+    return f'"{snapshot["thread_id"]}-{snapshot["version"]}"'
+
+
+async def get_thread_status(thread_id: str) -> dict:
+    """
+    Devuelve la instantánea compacta del hilo desde Redis.
+
+    Solo se consulta al agente cuando la instantánea tiene más de
+    THREAD_STATUS_CACHE_TTL segundos (o se marcó como obsoleta), y un cerrojo
+    en Redis garantiza que, entre todos los procesos del gateway, una sola
+    petición por hilo hace esa consulta; el resto sirve la copia en caché.
+    """
+    redis_client = get_redis()
+    cached = await redis_client.hgetall(_key(thread_id))
+    has_snapshot = "snapshot" in cached
+
+    if has_snapshot and time.time() - float(cached.get("fetched_at", 0)) < settings.THREAD_STATUS_CACHE_TTL:
+        record_cache("thread_status", True)
+        return json.loads(cached["snapshot"])
+
+    lock_ms = int(max(settings.THREAD_STATUS_CACHE_TTL, 1) * 1000)
+    acquired = await redis_client.set(_lock_key(thread_id), "1", nx=True, px=lock_ms)
+    if not acquired and has_snapshot:
+        # Otro proceso está refrescando: la copia en caché cuenta como acierto
+        record_cache("thread_status", True)
+        return json.loads(cached["snapshot"])
+
+    record_cache("thread_status", False)
+
+    try:
+        return await _refresh(thread_id, cached)
+    finally:
+        if acquired:
+            await redis_client.delete(_lock_key(thread_id))
+
+
+async def _refresh(thread_id: str, cached: dict) -> dict:
+    """
+    Lee el estado del agente y actualiza la instantánea. La versión solo se
+    incrementa (y se avisa a los clientes en espera) si la proyección cambió.
+    """
+    redis_client = get_redis()
+    key = _key(thread_id)
+
+    client = get_agent_client(thread_id)
+    try:
+        response = await client.get(f"/threads/{thread_id}/state")
+    except httpx.ConnectError:
+        # Failover: la réplica sale del anillo y se reintenta en la siguiente
+        report_agent_failure(client)
+        response = await get_agent_client(thread_id).get(f"/threads/{thread_id}/state")
+    response.raise_for_status()
+    status = project_status(thread_id, response.json())
+    fingerprint = hashlib.sha1(json.dumps(status, sort_keys=True, default=str).encode()).hexdigest()
+
+    if "snapshot" in cached and cached.get("fingerprint") == fingerprint:
+        await redis_client.hset(key, "fetched_at", time.time())
+        await redis_client.expire(key, settings.THREAD_STATUS_EXPIRY)
+        return json.loads(cached["snapshot"])
+
+    version = await redis_client.hincrby(key, "version", 1)
+    snapshot = {**status, "version": version}
+    await redis_client.hset(key, mapping={
+        "snapshot": json.dumps(snapshot, default=str),
+        "fingerprint": fingerprint,
+        "fetched_at": time.time(),
+    })
+    await redis_client.expire(key, settings.THREAD_STATUS_EXPIRY)
+    await redis_client.publish(_channel(thread_id), version)
+    return snapshot
+
+
+async def mark_stale(thread_id: str) -> None:
+    """
+    Marca la instantánea como obsoleta y despierta a los clientes en espera
+    para que la siguiente lectura consulte al agente. Lo usa el ChatConsumer
+    cada vez que el stream de una ejecución informa de un cambio.
+    """
+    redis_client = get_redis()
+    if await redis_client.hexists(_key(thread_id), "snapshot"):
+        await redis_client.hset(_key(thread_id), "fetched_at", 0)
+    await redis_client.publish(_channel(thread_id), "stale")
+
+
+async def wait_for_status(thread_id: str, after_version: int, timeout: float) -> dict:
+    """
+    Long-polling: espera hasta que la versión de la instantánea sea distinta
+    de `after_version` (normalmente mayor) o hasta agotar `timeout`.
+
+    Mientras espera no consulta al agente más de una vez cada
+    THREAD_STATUS_CACHE_TTL segundos; los cambios notificados por Redis
+    (ver `mark_stale`) la despiertan antes.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    pubsub = get_redis().pubsub()
+    await pubsub.subscribe(_channel(thread_id))
+    try:
+        while True:
+            snapshot = await get_thread_status(thread_id)
+            remaining = deadline - loop.time()
+            # '!=' y no '>': si la instantánea caducó, la versión vuelve a empezar
+            if snapshot["version"] != after_version or remaining <= 0:
+                return snapshot
+            await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=min(remaining, settings.THREAD_STATUS_CACHE_TTL),
+            )
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
@@ -0,0 +1,107 @@
+# api/tracing.py
+import json
+import os
+import threading
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from opentelemetry import trace
+from opentelemetry.propagate import inject
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+
+tracer = trace.get_tracer("gateway")
+
+
+class JsonLinesFileExporter(SpanExporter):
+    """Escribe cada span como una línea JSON; no necesita ningún colector."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans) -> SpanExportResult:
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(json.loads(span.to_json())) + "\n")
+        return SpanExportResult.SUCCESS
+
+
+def setup_tracing() -> None:
+    """
+    Configura el exportador de trazas según GATEWAY_TRACES_EXPORTER
+    ("none", "console", "file" u "otlp") e instrumenta httpx para que las
+    peticiones al agente tengan su propio span y cabecera 'traceparent'.
+    """
+    exporter_name = settings.GATEWAY_TRACES_EXPORTER
+    if exporter_name == "console":
+        exporter = ConsoleSpanExporter()
+    elif exporter_name == "file":
+        exporter = JsonLinesFileExporter(settings.GATEWAY_TRACES_FILE)
+    elif exporter_name == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("⚠️ GATEWAY_TRACES_EXPORTER=otlp requiere opentelemetry-exporter-otlp. Trazas desactivadas.")
+            return
+        exporter = OTLPSpanExporter()
+    else:
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": os.environ.get("OTEL_SERVICE_NAME", "ctm-gateway")}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    try:
+        from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+        HTTPXClientInstrumentor().instrument()
+    except ImportError:
+        pass
+
+
+def current_traceparent() -> dict:
+    """
+    Contexto de traza actual en formato W3C ({'traceparent': ...}). Se envía
+    como metadata de la ejecución para que las trazas del agente cuelguen
+    de las del gateway.
+    """
+    carrier = {}
+    inject(carrier)
+    return carrier
+
+
+@sync_and_async_middleware
+def tracing_middleware(get_response):
+    """Un span por petición HTTP, con la vista y el 'thread_id' si la URL lo lleva."""
+    def start_span(request):
+        return tracer.start_as_current_span(f"HTTP {request.method}", kind=trace.SpanKind.SERVER)
+
+    def finish_span(span, request, response):
+        match = getattr(request, "resolver_match", None)
+        if match:
+            span.update_name(f"HTTP {request.method} {match.view_name}")
+            if "thread_id" in match.kwargs:
+                span.set_attribute("thread_id", match.kwargs["thread_id"])
+        span.set_attribute("http.status_code", response.status_code)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with start_span(request) as span:
+                response = await get_response(request)
+                finish_span(span, request, response)
+                return response
+    else:
+        def middleware(request):
+            with start_span(request) as span:
+                response = get_response(request)
+                finish_span(span, request, response)
+                return response
+    return middleware
@@ -1,8 +1,10 @@
 # api/urls.py
 from django.urls import path
-from .views import ProjectStartView, HealthCheckView
+from .views import ProjectStartView, ProjectJobView, HealthCheckView, ThreadStatusView
 
 urlpatterns = [
     path('projects/start/', ProjectStartView.as_view(), name='project-start'),
+    path('projects/<str:thread_id>/job/', ProjectJobView.as_view(), name='project-job'),
+    path('threads/<str:thread_id>/status/', ThreadStatusView.as_view(), name='thread-status'),
     path('', HealthCheckView.as_view(), name='health-check'),
 ]
\ No newline at end of file
@@ -1,11 +1,18 @@
 # api/views.py
+# Las vistas con handlers 'async def' necesitan el APIView de adrf: el de DRF despacha en síncrono
+from adrf.views import APIView as AsyncAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 import httpx
 import uuid
 
-AGENT_URL = "http://agent:8000"
+from opentelemetry import trace
+
+from django.conf import settings
+
+from .thread_status import get_thread_status, wait_for_status, etag_for
+from .job_queue import enqueue_project_start, get_job_status, get_user_key, QueueFullError
 
 class HealthCheckView(APIView):
     """
@@ -21,9 +28,12 @@ class HealthCheckView(APIView):
             status=status.HTTP_200_OK
         )
 
-class ProjectStartView(APIView):
+class ProjectStartView(AsyncAPIView):
     """
     Endpoint para iniciar una nueva ejecución de un proyecto en el agente.
+
+    No espera al agente: el inicio se encola en Redis y el despachador
+    (`python manage.py dispatch_projects`) lo lanza cuando hay capacidad.
     """
     async def post(self, request, *args, **kwargs):
         project_title = request.data.get("project_title")
@@ -34,25 +44,74 @@ class ProjectStartView(APIView):
 
         # Generamos un ID único para este hilo de ejecución
         thread_id = str(uuid.uuid4())
-        
-        # El endpoint de LangServe para iniciar un nuevo stream/hilo
-        start_url = f"{AGENT_URL}/invoke"
+        # El span de la petición lleva el thread_id; el agente lo hereda vía 'traceparent'
+        trace.get_current_span().set_attribute("thread_id", thread_id)
+
+        # Los trabajos se reparten por turnos entre usuarios (o IPs si no hay sesión)
+        user_key = get_user_key(getattr(request, "user", None), request.META.get("REMOTE_ADDR"))
+
+        try:
+            # El input debe coincidir con lo que espera tu nodo 'ingest_info'
+            pending = await enqueue_project_start(
+                user_key,
+                thread_id,
+                {"project_title": project_title, "project_description": project_description},
+            )
+        except QueueFullError:
+            return Response(
+                {"error": "Hay demasiados proyectos en cola. Inténtalo de nuevo en unos segundos."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(int(settings.PROJECT_QUEUE_BACKOFF))},
+            )
+
+        # Devolvemos el ID para que el frontend pueda conectarse al WebSocket
+        return Response({"thread_id": thread_id, "status": "queued", "queued_jobs": pending}, status=status.HTTP_202_ACCEPTED)
+
+
+class ProjectJobView(AsyncAPIView):
+    """
+    Estado del inicio encolado de un proyecto:
+    queued -> running -> started (o failed).
+    """
+    async def get(self, request, thread_id, *args, **kwargs):
+        job = await get_job_status(thread_id)
+        if not job:
+            return Response({"error": "Proyecto no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"thread_id": thread_id, **job}, status=status.HTTP_200_OK)
+
 
+class ThreadStatusView(AsyncAPIView):
+    """
+    Estado compacto de un hilo: nodo actual, interrupción pendiente,
+    contadores e id del último mensaje. Alternativa ligera a sondear
+    `GET /threads/{id}/state` del agente.
+
+    - `ETag` / `If-None-Match`: si la versión no cambió se responde 304.
+    - `?wait=<versión>&timeout=<s>`: long-polling, espera hasta que la
+      versión sea mayor que la indicada (como mucho THREAD_STATUS_MAX_WAIT).
+    """
+    async def get(self, request, thread_id, *args, **kwargs):
+        wait = request.query_params.get("wait")
         try:
-            # Hacemos la llamada inicial al agente para que comience su trabajo
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # El input debe coincidir con lo que espera tu nodo 'ingest_info'
-                # y la configuración necesita el 'thread_id' para el checkpointer.
-                response = await client.post(
-                    start_url,
-                    json={
-                        "input": {"project_title": project_title, "project_description": project_description},
-                        "config": {"configurable": {"thread_id": thread_id}}
-                    }
-                )
-                response.raise_for_status()
+            after_version = int(wait) if wait is not None else None
+            timeout = min(float(request.query_params.get("timeout", settings.THREAD_STATUS_MAX_WAIT)), settings.THREAD_STATUS_MAX_WAIT)
+        except ValueError:
+            return Response({"error": "wait debe ser un entero y timeout un número."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if after_version is None:
+                snapshot = await get_thread_status(thread_id)
+            else:
+                snapshot = await wait_for_status(thread_id, after_version, max(timeout, 0))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == status.HTTP_404_NOT_FOUND:
+                return Response({"error": "Hilo no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"error": f"El agente respondió con un error: {e}"}, status=status.HTTP_502_BAD_GATEWAY)
         except httpx.RequestError as e:
             return Response({"error": f"No se pudo comunicar con el agente: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
-        # Devolvemos el ID para que el frontend pueda conectarse al WebSocket
-        return Response({"thread_id": thread_id}, status=status.HTTP_201_CREATED)
\ No newline at end of file
+
+        etag = etag_for(snapshot)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(snapshot, status=status.HTTP_200_OK, headers=headers)
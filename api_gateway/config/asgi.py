@@ -1,16 +1,22 @@
 import os
 from django.core.asgi import get_asgi_application
+
+# Django se configura antes de importar 'api': sus módulos leen settings al importarse
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import api.routing
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+from api.agent_client import lifespan_app
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             api.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+    # Cierre limpio del cliente HTTP compartido hacia el agente
+    "lifespan": lifespan_app,
+})
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.tracing.tracing_middleware",
+    "api.metrics.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     'corsheaders.middleware.CorsMiddleware',
@@ -138,6 +140,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ASGI_APPLICATION = 'config.asgi.application'
 # Obtener la URI de Redis desde el entorno
 redis_uri = os.environ.get('REDIS_URI', 'redis://redis:6379')
+# URI completa para el cliente Redis propio del gateway (ver api/redis_client.py)
+REDIS_URI = redis_uri
 # Extraer el host. Asumimos el formato 'redis://host:port'
 redis_host = redis_uri.split('//')[1].split(':')[0]
 
@@ -151,6 +155,61 @@ CHANNEL_LAYERS = {
 }
 
 
+# --- Configuración del Agente (LangGraph) ---
+# El nombre del servicio del agente en docker-compose
+AGENT_URL = os.environ.get('AGENT_URL', 'http://agent:8000')
+# Réplicas del agente separadas por comas (por defecto solo AGENT_URL).
+# Los hilos se reparten con hashing consistente sobre 'thread_id' (ver api/agent_pool.py)
+AGENT_URLS = [url.strip() for url in os.environ.get('AGENT_URLS', AGENT_URL).split(',') if url.strip()]
+AGENT_RING_VNODES = int(os.environ.get('AGENT_RING_VNODES', '100'))
+# Health check de las réplicas: intervalo, timeout y tiempo fuera del anillo tras un fallo
+AGENT_HEALTH_INTERVAL = float(os.environ.get('AGENT_HEALTH_INTERVAL', '10'))
+AGENT_HEALTH_TIMEOUT = float(os.environ.get('AGENT_HEALTH_TIMEOUT', '2'))
+AGENT_DOWN_COOLDOWN = float(os.environ.get('AGENT_DOWN_COOLDOWN', '30'))
+# Timeouts en segundos del cliente HTTP compartido (ver api/agent_client.py)
+AGENT_CONNECT_TIMEOUT = float(os.environ.get('AGENT_CONNECT_TIMEOUT', '5'))
+AGENT_READ_TIMEOUT = float(os.environ.get('AGENT_READ_TIMEOUT', '60'))
+# Pool de conexiones keep-alive
+AGENT_MAX_CONNECTIONS = int(os.environ.get('AGENT_MAX_CONNECTIONS', '100'))
+AGENT_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('AGENT_MAX_KEEPALIVE_CONNECTIONS', '20'))
+AGENT_KEEPALIVE_EXPIRY = float(os.environ.get('AGENT_KEEPALIVE_EXPIRY', '30'))
+# Asistente registrado en langgraph.json y timeout de lectura de los streams de ejecución
+AGENT_ASSISTANT_ID = os.environ.get('AGENT_ASSISTANT_ID', 'agent')
+AGENT_STREAM_READ_TIMEOUT = float(os.environ.get('AGENT_STREAM_READ_TIMEOUT', '300'))
+# Vida (segundos) de la marca de cancelación que leen los nodos del agente
+AGENT_CANCEL_TTL = int(os.environ.get('AGENT_CANCEL_TTL', '3600'))
+
+# --- WebSocket (ChatConsumer) ---
+# Frames pendientes por socket antes de frenar la lectura del stream del agente
+WS_SEND_QUEUE_SIZE = int(os.environ.get('WS_SEND_QUEUE_SIZE', '100'))
+# Cada cuánto (segundos) se agrupan los tokens del LLM en un solo frame
+WS_TOKEN_FLUSH_INTERVAL = float(os.environ.get('WS_TOKEN_FLUSH_INTERVAL', '0.1'))
+
+# --- Estado compacto de hilos (api/thread_status.py) ---
+# Segundos durante los que la instantánea en Redis se sirve sin consultar al agente
+THREAD_STATUS_CACHE_TTL = float(os.environ.get('THREAD_STATUS_CACHE_TTL', '2'))
+# Espera máxima (segundos) de una petición de long-polling
+THREAD_STATUS_MAX_WAIT = float(os.environ.get('THREAD_STATUS_MAX_WAIT', '30'))
+# Tiempo de vida de la instantánea y su versión en Redis
+THREAD_STATUS_EXPIRY = int(os.environ.get('THREAD_STATUS_EXPIRY', '86400'))
+
+# --- Cola de inicio de proyectos (api/job_queue.py) ---
+# Ejecuciones iniciales simultáneas en el agente, entre todos los despachadores
+PROJECT_MAX_CONCURRENCY = int(os.environ.get('PROJECT_MAX_CONCURRENCY', '4'))
+# Trabajos en cola a partir de los cuales se responde 429 (backpressure)
+PROJECT_QUEUE_MAX_PENDING = int(os.environ.get('PROJECT_QUEUE_MAX_PENDING', '200'))
+# Timeout de la ejecución inicial (llega hasta la primera interrupción)
+PROJECT_JOB_TIMEOUT = float(os.environ.get('PROJECT_JOB_TIMEOUT', '900'))
+# Pausa del despacho (segundos) cuando el agente está saturado, y sondeo de la cola
+PROJECT_QUEUE_BACKOFF = float(os.environ.get('PROJECT_QUEUE_BACKOFF', '10'))
+PROJECT_QUEUE_POLL_INTERVAL = float(os.environ.get('PROJECT_QUEUE_POLL_INTERVAL', '0.5'))
+
+# --- Trazas OpenTelemetry (api/tracing.py) ---
+# Exportador: 'none', 'console', 'file' (JSON por línea) u 'otlp'
+GATEWAY_TRACES_EXPORTER = os.environ.get('GATEWAY_TRACES_EXPORTER', 'none').lower()
+GATEWAY_TRACES_FILE = os.environ.get('GATEWAY_TRACES_FILE', 'traces/gateway.jsonl')
+
+
 # --- Configuración CORS ---
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:4200", # El puerto por defecto de Angular
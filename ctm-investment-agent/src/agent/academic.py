@@ -0,0 +1,224 @@
+# src/agent/academic.py
+
+"""
+Clientes de Semantic Scholar y arXiv para la investigación académica.
+
+Sustituyen al `SemanticScholarAPIWrapper` (que devuelve un único texto
+formateado, así que sus resultados se perdían) y al `ArxivRetriever`
+genérico. Ambos clientes:
+
+- piden solo los campos que usa el agente (título, abstract, ids, año,
+  venue y citas);
+- paginan hasta reunir los resultados pedidos;
+- devuelven registros tipados (`AcademicPaper`), que `to_paper()` convierte
+  al dict que guarda el estado;
+- toman la URL base de la configuración, así que se pueden probar contra un
+  servidor local.
+
+Los papers de arXiv se completan con sus citas y su venue mediante el
+endpoint de consulta por lotes de Semantic Scholar (`enrich`): una sola
+petición para todos los de la búsqueda.
+"""
+
+import asyncio
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from .config import (
+    ACADEMIC_ABSTRACT_CHARS,
+    ACADEMIC_HTTP_TIMEOUT,
+    ACADEMIC_MAX_RETRIES,
+    ARXIV_API_URL,
+    SEMANTIC_SCHOLAR_API_KEY,
+    SEMANTIC_SCHOLAR_API_URL,
+)
+from .metrics import track_external
+
+# Proyección de campos de Semantic Scholar: solo lo que usa el agente
+SEMANTIC_SCHOLAR_FIELDS = "paperId,externalIds,title,abstract,year,venue,citationCount"
+
+ATOM_NS = {"atom": "http://www.w3.org/2005/Atom", "arxiv": "http://arxiv.org/schemas/atom"}
+
+# Estados en los que se reintenta la petición (límite de tasa y errores del servidor)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AcademicPaper(BaseModel):
+    """Paper devuelto por los clientes académicos."""
+    source: str
+    title: str
+    abstract: str = ""
+    url: str = "N/A"
+    year: Optional[int] = None
+    venue: Optional[str] = None
+    citation_count: Optional[int] = None
+    arxiv_id: Optional[str] = None
+    doi: Optional[str] = None
+    semantic_scholar_id: Optional[str] = None
+
+    def to_paper(self) -> Dict:
+        """Dict del paper tal como lo guarda 'academic_papers'."""
+        return {
+            "title": self.title,
+            "url": self.url,
+            "content": self.abstract[:ACADEMIC_ABSTRACT_CHARS] or "No abstract.",
+            "source": self.source,
+            "year": self.year,
+            "venue": self.venue,
+            "citation_count": self.citation_count,
+        }
+
+
+class _AcademicClient:
+    """Cliente HTTP asíncrono con reintentos; se usa con `async with`."""
+
+    service = "academic"
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None, page_size: int = 100):
+        self.page_size = page_size
+        self._http = httpx.AsyncClient(base_url=base_url, headers=headers, timeout=ACADEMIC_HTTP_TIMEOUT)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._http.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        for attempt in range(ACADEMIC_MAX_RETRIES + 1):
+            async with track_external(self.service):
+                response = await self._http.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == ACADEMIC_MAX_RETRIES:
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            await asyncio.sleep(float(retry_after) if retry_after.isdigit() else 2 ** attempt)
+
+
+class SemanticScholarClient(_AcademicClient):
+    """Graph API de Semantic Scholar: búsqueda paginada y consulta por lotes."""
+
+    service = "semantic_scholar"
+    # Máximo de ids por petición a /paper/batch
+    BATCH_SIZE = 500
+
+    def __init__(self, base_url: str = SEMANTIC_SCHOLAR_API_URL, page_size: int = 100):
+        headers = {"x-api-key": SEMANTIC_SCHOLAR_API_KEY} if SEMANTIC_SCHOLAR_API_KEY else None
+        super().__init__(base_url, headers=headers, page_size=page_size)
+
+    @staticmethod
+    def _record(data: Dict) -> AcademicPaper:
+        ids = data.get("externalIds") or {}
+        return AcademicPaper(
+            source="Semantic Scholar",
+            title=data.get("title") or "N/A",
+            abstract=data.get("abstract") or "",
+            url=f"https://www.semanticscholar.org/paper/{data['paperId']}" if data.get("paperId") else "N/A",
+            year=data.get("year"),
+            venue=data.get("venue") or None,
+            citation_count=data.get("citationCount"),
+            arxiv_id=ids.get("ArXiv"),
+            doi=ids.get("DOI"),
+            semantic_scholar_id=data.get("paperId"),
+        )
+
+    async def search(self, query: str, limit: int) -> List[AcademicPaper]:
+        """Los `limit` primeros resultados de la búsqueda por relevancia."""
+        papers: List[AcademicPaper] = []
+        offset = 0
+        while len(papers) < limit:
+            response = await self._request("GET", "/paper/search", params={
+                "query": query,
+                "fields": SEMANTIC_SCHOLAR_FIELDS,
+                "offset": offset,
+                "limit": min(self.page_size, limit - len(papers)),
+            })
+            body = response.json()
+            page = body.get("data") or []
+            papers.extend(self._record(data) for data in page)
+            if not page or body.get("next") is None:
+                break
+            offset = body["next"]
+        return papers[:limit]
+
+    async def get_papers(self, ids: List[str]) -> List[Optional[AcademicPaper]]:
+        """
+        Consulta por lotes de ids de Semantic Scholar o externos
+        ("ARXIV:2101.00001", "DOI:..."). Devuelve None para los no encontrados,
+        en el mismo orden que `ids`.
+        """
+        papers: List[Optional[AcademicPaper]] = []
+        for start in range(0, len(ids), self.BATCH_SIZE):
+            response = await self._request(
+                "POST", "/paper/batch",
+                params={"fields": SEMANTIC_SCHOLAR_FIELDS},
+                json={"ids": ids[start:start + self.BATCH_SIZE]},
+            )
+            papers.extend(self._record(data) if data else None for data in response.json())
+        return papers
+
+    async def enrich(self, papers: List[AcademicPaper]) -> List[AcademicPaper]:
+        """Completa citas, venue e ids de los papers de arXiv con una consulta por lotes."""
+        pending = [i for i, paper in enumerate(papers) if paper.arxiv_id and paper.semantic_scholar_id is None]
+        if not pending:
+            return papers
+        found = await self.get_papers([f"ARXIV:{papers[i].arxiv_id}" for i in pending])
+        enriched = list(papers)
+        for i, match in zip(pending, found):
+            if match is not None:
+                enriched[i] = papers[i].model_copy(update={
+                    "citation_count": match.citation_count,
+                    "venue": papers[i].venue or match.venue,
+                    "doi": papers[i].doi or match.doi,
+                    "semantic_scholar_id": match.semantic_scholar_id,
+                })
+        return enriched
+
+
+class ArxivClient(_AcademicClient):
+    """API de arXiv (Atom): búsqueda paginada por relevancia."""
+
+    service = "arxiv"
+
+    def __init__(self, base_url: str = ARXIV_API_URL, page_size: int = 100):
+        super().__init__(base_url, page_size=page_size)
+
+    @staticmethod
+    def _record(entry: ET.Element) -> AcademicPaper:
+        def text(path: str) -> str:
+            return " ".join((entry.findtext(path, default="", namespaces=ATOM_NS)).split())
+
+        # http://arxiv.org/abs/2101.00001v2 -> 2101.00001v2 (la URL) y 2101.00001 (el id)
+        versioned_id = text("atom:id").rsplit("/abs/", 1)[-1]
+        published = text("atom:published")
+        return AcademicPaper(
+            source="Arxiv",
+            title=text("atom:title") or "N/A",
+            abstract=text("atom:summary"),
+            url=f"https://arxiv.org/pdf/{versioned_id}" if versioned_id else "N/A",
+            year=int(published[:4]) if published[:4].isdigit() else None,
+            venue=text("arxiv:journal_ref") or None,
+            arxiv_id=re.sub(r"v\d+$", "", versioned_id) or None,
+            doi=text("arxiv:doi") or None,
+        )
+
+    async def search(self, query: str, limit: int) -> List[AcademicPaper]:
+        """Los `limit` primeros resultados de la búsqueda por relevancia."""
+        papers: List[AcademicPaper] = []
+        while len(papers) < limit:
+            page_size = min(self.page_size, limit - len(papers))
+            response = await self._request("GET", "/query", params={
+                "search_query": query,
+                "start": len(papers),
+                "max_results": page_size,
+                "sortBy": "relevance",
+            })
+            entries = ET.fromstring(response.text).findall("atom:entry", ATOM_NS)
+            papers.extend(self._record(entry) for entry in entries)
+            if len(entries) < page_size:
+                break
+        return papers[:limit]
@@ -0,0 +1,181 @@
+# src/agent/budget.py
+
+"""
+Presupuestos de LLM y búsquedas por hilo y por usuario.
+
+Tres recursos: tokens del LLM, llamadas al LLM y llamadas a buscadores.
+Cada uno tiene un límite por hilo (toda su vida) y otro por usuario (por
+día). Los contadores viven en Redis si REDIS_URI está definida (compartidos
+entre réplicas y workers) y si no, en memoria del proceso.
+
+- Las llamadas al LLM y sus tokens se cargan solas con `budget_callback`
+  (registrado en el grafo compilado).
+- Las búsquedas se reservan antes de cada llamada con `try_consume`.
+- Los nodos consultan `llm_budget_level()` antes de llamar al LLM y
+  degradan: menos queries, sin extracción de fuentes secundarias, modelo
+  más barato ("reduced") o sin llamada ("exhausted").
+
+El hilo y el usuario salen de la configuración de la ejecución
+(`configurable.thread_id` y `configurable.user_id`, que envía el gateway).
+Un límite de 0 significa "sin límite".
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langgraph.config import get_config
+
+from .config import THREAD_BUDGETS, USER_DAILY_BUDGETS, BUDGET_REDUCED_FRACTION
+
+KINDS = ("llm_tokens", "llm_calls", "search_calls")
+
+THREAD_KEY_TTL = 30 * 24 * 3600
+USER_KEY_TTL = 2 * 24 * 3600
+
+
+class _MemoryCounters:
+    """Contadores en memoria (desarrollo local, `langgraph dev`)."""
+
+    def __init__(self) -> None:
+        self._values: Dict[str, int] = {}
+
+    async def incrby(self, key: str, amount: int, ttl: int) -> int:
+        self._values[key] = self._values.get(key, 0) + amount
+        return self._values[key]
+
+    async def get_many(self, keys: List[str]) -> List[int]:
+        return [self._values.get(key, 0) for key in keys]
+
+
+class _RedisCounters:
+    """Contadores en Redis: INCRBY es atómico, así que los workers en paralelo no se pisan."""
+
+    def __init__(self, uri: str) -> None:
+        import redis.asyncio as redis
+        self._redis = redis.from_url(uri, decode_responses=True)
+
+    async def incrby(self, key: str, amount: int, ttl: int) -> int:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incrby(key, amount)
+            pipe.expire(key, ttl)
+            value, _ = await pipe.execute()
+        return value
+
+    async def get_many(self, keys: List[str]) -> List[int]:
+        return [int(value or 0) for value in await self._redis.mget(keys)]
+
+
+_counters = _RedisCounters(os.environ["REDIS_URI"]) if os.getenv("REDIS_URI") else _MemoryCounters()
+
+
+def _scope() -> Tuple[Optional[str], Optional[str]]:
+    """(thread_id, user_id) de la ejecución en curso."""
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        return None, None
+    return configurable.get("thread_id"), configurable.get("user_id")
+
+
+def _budget_keys(kind: str, thread_id: Optional[str], user_id: Optional[str]) -> List[Tuple[str, int, int]]:
+    """(clave, límite, ttl) de cada presupuesto que aplica a la ejecución."""
+    keys = []
+    if thread_id and THREAD_BUDGETS[kind]:
+        keys.append((f"budget:thread:{thread_id}:{kind}", THREAD_BUDGETS[kind], THREAD_KEY_TTL))
+    if user_id and USER_DAILY_BUDGETS[kind]:
+        day = time.strftime("%Y%m%d", time.gmtime())
+        keys.append((f"budget:user:{user_id}:{kind}:{day}", USER_DAILY_BUDGETS[kind], USER_KEY_TTL))
+    return keys
+
+
+async def charge(kind: str, amount: int, thread_id: Optional[str] = None, user_id: Optional[str] = None) -> None:
+    """Carga un consumo ya hecho (sin comprobar el límite)."""
+    if thread_id is None and user_id is None:
+        thread_id, user_id = _scope()
+    for key, _, ttl in _budget_keys(kind, thread_id, user_id):
+        await _counters.incrby(key, amount, ttl)
+
+
+async def try_consume(kind: str, amount: int = 1) -> bool:
+    """
+    Reserva `amount` unidades si caben en todos los presupuestos aplicables.
+    Devuelve False (y no consume nada) si alguno se pasaría del límite.
+    """
+    applied = []
+    for key, limit, ttl in _budget_keys(kind, *_scope()):
+        applied.append((key, ttl))
+        if await _counters.incrby(key, amount, ttl) > limit:
+            for applied_key, applied_ttl in applied:
+                await _counters.incrby(applied_key, -amount, applied_ttl)
+            return False
+    return True
+
+
+async def remaining() -> Dict[str, Optional[int]]:
+    """Unidades restantes de cada recurso (el menor entre hilo y usuario; None = sin límite)."""
+    thread_id, user_id = _scope()
+    result = {}
+    for kind in KINDS:
+        budgets = _budget_keys(kind, thread_id, user_id)
+        used = await _counters.get_many([key for key, _, _ in budgets]) if budgets else []
+        left = [max(limit - value, 0) for (_, limit, _), value in zip(budgets, used)]
+        result[kind] = min(left) if left else None
+    return result
+
+
+async def llm_budget_level() -> str:
+    """
+    "ok", "reduced" (queda menos de BUDGET_REDUCED_FRACTION de algún
+    presupuesto del LLM) o "exhausted" (alguno agotado).
+    """
+    thread_id, user_id = _scope()
+    level = "ok"
+    for kind in ("llm_tokens", "llm_calls"):
+        budgets = _budget_keys(kind, thread_id, user_id)
+        if not budgets:
+            continue
+        used = await _counters.get_many([key for key, _, _ in budgets])
+        for (_, limit, _), value in zip(budgets, used):
+            if value >= limit:
+                return "exhausted"
+            if limit - value < BUDGET_REDUCED_FRACTION * limit:
+                level = "reduced"
+    return level
+
+
+class BudgetCallbackHandler(AsyncCallbackHandler):
+    """Carga cada llamada al LLM y sus tokens en los presupuestos de la ejecución."""
+
+    @staticmethod
+    def _ids(metadata) -> Tuple[Optional[str], Optional[str]]:
+        # El servidor copia 'configurable' en los metadatos; si falta algo,
+        # se recurre a la configuración de la ejecución en curso
+        metadata = metadata or {}
+        thread_id, user_id = _scope()
+        return metadata.get("thread_id") or thread_id, metadata.get("user_id") or user_id
+
+    def __init__(self) -> None:
+        self._runs: Dict[object, Tuple[Optional[str], Optional[str]]] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        thread_id, user_id = self._ids(metadata)
+        self._runs[run_id] = (thread_id, user_id)
+        await charge("llm_calls", 1, thread_id, user_id)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        thread_id, user_id = self._runs.pop(run_id, (None, None))
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                tokens += usage.get("total_tokens", 0)
+        if tokens:
+            await charge("llm_tokens", tokens, thread_id, user_id)
+
+    async def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._runs.pop(run_id, None)
+
+
+budget_callback = BudgetCallbackHandler()
@@ -0,0 +1,106 @@
+# src/agent/cancellation.py
+
+"""
+Cancelación cooperativa de la búsqueda de financiación.
+
+El gateway genera una clave por ejecución (`configurable.cancel_key`) y,
+cuando el usuario pide cancelar o cierra el WebSocket, escribe
+`agent_cancel:<clave>` en Redis. La ejecución no se mata a la fuerza: los
+workers de búsqueda, escrutinio y extracción abortan su llamada en curso
+(`run_cancellable`), los nodos de unión marcan 'funding_cancelled' y los
+routers saltan directamente a 'extract_opportunities'. Así el hilo llega a
+la selección de oportunidades, un checkpoint normal, con lo que se encontró
+hasta ese momento.
+
+Sin REDIS_URI la marca vive en memoria del proceso: solo sirve para
+desarrollo local y pruebas, porque el gateway no puede escribirla.
+"""
+
+import asyncio
+import os
+from typing import Any, Coroutine, Optional, Set
+
+from langgraph.config import get_config
+
+from .config import CANCEL_POLL_INTERVAL
+
+CANCEL_KEY_PREFIX = "agent_cancel:"
+CANCEL_KEY_TTL = 3600
+
+_redis = None
+if os.getenv("REDIS_URI"):
+    import redis.asyncio as redis
+    _redis = redis.from_url(os.environ["REDIS_URI"], decode_responses=True)
+
+# Claves ya vistas como canceladas (una cancelación no se deshace) y, sin Redis, las marcas
+_cancelled: Set[str] = set()
+
+
+def _cancel_key() -> Optional[str]:
+    """Clave de cancelación de la ejecución en curso, o None si no tiene."""
+    try:
+        return get_config().get("configurable", {}).get("cancel_key")
+    except RuntimeError:
+        return None
+
+
+async def request_cancel(cancel_key: str) -> None:
+    """Marca como cancelada la ejecución con esa clave (el gateway hace lo mismo en Redis)."""
+    if _redis is not None:
+        await _redis.set(f"{CANCEL_KEY_PREFIX}{cancel_key}", "1", ex=CANCEL_KEY_TTL)
+    else:
+        _cancelled.add(cancel_key)
+
+
+async def is_cancelled() -> bool:
+    """True si el gateway pidió cancelar la ejecución en curso."""
+    key = _cancel_key()
+    if key is None:
+        return False
+    if key in _cancelled:
+        return True
+    if _redis is None:
+        return False
+    try:
+        cancelled = bool(await _redis.exists(f"{CANCEL_KEY_PREFIX}{key}"))
+    except Exception as e:
+        # Sin Redis la búsqueda sigue: mejor terminarla que perderla
+        print(f"   ⚠️ No se pudo consultar la cancelación: {e}")
+        return False
+    if cancelled:
+        _cancelled.add(key)
+    return cancelled
+
+
+async def run_cancellable(work: Coroutine, default: Any = None) -> Any:
+    """
+    Espera `work` comprobando cada CANCEL_POLL_INTERVAL segundos si la
+    ejecución se canceló. Si es así, cancela la llamada en curso (LLM o HTTP)
+    y devuelve `default`.
+    """
+    if await is_cancelled():
+        work.close()
+        return default
+    if _cancel_key() is None:
+        return await work
+
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=CANCEL_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await is_cancelled():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                except Exception:
+                    # Terminó con error justo antes de cancelarse: da igual, se descarta
+                    pass
+                return default
+    finally:
+        # Si es el propio worker el que se cancela, la llamada no puede quedar huérfana
+        if not task.done():
+            task.cancel()
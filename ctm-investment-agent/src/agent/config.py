@@ -2,21 +2,190 @@
 
 import os
 from dotenv import load_dotenv
+from langchain_core.exceptions import OutputParserException
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from .llm_scheduler import PriorityRateLimiter
+from .metrics import LLM_PARSE_FAILURES
+
 # Cargar variables de entorno desde el archivo .env en la raíz del proyecto
 load_dotenv()
 
-def get_llm():
+# --- Concurrencia y límites de tasa ---
+# Máximo de tareas del grafo (p. ej. workers 'Send' del pipeline de financiación) en paralelo
+FUNDING_MAX_CONCURRENCY = int(os.getenv("FUNDING_MAX_CONCURRENCY", "4"))
+
+# Modo del escrutinio y la extracción de financiación:
+# - "priority": por lotes, primero los resultados más prometedores (score del buscador
+#   + pre-filtro léxico) y las convocatorias directas; para al reunir
+#   FUNDING_TARGET_OPPORTUNITIES oportunidades nuevas
+# - "exhaustive": escruta y extrae todos los resultados
+FUNDING_SCRUTINY_MODE = os.getenv("FUNDING_SCRUTINY_MODE", "priority").lower()
+FUNDING_TARGET_OPPORTUNITIES = int(os.getenv("FUNDING_TARGET_OPPORTUNITIES", "8"))
+# Workers por lote en modo "priority" (por defecto, los que pueden correr a la vez)
+FUNDING_PRIORITY_BATCH = int(os.getenv("FUNDING_PRIORITY_BATCH", str(FUNDING_MAX_CONCURRENCY)))
+# Pasos máximos de una ejecución del grafo (los lotes del modo "priority" son bucles)
+GRAPH_RECURSION_LIMIT = int(os.getenv("GRAPH_RECURSION_LIMIT", "100"))
+
+# Límite compartido por todas las llamadas al LLM del proceso (15 RPM por defecto). Cuando
+# hay cola, el chat pasa antes que los reportes y estos antes que el trabajo en bloque, y los
+# hilos de una misma clase se turnan (agent/llm_scheduler.py); "false" = cola FIFO
+LLM_RATE_LIMITER = PriorityRateLimiter(
+    requests_per_second=float(os.getenv("LLM_REQUESTS_PER_SECOND", "0.25")),
+    prioritize=os.getenv("LLM_PRIORITY_SCHEDULING", "true").lower() == "true",
+)
+
+# Límite compartido por las llamadas a los buscadores web (Tavily, Brave)
+SEARCH_RATE_LIMITER = InMemoryRateLimiter(
+    requests_per_second=float(os.getenv("SEARCH_REQUESTS_PER_SECOND", "1")),
+    check_every_n_seconds=0.1,
+)
+
+# Cada cuántos segundos comprueban los workers de la búsqueda de financiación
+# si el gateway pidió cancelarla (agent/cancellation.py)
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", "0.5"))
+
+# --- Single-flight de búsquedas, escrutinio, extracción y scrapeo (agent/singleflight.py) ---
+# Las llamadas idénticas simultáneas comparten una sola llamada real
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# También entre procesos y réplicas, con un lock en Redis (requiere REDIS_URI)
+SINGLE_FLIGHT_REDIS = os.getenv("SINGLE_FLIGHT_REDIS", "false").lower() == "true"
+# Tiempo máximo (s) que se espera a un líder de otro proceso antes de llamar por cuenta propia
+SINGLE_FLIGHT_LOCK_TTL = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "120"))
+# Segundos que el resultado del líder sigue disponible en Redis para los rezagados
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "30"))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.25"))
+
+# --- Índice de similitud entre proyectos (agent/similarity.py) ---
+# Reutiliza queries y papers de hilos anteriores con proyectos casi idénticos
+PROJECT_SIMILARITY_ENABLED = os.getenv("PROJECT_SIMILARITY_ENABLED", "true").lower() == "true"
+CHROMA_HOST = os.getenv("CHROMA_HOST", "chroma")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+# Modelo multilingüe: los proyectos se describen en español
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+# Similitud coseno mínima (0-1) para considerar un hilo anterior como semilla
+PROJECT_SIMILARITY_THRESHOLD = float(os.getenv("PROJECT_SIMILARITY_THRESHOLD", "0.85"))
+PROJECT_SIMILARITY_MAX_SEEDS = int(os.getenv("PROJECT_SIMILARITY_MAX_SEEDS", "2"))
+# Papers que se guardan por hilo en el índice (los más citados) y caracteres de su abstract
+PROJECT_SIMILARITY_MAX_PAPERS = int(os.getenv("PROJECT_SIMILARITY_MAX_PAPERS", "30"))
+PROJECT_SIMILARITY_ABSTRACT_CHARS = int(os.getenv("PROJECT_SIMILARITY_ABSTRACT_CHARS", "300"))
+# Segundos hasta reintentar la conexión con Chroma tras un fallo
+PROJECT_SIMILARITY_RETRY_SECONDS = float(os.getenv("PROJECT_SIMILARITY_RETRY_SECONDS", "60"))
+# Queries académicas nuevas que se generan para la diferencia con las semillas
+PROJECT_SIMILARITY_INCREMENTAL_QUERIES = int(os.getenv("PROJECT_SIMILARITY_INCREMENTAL_QUERIES", "1"))
+
+# --- Prefetch especulativo durante la selección (agent/prefetch.py) ---
+# Mientras el usuario elige oportunidades se scrapean y analizan en segundo plano
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+# Oportunidades (en orden de la lista) que se preparan sin esperar a la selección
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "3"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+# Tiempo máximo (s) de preparación de cada oportunidad
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "180"))
+PREFETCH_CACHE_TTL = float(os.getenv("PREFETCH_CACHE_TTL", "3600"))
+PREFETCH_CACHE_SIZE = int(os.getenv("PREFETCH_CACHE_SIZE", "500"))
+# Espera máxima (s) del reporte específico a un prefetch que sigue en curso
+PREFETCH_REPORT_WAIT = float(os.getenv("PREFETCH_REPORT_WAIT", "30"))
+
+# --- Clientes académicos (agent/academic.py) ---
+SEMANTIC_SCHOLAR_API_URL = os.getenv("SEMANTIC_SCHOLAR_API_URL", "https://api.semanticscholar.org/graph/v1")
+# Opcional: con clave, Semantic Scholar permite más peticiones
+SEMANTIC_SCHOLAR_API_KEY = os.getenv("SEMANTIC_SCHOLAR_API_KEY")
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api")
+# Papers por query y por fuente
+ACADEMIC_RESULTS_PER_QUERY = int(os.getenv("ACADEMIC_RESULTS_PER_QUERY", "3"))
+# Caracteres del abstract que se guardan en el estado
+ACADEMIC_ABSTRACT_CHARS = int(os.getenv("ACADEMIC_ABSTRACT_CHARS", "1500"))
+ACADEMIC_HTTP_TIMEOUT = float(os.getenv("ACADEMIC_HTTP_TIMEOUT", "30"))
+# Reintentos ante 429 y errores 5xx (respetando Retry-After)
+ACADEMIC_MAX_RETRIES = int(os.getenv("ACADEMIC_MAX_RETRIES", "2"))
+
+# --- Resúmenes de papers reutilizados por los reportes (agent/digests.py) ---
+# Papers por llamada al LLM al resumirlos
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "8"))
+# Caracteres del abstract que se usan para un paper que aún no tiene resumen
+DIGEST_FALLBACK_CHARS = int(os.getenv("DIGEST_FALLBACK_CHARS", "400"))
+
+# --- Reporte de estado del arte ---
+# "incremental": al llegar papers nuevos solo se reescriben las secciones a las que
+# afectan; "full": el reporte se redacta entero cada vez
+SOTA_REPORT_MODE = os.getenv("SOTA_REPORT_MODE", "incremental").lower()
+# Queries académicas nuevas cuando el chat pide ampliar la investigación
+RESEARCH_UPDATE_QUERIES = int(os.getenv("RESEARCH_UPDATE_QUERIES", "2"))
+
+# --- Reportes específicos por lotes (acción "batch_reports" del chat) ---
+# Reportes que se redactan a la vez; el limitador del LLM sigue aplicando
+BATCH_REPORT_CONCURRENCY = int(os.getenv("BATCH_REPORT_CONCURRENCY", str(FUNDING_MAX_CONCURRENCY)))
+
+# --- Perfilado de CPU y memoria por nodo (agent/profiling.py), para staging ---
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# Reportes por hilo en PROFILING_DIR/<thread_id>/
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+# Segundos entre muestras de las pilas
+PROFILING_SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL", "0.005"))
+# Frames que guarda tracemalloc por asignación y asignaciones por reporte
+PROFILING_ALLOC_FRAMES = int(os.getenv("PROFILING_ALLOC_FRAMES", "8"))
+PROFILING_TOP_ALLOCATIONS = int(os.getenv("PROFILING_TOP_ALLOCATIONS", "25"))
+
+# --- Presupuestos por hilo y por usuario (agent/budget.py); 0 = sin límite ---
+THREAD_BUDGETS = {
+    "llm_tokens": int(os.getenv("THREAD_LLM_TOKEN_BUDGET", "400000")),
+    "llm_calls": int(os.getenv("THREAD_LLM_CALL_BUDGET", "250")),
+    "search_calls": int(os.getenv("THREAD_SEARCH_CALL_BUDGET", "60")),
+}
+USER_DAILY_BUDGETS = {
+    "llm_tokens": int(os.getenv("USER_DAILY_LLM_TOKEN_BUDGET", "2000000")),
+    "llm_calls": int(os.getenv("USER_DAILY_LLM_CALL_BUDGET", "1500")),
+    "search_calls": int(os.getenv("USER_DAILY_SEARCH_CALL_BUDGET", "300")),
+}
+# Por debajo de esta fracción del presupuesto se pasa a modo "reduced"
+BUDGET_REDUCED_FRACTION = float(os.getenv("BUDGET_REDUCED_FRACTION", "0.2"))
+# Queries de financiación como máximo en modo "reduced"
+BUDGET_REDUCED_MAX_QUERIES = int(os.getenv("BUDGET_REDUCED_MAX_QUERIES", "2"))
+
+# --- Modelos ---
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# Modelo más barato al que se degrada cuando queda poco presupuesto (agent/budget.py)
+CHEAP_LLM_MODEL = os.getenv("CHEAP_LLM_MODEL", "gemini-2.5-flash-lite")
+
+def get_llm(cheap: bool = False):
     """
     Crea y retorna una instancia configurada del modelo LLM de Google.
+
+    Args:
+        cheap: Usa CHEAP_LLM_MODEL en lugar de LLM_MODEL.
     """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("La variable de entorno GEMINI_API_KEY no está configurada.")
         
     return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash", # Puedes cambiarlo por gemini-1.5-pro si necesitas más potencia
+        model=CHEAP_LLM_MODEL if cheap else LLM_MODEL,
         api_key=api_key,
-        temperature=0.8 # Una temperatura baja es buena para tareas que requieren predictibilidad
-    )
\ No newline at end of file
+        temperature=0.8, # Una temperatura baja es buena para tareas que requieren predictibilidad
+        rate_limiter=LLM_RATE_LIMITER,
+    )
+
+
+def _parsed_as_dict(output: dict, config: RunnableConfig) -> dict:
+    parsed = output.get("parsed")
+    if output.get("parsing_error") is not None or parsed is None:
+        LLM_PARSE_FAILURES.labels(config.get("metadata", {}).get("langgraph_node", "unknown")).inc()
+        raise OutputParserException(f"Respuesta fuera del schema: {output.get('parsing_error')}")
+    return parsed.model_dump()
+
+
+def structured_output(llm, schema):
+    """
+    Envuelve el LLM con salida estructurada nativa: el modelo genera JSON
+    restringido a `schema` (un modelo de pydantic), así que el prompt no
+    necesita instrucciones de formato.
+
+    Devuelve un dict, como el JsonOutputParser al que sustituye. Si la
+    respuesta no se ajusta al schema lanza OutputParserException (y la
+    cuenta en agent_llm_parse_failures_total), de modo que `.with_retry`
+    la reintenta en lugar de perder el resultado.
+    """
+    return llm.with_structured_output(schema, include_raw=True) | RunnableLambda(_parsed_as_dict)
@@ -0,0 +1,147 @@
+# src/agent/digests.py
+
+"""
+Resúmenes condensados de los papers del hilo.
+
+Cada paper se resume una sola vez, cuando llega a la colección (2-3 frases:
+problema, método, resultado y limitación), y sobre esos resúmenes se
+redacta una síntesis de la investigación agrupada por líneas temáticas. Ambos
+viven en el estado del hilo ('paper_digests', 'research_synthesis'), así que
+el checkpointer los conserva entre turnos: solo los papers nuevos se resumen
+y solo entonces se rehace la síntesis.
+
+Todos los reportes toman su contexto académico de aquí (`format_paper_context`)
+en lugar de pegar los abstracts completos o solo los títulos.
+"""
+
+import asyncio
+from typing import Dict, List, Optional
+
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+
+from .config import structured_output, DIGEST_BATCH_SIZE, DIGEST_FALLBACK_CHARS
+
+
+class PaperDigest(BaseModel):
+    """Resumen condensado de un paper."""
+    index: int = Field(description="Índice del paper en la lista recibida")
+    summary: str = Field(description="2-3 frases: problema, método, resultado principal y limitación")
+
+
+class PaperDigestList(BaseModel):
+    """Resúmenes de un lote de papers."""
+    digests: List[PaperDigest] = Field(description="Un resumen por paper recibido")
+
+
+DIGEST_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """
+    Eres un investigador que prepara fichas de lectura. Para cada paper de la lista,
+    escribe en español un resumen de 2-3 frases que recoja el problema que aborda, el
+    método o arquitectura que propone, su resultado principal y, si se menciona, su
+    limitación. Sé concreto (datos, métricas, tecnologías); no repitas el título.
+    Devuelve un resumen por paper con su índice.
+    """),
+    ("human", "Proyecto de referencia: {project_title}\n\nPapers:\n{papers}"),
+])
+
+SYNTHESIS_PROMPT = ChatPromptTemplate.from_template(
+    """
+    Eres un investigador senior. A partir de las fichas de los papers, redacta en español
+    una síntesis de la investigación para el proyecto "{project_title}" ({project_description}).
+
+    Agrupa los papers en 3-5 líneas temáticas. Para cada línea indica en pocas frases los
+    enfoques predominantes, los resultados más sólidos y las limitaciones o brechas, citando
+    los títulos entre corchetes. Termina con un párrafo sobre qué brechas son más relevantes
+    para el proyecto. Máximo 400 palabras, en Markdown.
+
+    Fichas:
+    {digests}
+    """
+)
+
+
+def paper_key(paper: Dict) -> str:
+    """Clave del paper en 'paper_digests' (el título normalizado, como merge_papers)."""
+    return paper.get("title", "N/A").lower().strip()
+
+
+def pending_papers(papers: List[Dict], digests: Dict[str, str]) -> List[Dict]:
+    """Papers que todavía no tienen resumen."""
+    return [paper for paper in papers if paper_key(paper) not in digests]
+
+
+async def _digest_batch(batch: List[Dict], project_title: str, llm) -> Dict[str, str]:
+    papers = "\n\n".join(
+        f"[{i}] Título: {paper.get('title', 'N/A')}\nResumen: {paper.get('content', '')}"
+        for i, paper in enumerate(batch)
+    )
+    chain = (DIGEST_PROMPT | structured_output(llm, PaperDigestList)).with_retry(
+        stop_after_attempt=3,
+        wait_exponential_jitter=True,
+    )
+    try:
+        response = await chain.ainvoke({"project_title": project_title, "papers": papers})
+    except Exception as e:
+        print(f"   ⚠️ Error resumiendo un lote de {len(batch)} papers: {e}")
+        return {}
+    return {
+        paper_key(batch[digest["index"]]): digest["summary"]
+        for digest in response.get("digests", [])
+        if 0 <= digest["index"] < len(batch)
+    }
+
+
+async def digest_papers(papers: List[Dict], project_title: str, llm) -> Dict[str, str]:
+    """
+    Resume los papers en lotes de DIGEST_BATCH_SIZE, todos los lotes en
+    paralelo (el limitador del LLM regula las llamadas). Los papers de un
+    lote fallido se quedan sin resumen y se reintentan la próxima vez.
+    """
+    batches = [papers[i:i + DIGEST_BATCH_SIZE] for i in range(0, len(papers), DIGEST_BATCH_SIZE)]
+    results = await asyncio.gather(*(_digest_batch(batch, project_title, llm) for batch in batches))
+    return {key: summary for result in results for key, summary in result.items()}
+
+
+def _paper_line(paper: Dict, digests: Dict[str, str], with_url: bool, index: Optional[int] = None) -> str:
+    summary = digests.get(paper_key(paper)) or paper.get("content", "")[:DIGEST_FALLBACK_CHARS]
+    bullet = "-" if index is None else f"[{index}]"
+    line = f"{bullet} [{paper.get('source', 'N/A')}] {paper.get('title', 'N/A')}"
+    if with_url:
+        line += f"\n  URL: {paper.get('url', 'No disponible')}"
+    return f"{line}\n  {summary}"
+
+
+async def synthesize_research(papers: List[Dict], digests: Dict[str, str],
+                              project_title: str, project_description: str, llm) -> Optional[str]:
+    """Síntesis por líneas temáticas de todos los papers, o None si falla."""
+    chain = SYNTHESIS_PROMPT | llm
+    try:
+        response = await chain.ainvoke({
+            "project_title": project_title,
+            "project_description": project_description,
+            "digests": "\n".join(_paper_line(paper, digests, with_url=False) for paper in papers),
+        })
+    except Exception as e:
+        print(f"   ⚠️ Error sintetizando la investigación: {e}")
+        return None
+    return response.content
+
+
+def format_paper_context(papers: List[Dict], digests: Dict[str, str], synthesis: Optional[str],
+                         with_url: bool = False, indexed: bool = False) -> str:
+    """
+    Contexto académico para los prompts de los reportes: la síntesis (si la
+    hay) y una ficha por paper. Los papers sin resumen usan el inicio de su
+    abstract (DIGEST_FALLBACK_CHARS). Con `indexed`, cada ficha lleva su
+    posición en `papers` para que el LLM pueda indicar cuáles usó.
+    """
+    if not papers:
+        return "No hay investigación académica disponible."
+    sections = []
+    if synthesis:
+        sections.append(f"Síntesis de la investigación:\n{synthesis}")
+    sections.append("Fichas de los papers:\n" + "\n".join(
+        _paper_line(paper, digests, with_url, index=i if indexed else None) for i, paper in enumerate(papers)
+    ))
+    return "\n\n".join(sections)
@@ -8,6 +8,7 @@ from langchain_community.tools.tavily_search import TavilySearchResults
 
 from ..schemas.models import FundingOpportunity # ¡Importamos el schema de salida!
 from ..config import settings
+from ...metrics import track_external
 
 from ..llm.llm import LlmService
 
@@ -40,7 +41,8 @@ def get_best_content(opportunity: Dict[str, Any]) -> Dict[str, Any]:
         try:
             print(f"  -> Scrapeando: {target_url}")
             loader = WebBaseLoader(target_url)
-            docs = loader.load()
+            with track_external("web_loader"):
+                docs = loader.load()
             content = " ".join([doc.page_content for doc in docs])
             # Limitamos el contenido para no exceder los límites de tokens del LLM
             opportunity["page_content"] = content[:15000]
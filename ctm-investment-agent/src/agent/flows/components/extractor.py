@@ -5,6 +5,7 @@ from langchain_community.document_loaders import WebBaseLoader
 
 from ..schemas.models import FundingOpportunityList
 from ..config import settings
+from ...metrics import track_external
 
 from ..llm.llm import LlmService
 
@@ -15,7 +16,8 @@ def scrape_content(item: dict) -> dict:
     """
     try:
         loader = WebBaseLoader(item["url"])
-        docs = loader.load()
+        with track_external("web_loader"):
+            docs = loader.load()
         content = " ".join([doc.page_content for doc in docs])
         item["page_content"] = content[:10000] 
     except Exception as e:
@@ -1,87 +1,261 @@
 # src/agent/graph.py
 
+import os
+from typing import Dict, Any, Iterable
+
 from langgraph.graph import StateGraph
-from agent.state import ProjectState   
+from langchain_core.runnables import RunnableConfig
+from agent.config import FUNDING_MAX_CONCURRENCY, FUNDING_SCRUTINY_MODE, GRAPH_RECURSION_LIMIT
+from agent.metrics import metrics_callback
+from agent.tracing import tracing_callback
+from agent.budget import budget_callback
+from agent.profiling import profile_nodes
+from agent.state import ProjectState
 from agent.nodes.ingestion import ingest_project_info
 
 # Importamos los nodos de búsqueda de financiación
 from agent.nodes.research import (
-    generate_funding_queries_node, 
-    search_web_node, 
-    scrutinize_results_node, 
+    generate_funding_queries_node,
+    dispatch_search_queries,
+    search_query_node,
+    collect_search_results_node,
+    dispatch_scrutiny,
+    scrutinize_result_node,
+    collect_relevant_results_node,
+    dispatch_extraction,
+    extract_source_node,
+    collect_extracted_node,
+    route_funding_work,
     extract_opportunities_node
 )
 # Importamos los nodos de análisis y reporte
 from agent.nodes.analysis import (
     generate_academic_queries_node, # ¡Nuevo!
-    academic_research, 
+    academic_research,
+    digest_papers_node,
     generate_state_of_the_art_report, # ¡Renombrado!
-    generate_specific_report
+    generate_specific_report,
+    generate_batch_reports
 )
 # Importamos los nodos de chat
 from agent.nodes.chat import (
-    chat_responder, 
-    select_opportunities, 
-    route_chat, 
+    chat_responder,
+    select_opportunities,
+    route_chat,
     process_selection
 )
 from agent.nodes.storage import save_report_as_pdf
 
-builder = StateGraph(ProjectState)
-
-# --- 1. REGISTRAR TODOS LOS NODOS ---
-# Nodos de Ingesta
-builder.add_node("ingest_info", ingest_project_info)
-# Nodos del Flujo Principal (Estado del Arte)
-builder.add_node("generate_academic_queries", generate_academic_queries_node)
-builder.add_node("academic_research", academic_research)
-builder.add_node("generate_state_of_the_art_report", generate_state_of_the_art_report)
-# Nodos del Flujo Secundario (Financiación)
-builder.add_node("generate_funding_queries", generate_funding_queries_node)
-builder.add_node("search_web", search_web_node)
-builder.add_node("scrutinize_results", scrutinize_results_node)
-builder.add_node("extract_opportunities", extract_opportunities_node)
-builder.add_node("select_opportunities", select_opportunities)
-builder.add_node("process_selection", process_selection)
-# Nodos de Reportes Específicos y Guardado
-builder.add_node("generate_specific_report", generate_specific_report)
-builder.add_node("save_report_as_pdf", save_report_as_pdf)
-# Nodo Central de Chat
-builder.add_node("chat_responder", chat_responder)
-
-# --- 2. CONECTAR EL NUEVO FLUJO PRINCIPAL ---
-builder.set_entry_point("ingest_info")
-builder.add_edge("ingest_info", "generate_academic_queries")
-builder.add_edge("generate_academic_queries", "academic_research")
-builder.add_edge("academic_research", "generate_state_of_the_art_report")
-builder.add_edge("generate_state_of_the_art_report", "save_report_as_pdf")
-builder.add_edge("save_report_as_pdf", "chat_responder")
-
-# --- 3. CONECTAR LOS FLUJOS SECUNDARIOS (QUE SALEN DEL CHAT) ---
-
-# Flujo para generar un reporte específico
-builder.add_edge("generate_specific_report", "save_report_as_pdf")
-
-# Flujo completo para buscar financiación
-builder.add_edge("generate_funding_queries", "search_web")
-builder.add_edge("search_web", "scrutinize_results")
-builder.add_edge("scrutinize_results", "extract_opportunities")
-builder.add_edge("extract_opportunities", "select_opportunities")
-builder.add_edge("select_opportunities", "process_selection") 
-builder.add_edge("process_selection", "chat_responder")
-
-
-# --- 4. DEFINIR LAS RUTAS CONDICIONALES ---
-builder.add_conditional_edges(
-    "chat_responder",
-    route_chat,
-    {
-        "continue": "chat_responder",
-        "find_funding": "generate_funding_queries", 
-        "specific_report": "generate_specific_report",
-        "end": "__end__"
-    }
+# Modo del grafo: "linear" (por defecto) o "eager" (ramas paralelas al inicio)
+GRAPH_MODE = os.getenv("AGENT_GRAPH_MODE", "linear").lower()
+
+# Claves que cada rama del modo "eager" devuelve al grafo principal.
+# Son disjuntas entre sí (salvo 'messages', que tiene reducer). No incluyen
+# las listas con reducer del map-reduce ('search_results', 'relevant_results'...):
+# el reducer del grafo principal añadiría a la suya la lista completa de la rama.
+FOUNDATION_KEYS = (
+    "academic_queries", "academic_papers", "paper_digests", "research_synthesis",
+    "report_sections", "report_paper_keys", "improvement_report", "report_type", "report_paths",
 )
+FUNDING_KEYS = ("search_queries", "investment_opportunities", "all_opportunities_history")
+
+
+# ============================================================================
+# SUBGRAFOS DE LAS RAMAS DE INICIO
+# ============================================================================
+
+def add_foundation_pipeline(builder: StateGraph) -> None:
+    """Registra y conecta los nodos del flujo de Estado del Arte."""
+    builder.add_node("generate_academic_queries", generate_academic_queries_node)
+    builder.add_node("academic_research", academic_research)
+    builder.add_node("digest_papers", digest_papers_node)
+    builder.add_node("generate_state_of_the_art_report", generate_state_of_the_art_report)
+    builder.add_edge("generate_academic_queries", "academic_research")
+    builder.add_edge("academic_research", "digest_papers")
+    builder.add_edge("digest_papers", "generate_state_of_the_art_report")
+
+
+def add_funding_pipeline(builder: StateGraph, mode: str = FUNDING_SCRUTINY_MODE) -> None:
+    """
+    Registra y conecta los nodos del descubrimiento de financiación como
+    map-reduce: un worker por query, por resultado y por fuente relevante.
+
+    En modo "priority" el escrutinio y la extracción se despachan por lotes
+    desde 'route_funding_work', que para al alcanzar el objetivo de
+    oportunidades; en modo "exhaustive" se procesan todos los resultados.
+    """
+    builder.add_node("generate_funding_queries", generate_funding_queries_node)
+    builder.add_node("search_query", search_query_node)
+    builder.add_node("collect_search_results", collect_search_results_node)
+    builder.add_node("scrutinize_result", scrutinize_result_node)
+    builder.add_node("collect_relevant_results", collect_relevant_results_node)
+    builder.add_node("extract_source", extract_source_node)
+    builder.add_node("extract_opportunities", extract_opportunities_node)
+
+    builder.add_conditional_edges(
+        "generate_funding_queries", dispatch_search_queries, ["search_query", "collect_search_results"]
+    )
+    builder.add_edge("search_query", "collect_search_results")
+
+    if mode == "priority":
+        builder.add_node("collect_extracted", collect_extracted_node)
+        targets = ["scrutinize_result", "extract_source", "extract_opportunities"]
+        for source in ("collect_search_results", "collect_relevant_results", "collect_extracted"):
+            builder.add_conditional_edges(source, route_funding_work, targets)
+        builder.add_edge("scrutinize_result", "collect_relevant_results")
+        builder.add_edge("extract_source", "collect_extracted")
+        return
+
+    builder.add_conditional_edges(
+        "collect_search_results", dispatch_scrutiny, ["scrutinize_result", "collect_relevant_results"]
+    )
+    builder.add_edge("scrutinize_result", "collect_relevant_results")
+    builder.add_conditional_edges(
+        "collect_relevant_results", dispatch_extraction, ["extract_source", "extract_opportunities"]
+    )
+    builder.add_edge("extract_source", "extract_opportunities")
+
+
+def build_foundation_graph():
+    """Compila la rama académica completa (queries -> papers -> reporte -> PDF)."""
+    sub_builder = profile_nodes(StateGraph(ProjectState))
+    add_foundation_pipeline(sub_builder)
+    sub_builder.add_node("save_report_as_pdf", save_report_as_pdf)
+    sub_builder.set_entry_point("generate_academic_queries")
+    sub_builder.add_edge("generate_state_of_the_art_report", "save_report_as_pdf")
+    sub_builder.set_finish_point("save_report_as_pdf")
+    return sub_builder.compile()
+
+
+def build_funding_discovery_graph():
+    """Compila la rama de descubrimiento de financiación (queries -> oportunidades)."""
+    sub_builder = profile_nodes(StateGraph(ProjectState))
+    add_funding_pipeline(sub_builder)
+    sub_builder.set_entry_point("generate_funding_queries")
+    sub_builder.set_finish_point("extract_opportunities")
+    return sub_builder.compile().with_config(
+        max_concurrency=FUNDING_MAX_CONCURRENCY, recursion_limit=GRAPH_RECURSION_LIMIT,
+    )
+
+
+def _branch_update(state: ProjectState, result: Dict[str, Any], keys: Iterable[str]) -> Dict[str, Any]:
+    """
+    Proyecta el estado final de una rama sobre sus propias claves.
+    Solo se devuelven los mensajes nuevos; el reducer de 'messages' los añade.
+    """
+    update = {key: result[key] for key in keys if key in result}
+    previous_messages = len(state.get("messages", []))
+    update["messages"] = result.get("messages", [])[previous_messages:]
+    return update
+
+
+foundation_graph = build_foundation_graph()
+funding_discovery_graph = build_funding_discovery_graph()
+
+
+async def foundation_research(state: ProjectState, config: RunnableConfig) -> Dict[str, Any]:
+    """
+    NODO (modo eager): Ejecuta toda la rama académica como una sola tarea,
+    en paralelo con 'funding_discovery'.
+    """
+    result = await foundation_graph.ainvoke(state, config)
+    return _branch_update(state, result, FOUNDATION_KEYS)
+
+
+async def funding_discovery(state: ProjectState, config: RunnableConfig) -> Dict[str, Any]:
+    """
+    NODO (modo eager): Ejecuta el descubrimiento de financiación como una sola
+    tarea, en paralelo con 'foundation_research'.
+    """
+    result = await funding_discovery_graph.ainvoke(state, config)
+    return _branch_update(state, result, FUNDING_KEYS)
+
+
+# ============================================================================
+# GRAFO PRINCIPAL
+# ============================================================================
+
+def build_graph(eager: bool = False, checkpointer=None):
+    """
+    Construye y compila el grafo del agente.
+
+    Args:
+        eager: Si es True, tras 'ingest_info' se lanzan en paralelo la rama
+            académica y la de financiación, y ambas se unen antes de la
+            selección de oportunidades y el chat.
+        checkpointer: Checkpointer opcional (el servidor de LangGraph aporta el suyo).
+    """
+    builder = profile_nodes(StateGraph(ProjectState))
+
+    # --- 1. REGISTRAR TODOS LOS NODOS ---
+    # Nodos de Ingesta
+    builder.add_node("ingest_info", ingest_project_info)
+    # Nodos del Flujo Secundario (Financiación)
+    add_funding_pipeline(builder)
+    builder.add_node("select_opportunities", select_opportunities)
+    builder.add_node("process_selection", process_selection)
+    # Nodos de Reportes Específicos y Guardado
+    builder.add_node("generate_specific_report", generate_specific_report)
+    builder.add_node("save_report_as_pdf", save_report_as_pdf)
+    builder.add_node("generate_batch_reports", generate_batch_reports)
+    # Nodo Central de Chat
+    builder.add_node("chat_responder", chat_responder)
+
+    # --- 2. CONECTAR EL FLUJO PRINCIPAL ---
+    builder.set_entry_point("ingest_info")
+    if eager:
+        # Las dos ramas corren en el mismo paso y se unen antes de la selección.
+        builder.add_node("foundation_research", foundation_research)
+        builder.add_node("funding_discovery", funding_discovery)
+        builder.add_edge("ingest_info", "foundation_research")
+        builder.add_edge("ingest_info", "funding_discovery")
+        builder.add_edge(["foundation_research", "funding_discovery"], "select_opportunities")
+    else:
+        builder.add_edge("ingest_info", "generate_academic_queries")
+    # Nodos del Flujo Principal (Estado del Arte). En modo eager solo se llega
+    # a ellos desde el chat, para ampliar la investigación.
+    add_foundation_pipeline(builder)
+    builder.add_edge("generate_state_of_the_art_report", "save_report_as_pdf")
+    builder.add_edge("save_report_as_pdf", "chat_responder")
+
+    # --- 3. CONECTAR LOS FLUJOS SECUNDARIOS (QUE SALEN DEL CHAT) ---
+
+    # Flujo para generar un reporte específico
+    builder.add_edge("generate_specific_report", "save_report_as_pdf")
+
+    # Flujo para generar los reportes de todas las seleccionadas (guarda sus propios PDFs)
+    builder.add_edge("generate_batch_reports", "chat_responder")
+
+    # Flujo completo para buscar financiación
+    builder.add_edge("extract_opportunities", "select_opportunities")
+    builder.add_edge("select_opportunities", "process_selection")
+    builder.add_edge("process_selection", "chat_responder")
+
+    # --- 4. DEFINIR LAS RUTAS CONDICIONALES ---
+    builder.add_conditional_edges(
+        "chat_responder",
+        route_chat,
+        {
+            "continue": "chat_responder",
+            "find_funding": "generate_funding_queries",
+            "specific_report": "generate_specific_report",
+            "batch_reports": "generate_batch_reports",
+            "update_research": "generate_academic_queries",
+            "end": "__end__"
+        }
+    )
+
+    # --- 5. COMPILAR EL GRAFO ---
+    # 'max_concurrency' limita cuántos workers del map-reduce corren a la vez y
+    # 'recursion_limit' deja sitio a los lotes del modo "priority";
+    # los callbacks de métricas y trazas miden nodos, llamadas al LLM y reintentos,
+    # y el de presupuesto carga cada llamada al LLM en el hilo y el usuario
+    return builder.compile(checkpointer=checkpointer).with_config(
+        max_concurrency=FUNDING_MAX_CONCURRENCY,
+        recursion_limit=GRAPH_RECURSION_LIMIT,
+        callbacks=[metrics_callback, tracing_callback, budget_callback],
+    )
+
 
-# --- 5. COMPILAR EL GRAFO ---
-graph = builder.compile()
\ No newline at end of file
+graph = build_graph(eager=GRAPH_MODE == "eager")
+eager_graph = build_graph(eager=True)
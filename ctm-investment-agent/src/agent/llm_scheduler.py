@@ -0,0 +1,170 @@
+# src/agent/llm_scheduler.py
+
+"""
+Planificador de las llamadas al LLM: prioridades y reparto justo entre hilos.
+
+Todas las llamadas del proceso comparten la cuota de Gemini
+(LLM_REQUESTS_PER_SECOND). Con un limitador FIFO, una respuesta del chat
+espera detrás de los 20 escrutinios o de los reportes por lotes que otro
+hilo acaba de encolar. `PriorityRateLimiter` sustituye a ese limitador
+(`get_llm` lo pasa como `rate_limiter`) y, cuando hay cola, decide quién
+usa el siguiente hueco:
+
+- Por clase, con prioridad estricta: "interactive" (el chat) antes que
+  "report" (estado del arte, resúmenes y reportes específicos) antes que
+  "bulk" (queries, escrutinio, extracción, prefetch y el resto).
+- Dentro de una clase, por hilo con weighted fair queuing: cada petición
+  recibe una marca de fin virtual (`max(tiempo virtual de la clase, última
+  marca de su hilo) + 1 / peso`) y sale la menor. Un hilo que lanza 20
+  workers en paralelo no deja sin turno a otro que lanza uno. El peso es
+  1 salvo que la ejecución traiga `configurable.llm_weight`.
+
+La clase sale del nodo que hace la llamada (`metadata.langgraph_node`) y el
+hilo de `thread_id`, ambos del contexto de LangGraph. Fuera de él la llamada
+cuenta como "bulk" sin hilo. Las llamadas síncronas (`acquire`) respetan el
+ritmo pero no la prioridad.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.rate_limiters import BaseRateLimiter
+from langgraph.config import get_config
+
+from .metrics import LLM_QUEUE_WAIT
+
+# Orden de las clases: la primera tiene prioridad sobre las demás
+PRIORITY_CLASSES = ("interactive", "report", "bulk")
+
+# Nodo -> clase; los que no aparecen son "bulk"
+NODE_PRIORITY = {
+    "chat_responder": "interactive",
+    "generate_state_of_the_art_report": "report",
+    "digest_papers": "report",
+    "generate_specific_report": "report",
+    "generate_batch_reports": "report",
+}
+
+
+def _caller() -> Tuple[str, str, float]:
+    """Clase, hilo y peso de la llamada en curso."""
+    try:
+        config = get_config()
+    except RuntimeError:
+        return "bulk", "", 1.0
+    metadata = config.get("metadata", {})
+    configurable = config.get("configurable", {})
+    priority = NODE_PRIORITY.get(metadata.get("langgraph_node"), "bulk")
+    thread_id = metadata.get("thread_id") or configurable.get("thread_id") or ""
+    weight = float(configurable.get("llm_weight") or 1.0)
+    return priority, str(thread_id), weight
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Token bucket de `requests_per_second` (como InMemoryRateLimiter) cuya
+    cola se atiende por clase de prioridad y, dentro de cada clase, por
+    weighted fair queuing entre hilos. Con `prioritize=False` la cola es FIFO.
+    """
+
+    def __init__(self, requests_per_second: float, max_bucket_size: float = 1.0, prioritize: bool = True) -> None:
+        self.requests_per_second = requests_per_second
+        self.max_bucket_size = max_bucket_size
+        self.prioritize = prioritize
+        # El bucket se comparte con las llamadas síncronas, que pueden venir de otros threads
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._last: Optional[float] = None
+        # Cola: (rango de la clase, marca de fin, orden de llegada, clase, hilo, future)
+        self._queue: List[tuple] = []
+        self._arrival = itertools.count()
+        self._virtual: Dict[str, float] = {}
+        self._last_finish: Dict[Tuple[str, str], float] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    # --- Token bucket ---
+    def _take_token(self) -> float:
+        """Consume un hueco si lo hay (devuelve 0) o devuelve los segundos hasta el siguiente."""
+        with self._lock:
+            now = time.monotonic()
+            if self._last is not None:
+                self._tokens = min(
+                    self._tokens + (now - self._last) * self.requests_per_second, self.max_bucket_size
+                )
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.requests_per_second
+
+    # --- Cola ---
+    def _enqueue(self, priority: str, thread_id: str, weight: float, future: asyncio.Future) -> None:
+        if not self.prioritize:
+            priority, thread_id, weight = "bulk", "", 1.0
+        flow = (priority, thread_id)
+        start = max(self._virtual.get(priority, 0.0), self._last_finish.get(flow, 0.0))
+        finish = start + 1.0 / max(weight, 1e-6)
+        self._last_finish[flow] = finish
+        rank = PRIORITY_CLASSES.index(priority)
+        heapq.heappush(self._queue, (rank, finish, next(self._arrival), priority, thread_id, future))
+
+    def _pop(self) -> asyncio.Future:
+        _, finish, _, priority, thread_id, future = heapq.heappop(self._queue)
+        # Sin más peticiones del hilo en cola, su marca ya no hace falta
+        if self._last_finish.get((priority, thread_id)) == finish:
+            del self._last_finish[(priority, thread_id)]
+        if not future.done():
+            self._virtual[priority] = max(self._virtual.get(priority, 0.0), finish)
+        return future
+
+    def _drop_cancelled(self) -> None:
+        while self._queue and self._queue[0][-1].done():
+            self._pop()
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._drop_cancelled()
+            if not self._queue:
+                return
+            wait = self._take_token()
+            if wait:
+                # Al despertar se vuelve a mirar la cabeza: puede haber llegado algo más prioritario
+                await asyncio.sleep(wait)
+                continue
+            self._pop().set_result(None)
+
+    def _ensure_dispatcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    # --- Interfaz de BaseRateLimiter ---
+    def acquire(self, *, blocking: bool = True) -> bool:
+        while True:
+            wait = self._take_token()
+            if not wait:
+                return True
+            if not blocking:
+                return False
+            time.sleep(wait)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        priority, thread_id, weight = _caller()
+        started = time.perf_counter()
+        # Sin cola se pasa directamente; con cola nadie se la salta
+        if not self._queue and not self._take_token():
+            LLM_QUEUE_WAIT.labels(priority).observe(0)
+            return True
+        if not blocking:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(priority, thread_id, weight, future)
+        self._ensure_dispatcher()
+        await future
+        LLM_QUEUE_WAIT.labels(priority).observe(time.perf_counter() - started)
+        return True
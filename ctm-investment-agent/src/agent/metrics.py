@@ -0,0 +1,178 @@
+# src/agent/metrics.py
+
+"""
+Métricas Prometheus del agente.
+
+- Nodos y LLM: `MetricsCallbackHandler` se registra como callback del grafo
+  compilado, así que mide cada nodo, cada llamada al LLM (tokens incluidos)
+  y cada reintento de `.with_retry` sin tocar el código de los nodos.
+- Servicios externos (Tavily, Brave, arXiv, Semantic Scholar, WebBaseLoader,
+  ReportLab): `track_external(servicio)` alrededor de la llamada.
+- Cachés: `record_cache(nombre, hit)`.
+- Single-flight: `SINGLE_FLIGHT_CALLS` por tipo de llamada y papel (ver agent/singleflight.py).
+- Planificador del LLM: `LLM_QUEUE_WAIT` por clase de prioridad (ver agent/llm_scheduler.py).
+- Salida estructurada: `LLM_PARSE_FAILURES` (ver `structured_output` en agent/config.py).
+
+Se exponen en `GET /metrics` (ver agent/webapp.py).
+"""
+
+import time
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+from prometheus_client import Counter, Histogram
+
+from .tracing import tracing_callback
+
+# Buckets pensados para llamadas de LLM y búsquedas (de 50 ms a 5 min)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+NODE_DURATION = Histogram(
+    "agent_node_duration_seconds", "Duración de cada ejecución de un nodo del grafo.",
+    ["node"], buckets=LATENCY_BUCKETS,
+)
+NODE_ERRORS = Counter(
+    "agent_node_errors_total", "Ejecuciones de nodos que terminaron con excepción (sin contar interrupciones).",
+    ["node"],
+)
+LLM_CALLS = Counter("agent_llm_calls_total", "Llamadas al LLM.", ["node"])
+LLM_DURATION = Histogram(
+    "agent_llm_duration_seconds", "Duración de las llamadas al LLM.", ["node"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("agent_llm_tokens_total", "Tokens consumidos por el LLM.", ["node", "kind"])
+LLM_ERRORS = Counter("agent_llm_errors_total", "Llamadas al LLM que fallaron.", ["node"])
+LLM_PARSE_FAILURES = Counter(
+    "agent_llm_parse_failures_total", "Respuestas del LLM que no se ajustaron al schema pedido.", ["node"],
+)
+RETRIES = Counter("agent_retries_total", "Reintentos de cadenas con .with_retry.", ["node"])
+EXTERNAL_DURATION = Histogram(
+    "agent_external_call_duration_seconds", "Duración de las llamadas a servicios externos.",
+    ["service"], buckets=LATENCY_BUCKETS,
+)
+EXTERNAL_ERRORS = Counter("agent_external_call_errors_total", "Llamadas a servicios externos que fallaron.", ["service"])
+CACHE_REQUESTS = Counter("agent_cache_requests_total", "Consultas a cachés internas.", ["cache", "result"])
+SINGLE_FLIGHT_CALLS = Counter(
+    "agent_single_flight_calls_total",
+    "Peticiones al single-flight: 'leader' hace la llamada, 'follower' y 'remote_follower' comparten la de otro.",
+    ["kind", "role"],
+)
+LLM_QUEUE_WAIT = Histogram(
+    "agent_llm_queue_wait_seconds", "Espera en el planificador del LLM antes de cada llamada.",
+    ["priority"], buckets=LATENCY_BUCKETS,
+)
+
+tracer = trace.get_tracer("agent")
+
+
+def _node_of(metadata: Any) -> str:
+    return (metadata or {}).get("langgraph_node", "unknown")
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Callback que alimenta las métricas de nodos, LLM y reintentos."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._nodes: Dict[UUID, tuple] = {}
+        self._llm: Dict[UUID, tuple] = {}
+        # Nodo de cada cadena en curso, para atribuir los reintentos
+        self._chains: Dict[UUID, str] = {}
+
+    # --- Nodos ---
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node:
+            self._chains[run_id] = node
+        # Solo el runnable del propio nodo, no las cadenas internas que hereden su metadata
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs) -> None:
+        self._chains.pop(run_id, None)
+        if run_id in self._nodes:
+            node, start = self._nodes.pop(run_id)
+            NODE_DURATION.labels(node).observe(time.perf_counter() - start)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._chains.pop(run_id, None)
+        if run_id in self._nodes:
+            node, start = self._nodes.pop(run_id)
+            NODE_DURATION.labels(node).observe(time.perf_counter() - start)
+            # Las interrupciones (GraphInterrupt) son pausas, no errores
+            if type(error).__name__ not in ("GraphInterrupt", "NodeInterrupt"):
+                NODE_ERRORS.labels(node).inc()
+
+    # --- LLM ---
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs) -> None:
+        node = _node_of(metadata)
+        LLM_CALLS.labels(node).inc()
+        self._llm[run_id] = (node, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        if run_id not in self._llm:
+            return
+        node, start = self._llm.pop(run_id)
+        LLM_DURATION.labels(node).observe(time.perf_counter() - start)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                if usage:
+                    LLM_TOKENS.labels(node, "prompt").inc(usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(node, "completion").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        if run_id in self._llm:
+            node, start = self._llm.pop(run_id)
+            LLM_DURATION.labels(node).observe(time.perf_counter() - start)
+            LLM_ERRORS.labels(node).inc()
+
+    # --- Reintentos ---
+    def on_retry(self, retry_state, *, run_id: UUID, **kwargs) -> None:
+        RETRIES.labels(self._chains.get(run_id, "unknown")).inc()
+
+
+class track_external:
+    """
+    Mide una llamada a un servicio externo (síncrona o asíncrona) y la
+    registra como span de OpenTelemetry (ver agent/tracing.py):
+
+        async with track_external("tavily"):
+            response = await tavily_client.search(...)
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+
+    def __enter__(self):
+        # Cuelga del span del nodo en curso (los callbacks de trazas no lo hacen actual)
+        self._span_cm = tracer.start_as_current_span(f"external {self.service}", context=tracing_callback.current_context(),
+                                                     attributes={"service": self.service})
+        self._span = self._span_cm.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        EXTERNAL_DURATION.labels(self.service).observe(time.perf_counter() - self._start)
+        if exc_type is not None:
+            EXTERNAL_ERRORS.labels(self.service).inc()
+            self._span.set_status(Status(StatusCode.ERROR, str(exc)))
+        self._span_cm.__exit__(exc_type, exc, tb)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Cuenta un acierto o fallo de caché (la tasa de aciertos se calcula en Prometheus)."""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+metrics_callback = MetricsCallbackHandler()
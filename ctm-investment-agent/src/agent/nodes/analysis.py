@@ -1,18 +1,31 @@
 # src/agent/nodes/analysis.py
 
-
+import asyncio
+import os
+import time
 from typing import Dict, Any, List
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 from datetime import datetime
 
-# Importaciones para herramientas académicas
-from langchain_community.retrievers import ArxivRetriever
-from langchain_community.utilities.semanticscholar import SemanticScholarAPIWrapper
-
 from ..state import ProjectState
-from ..config import get_llm
+from ..academic import AcademicPaper, ArxivClient, SemanticScholarClient
+from ..config import (
+    get_llm,
+    structured_output,
+    ACADEMIC_RESULTS_PER_QUERY,
+    BATCH_REPORT_CONCURRENCY,
+    PROJECT_SIMILARITY_INCREMENTAL_QUERIES,
+    PREFETCH_REPORT_WAIT,
+    RESEARCH_UPDATE_QUERIES,
+    SOTA_REPORT_MODE,
+)
+from ..budget import llm_budget_level
+from ..progress import emit_progress
+from ..similarity import index_project_research, merge_papers
+from ..prefetch import get_prepared
+from ..digests import digest_papers, format_paper_context, paper_key, pending_papers, synthesize_research
+from .storage import render_report_pdf
 
 # ============================================================================
 # MODELOS DE DATOS Y LÓGICA COMPARTIDA
@@ -20,13 +33,13 @@ from ..config import get_llm
 
 class AcademicQueries(BaseModel):
     """Define la estructura para las queries de búsqueda académica."""
-    queries: List[str] = Field(description="Lista de 3 queries de búsqueda para papers académicos")
+    queries: List[str] = Field(description="Lista de queries de búsqueda para papers académicos")
 
 # ============================================================================
 # NODO 1: GENERADOR DE QUERIES ACADÉMICAS
 # ============================================================================
 
-def generate_academic_queries_node(state: ProjectState) -> Dict[str, Any]:
+async def generate_academic_queries_node(state: ProjectState) -> Dict[str, Any]:
     """
     NODO: Genera las queries iniciales para la investigación de Estado del Arte.
     Este es el primer paso del nuevo flujo principal.
@@ -35,15 +48,49 @@ def generate_academic_queries_node(state: ProjectState) -> Dict[str, Any]:
     print("NODO: Generando Queries de Búsqueda Académica (Estado del Arte)")
     print("="*80)
 
-    llm = get_llm()
-    parser = JsonOutputParser(pydantic_object=AcademicQueries)
-    
-    system_prompt = """
+    level = await llm_budget_level()
+    if level == "exhausted":
+        print("   ⚠️ Presupuesto agotado. Se omite la búsqueda académica.")
+        return {"academic_queries": []}
+
+    llm = get_llm(cheap=level == "reduced")
+
+    # Si el hilo ya investigó (el chat pide ampliar la investigación), solo se
+    # busca lo que sus queries anteriores no cubren
+    seed_queries = state.get("seed_queries", [])
+    previous_queries = state.get("academic_queries", [])
+    covered_queries = list(dict.fromkeys(seed_queries + previous_queries))
+    if previous_queries:
+        print(f"   -> Ampliando una investigación de {len(previous_queries)} queries.")
+        num_queries = RESEARCH_UPDATE_QUERIES
+        system_prompt = """
+    Eres un asistente de investigación. Ya se buscaron papers para este proyecto con
+    estas queries:
+    {covered_queries}
+    Genera {num_queries} query(s) de búsqueda nuevas, concisas y en inglés, para ArXiv y
+    Semantic Scholar, que amplíen el marco teórico y el estado del arte con aspectos
+    técnicos o científicos del proyecto que esas queries no cubren. No repitas ni
+    reformules las queries existentes.
+    """
+    # Si el hilo parte de proyectos similares, solo se busca lo que los diferencia
+    elif seed_queries:
+        print(f"   -> {len(seed_queries)} queries ya cubiertas por proyectos similares. Búsqueda incremental.")
+        num_queries = PROJECT_SIMILARITY_INCREMENTAL_QUERIES
+        system_prompt = """
+    Eres un asistente de investigación. Ya existe una colección de papers para un 
+    proyecto muy similar, obtenida con estas queries:
+    {covered_queries}
+    Genera {num_queries} query(s) de búsqueda concisas en inglés, para ArXiv y Semantic 
+    Scholar, que cubran SOLO los aspectos técnicos o científicos de este proyecto que 
+    esas queries no cubren. No repitas ni reformules las queries existentes.
+    """
+    else:
+        num_queries = 3
+        system_prompt = """
     Eres un asistente de investigación. Basado en la descripción de un proyecto, 
-    genera 3 queries de búsqueda efectivas y concisas en inglés para encontrar 
+    genera {num_queries} queries de búsqueda efectivas y concisas en inglés para encontrar 
     papers sobre el marco teórico y el estado del arte en ArXiv y Semantic Scholar.
     Enfócate en los aspectos técnicos y científicos clave.
-    {format_instructions}
     """
     
     prompt = ChatPromptTemplate.from_messages([
@@ -51,26 +98,28 @@ def generate_academic_queries_node(state: ProjectState) -> Dict[str, Any]:
         ("human", "Título del Proyecto: {project_title}\nDescripción: {project_description}")
     ])
     
-    chain = prompt | llm | parser
+    chain = prompt | structured_output(llm, AcademicQueries)
     
     try:
-        response = chain.invoke({
+        response = await chain.ainvoke({
             "project_title": state["project_title"],
             "project_description": state["project_description"],
-            "format_instructions": parser.get_format_instructions()
+            "covered_queries": "\n".join(f"- {query}" for query in covered_queries),
+            "num_queries": num_queries,
         })
-        search_queries = response.get('queries', [])
-        print(f"   -> Queries académicas generadas: {search_queries}")
-        return {"search_queries": search_queries}
+        academic_queries = response.get('queries', [])
+        print(f"   -> Queries académicas generadas: {academic_queries}")
+        emit_progress("academic_queries", "completed", counts={"queries": len(academic_queries)})
+        return {"academic_queries": academic_queries}
     except Exception as e:
         print(f"   ⚠️ Error generando queries académicas: {e}")
-        return {"search_queries": []}
+        return {"academic_queries": []}
 
 # ============================================================================
 # NODO 2: EJECUTOR DE BÚSQUEDA ACADÉMICA
 # ============================================================================
 
-def academic_research(state: ProjectState) -> Dict[str, Any]:
+async def academic_research(state: ProjectState) -> Dict[str, Any]:
     """
     NODO: Ejecuta las búsquedas en Arxiv y Semantic Scholar usando las queries del estado.
     Acumula los resultados y evita duplicados.
@@ -79,61 +128,58 @@ def academic_research(state: ProjectState) -> Dict[str, Any]:
     print("NODO: Ejecutando Búsqueda Académica (Con Memoria)")
     print("="*80)
     
-    search_queries = state.get("search_queries")
+    search_queries = state.get("academic_queries")
     if not search_queries:
         print("   -> No hay queries de búsqueda. Saltando este paso.")
         return {}
     
     print(f"   -> Ejecutando {len(search_queries)} queries de búsqueda...")
+    started_at = time.perf_counter()
+    emit_progress("academic_research", "started", total=len(search_queries))
     
-    # --- Inicializar herramientas ---
-    try:
-        arxiv_retriever = ArxivRetriever(load_max_docs=3, doc_content_chars_max=1500)
-        semantic_scholar = SemanticScholarAPIWrapper(top_k_results=3)
-    except Exception as e:
-        print(f"   ⚠️ Error inicializando herramientas de búsqueda: {e}")
-        return {}
-
-    # --- Ejecutar búsquedas ---
-    newly_found_papers = []
-    for query in search_queries:
-        try: # Arxiv
-            arxiv_docs = arxiv_retriever.invoke(query)
-            for doc in arxiv_docs:
-                newly_found_papers.append({
-                    "title": doc.metadata.get("Title", "N/A"),
-                    "url": doc.metadata.get("Entry ID", "N/A").replace("http://arxiv.org/abs/", "https://arxiv.org/pdf/"),
-                    "content": doc.page_content, "source": "Arxiv"
-                })
+    # --- Ejecutar búsquedas (todas las queries y fuentes en paralelo) ---
+    async def search(source: str, client, query: str) -> List[AcademicPaper]:
+        try:
+            return await client.search(query, limit=ACADEMIC_RESULTS_PER_QUERY)
         except Exception as e:
-            print(f"        Error en Arxiv para query '{query}': {e}")
-
-        try: # Semantic Scholar
-            ss_docs = semantic_scholar.run(query)
-            if isinstance(ss_docs, list):
-                for doc in ss_docs:
-                    newly_found_papers.append({
-                        "title": doc.get("title", "N/A"),
-                        "url": doc.get("url", "N/A"),
-                        "content": doc.get("abstract", "No abstract."), "source": "Semantic Scholar"
-                    })
+            print(f"        Error en {source} para query '{query}': {e}")
+            return []
+
+    async with ArxivClient() as arxiv, SemanticScholarClient() as semantic_scholar:
+        batches = await asyncio.gather(*[
+            search(source, client, query)
+            for query in search_queries
+            for source, client in (("Arxiv", arxiv), ("Semantic Scholar", semantic_scholar))
+        ])
+        found = [paper for batch in batches for paper in batch]
+        # Citas y venue de los papers de arXiv, en una sola consulta por lotes
+        try:
+            found = await semantic_scholar.enrich(found)
         except Exception as e:
-            print(f"        Error en Semantic Scholar para query '{query}': {e}")
+            print(f"   ⚠️ No se pudieron completar los papers de arXiv con Semantic Scholar: {e}")
+    newly_found_papers = [paper.to_paper() for paper in found]
 
     # --- Acumular y Desduplicar Resultados ---
     existing_papers = state.get("academic_papers", [])
-    combined_papers = existing_papers + newly_found_papers
-    
-    unique_papers_dict = {
-        paper.get("title", "").lower().strip(): paper 
-        for paper in combined_papers if paper.get("title", "N/A") != "N/A"
-    }
-    final_papers_list = list(unique_papers_dict.values())
+    final_papers_list = merge_papers(existing_papers, newly_found_papers)
     
     newly_added_count = len(final_papers_list) - len(existing_papers)
     print(f"   -> Se añadieron {newly_added_count} papers únicos. Total en colección: {len(final_papers_list)}")
+    emit_progress("academic_research", "completed", total=len(search_queries),
+                  counts={"new_papers": newly_added_count, "total_papers": len(final_papers_list)},
+                  started_at=started_at)
     
     message = f"He realizado la investigación y acumulado un total de {len(final_papers_list)} artículos. Ahora generaré el reporte de Marco Teórico."
+
+    # Registrar la investigación del hilo para que proyectos similares la reutilicen
+    if state.get("thread_id"):
+        await index_project_research(
+            state["thread_id"],
+            state["project_title"],
+            state["project_description"],
+            list(dict.fromkeys(state.get("seed_queries", []) + search_queries)),
+            final_papers_list,
+        )
     
     return {
         "academic_papers": final_papers_list,
@@ -141,98 +187,270 @@ def academic_research(state: ProjectState) -> Dict[str, Any]:
     }
 
 # ============================================================================
-# NODO 3: GENERADOR DE REPORTE DE ESTADO DEL ARTE
+# NODO 3: RESÚMENES DE LOS PAPERS (CONTEXTO COMPARTIDO DE LOS REPORTES)
 # ============================================================================
 
-def generate_state_of_the_art_report(state: ProjectState) -> Dict[str, Any]:
+async def digest_papers_node(state: ProjectState) -> Dict[str, Any]:
     """
-    Genera un reporte académico que establece el marco teórico y el estado del arte
-    del proyecto, basándose en la investigación académica proporcionada.
+    NODO: Resume los papers que aún no tienen resumen y, si hubo alguno nuevo,
+    rehace la síntesis de la colección. Los reportes usan ambos como contexto.
     """
     print("\n" + "="*80)
-    print("NODO: GENERACIÓN DE REPORTE ACADÉMICO (MARCO TEÓRICO Y ESTADO DEL ARTE)")
+    print("NODO: Resumiendo Papers para los Reportes")
     print("="*80)
-    
-    if not state.get("academic_papers"):
-        print("   -> No hay investigación académica para generar un reporte. Saltando.")
-        return {"improvement_report": "No se pudo generar el reporte ya que no se encontró investigación académica."}
 
-    llm = get_llm()
-    
-    # Prepara un resumen de los papers que servirá como contexto principal para el LLM.
-    papers_summary = "\n\n".join(
-        [f"Fuente: {p.get('source', 'N/A')}\nTítulo: {p.get('title', '')}\nURL: {p.get('url', '')}\nResumen: {p.get('content', '')}"
-         for p in state["academic_papers"]]
+    papers = state.get("academic_papers", [])
+    digests = state.get("paper_digests") or {}
+    pending = pending_papers(papers, digests)
+    if not pending:
+        print("   -> Todos los papers tienen ya su resumen.")
+        return {}
+
+    level = await llm_budget_level()
+    if level == "exhausted":
+        # Los reportes usarán el inicio de cada abstract
+        print("   ⚠️ Presupuesto agotado. Se omiten los resúmenes.")
+        return {}
+
+    llm = get_llm(cheap=level == "reduced")
+    started_at = time.perf_counter()
+    emit_progress("paper_digests", "started", total=len(pending))
+    print(f"   -> Resumiendo {len(pending)} papers nuevos ({len(digests)} ya resumidos)...")
+
+    new_digests = await digest_papers(pending, state["project_title"], llm)
+    if not new_digests:
+        emit_progress("paper_digests", "error", started_at=started_at, message="No se pudo resumir ningún paper")
+        return {}
+    digests = {**digests, **new_digests}
+    synthesis = await synthesize_research(
+        papers, digests, state["project_title"], state["project_description"], llm
     )
-    
-    print("\n[1/1] Generando reporte de Marco Teórico y Estado del Arte...")
-    
-    academic_report_prompt = ChatPromptTemplate.from_template(
-        """
-        **Rol:** Eres un Investigador Senior y Analista Científico con alta especialización en la redacción de documentos técnicos (whitepapers) y secciones de introducción para artículos de investigación (papers).
 
-        **Tarea:** Redactar un reporte de fundamentación exhaustivo para un proyecto tecnológico. Tu reporte debe sintetizar la investigación académica proporcionada para construir un sólido **Marco Teórico** y un detallado **Análisis del Estado del Arte**. El objetivo es crear un documento fundacional que justifique la relevancia y la innovación del proyecto.
+    print(f"   -> {len(new_digests)} resúmenes nuevos. Síntesis {'actualizada' if synthesis else 'no disponible'}.")
+    emit_progress("paper_digests", "completed", total=len(pending), started_at=started_at,
+                  counts={"new_digests": len(new_digests), "total_digests": len(digests)})
+    return {
+        "paper_digests": digests,
+        # Si la síntesis falla se conserva la anterior
+        "research_synthesis": synthesis or state.get("research_synthesis"),
+    }
 
-        **Contexto del Proyecto:**
-        - Título: {project_title}
-        - Descripción: {project_description}
+# ============================================================================
+# NODO 4: GENERADOR DE REPORTE DE ESTADO DEL ARTE
+# ============================================================================
+
+# Secciones del reporte: (id, título, instrucciones). El LLM las redacta por
+# separado para que, al llegar papers nuevos, solo se rehagan las afectadas.
+SOTA_SECTIONS = [
+    ("1.1", "Conceptos Fundamentales",
+     "Define los 3-4 conceptos teóricos más cruciales que sustentan este proyecto, basándote en la literatura proporcionada. Para cada concepto, ofrece una explicación clara y su relevancia directa para el problema que el proyecto busca resolver."),
+    ("1.2", "Modelos y Metodologías Relevantes",
+     "Describe los modelos (matemáticos, computacionales, etc.), algoritmos o metodologías científicas clave que aparecen en la investigación. No te limites a enumerarlos; explica su funcionamiento a un nivel conceptual y por qué son la base sobre la que se puede construir la solución del proyecto."),
+    ("1.3", "Justificación Científica del Enfoque del Proyecto",
+     "Sintetiza cómo la combinación de los conceptos y modelos anteriores valida el enfoque descrito para el proyecto. Responde a la pregunta: ¿Por qué, desde un punto de vista científico y teórico, es viable y prometedor el camino que propone este proyecto?"),
+    ("2.1", "Técnicas y Enfoques Predominantes",
+     "Basándote exclusivamente en los papers, resume las soluciones, arquitecturas y tecnologías que se emplean actualmente para abordar el problema central del proyecto. Agrupa enfoques similares si es posible."),
+    ("2.2", "Limitaciones Identificadas y Brechas en la Investigación",
+     "Identifica y detalla los desafíos no resueltos, las limitaciones de los métodos actuales o las \"brechas\" (gaps) que la propia investigación académica señala. Sé específico. Por ejemplo: \"baja precisión en condiciones de poca luz\", \"alto coste computacional\", \"falta de datasets estandarizados\", etc."),
+    ("2.3", "Posicionamiento e Innovación Clave del Proyecto",
+     "Este es el punto más importante. Explica de forma precisa cómo el proyecto se posiciona frente al estado del arte. Argumenta cuál de las limitaciones identificadas aborda directamente. Define su principal propuesta de valor innovadora en el contexto de la investigación actual."),
+]
+SOTA_CHAPTERS = {"1": "Marco Teórico", "2": "Análisis del Estado del Arte"}
 
-        **Fuentes de Investigación Primarias (Resúmenes de Artículos Académicos):**
-        {papers}
 
-        **INSTRUCCIONES DE ALTO NIVEL:**
-        Genera un reporte coherente y bien estructurado que siga rigurosamente el siguiente formato. Sé analítico, profundo y conecta siempre la teoría con el proyecto específico.
+class ReportSection(BaseModel):
+    """Una sección del reporte de estado del arte."""
+    id: str = Field(description="Identificador de la sección (p. ej. '1.2')")
+    content: str = Field(description="Texto de la sección en Markdown, sin el encabezado de la sección")
+    paper_indices: List[int] = Field(description="Índices de los papers en los que se basa la sección")
 
-        ---
-        
-        ## 1. Marco Teórico
 
-        ### 1.1. Conceptos Fundamentales
-        Define los 3-4 conceptos teóricos más cruciales que sustentan este proyecto, basándote en la literatura proporcionada. Para cada concepto, ofrece una explicación clara y su relevancia directa para el problema que {project_title} busca resolver.
+class ReportSections(BaseModel):
+    """Secciones redactadas del reporte de estado del arte."""
+    sections: List[ReportSection] = Field(description="Una entrada por cada sección pedida")
 
-        ### 1.2. Modelos y Metodologías Relevantes
-        Describe los modelos (matemáticos, computacionales, etc.), algoritmos o metodologías científicas clave que aparecen en la investigación. No te limites a enumerarlos; explica su funcionamiento a un nivel conceptual y por qué son la base sobre la que se puede construir la solución del proyecto.
-        
-        ### 1.3. Justificación Científica del Enfoque del Proyecto
-        Sintetiza cómo la combinación de los conceptos y modelos anteriores valida el enfoque descrito para el proyecto. Este apartado debe responder a la pregunta: ¿Por qué, desde un punto de vista científico y teórico, es viable y prometedor el camino que propone este proyecto?
 
-        ---
-        
-        ## 2. Análisis del Estado del Arte
+class AffectedSections(BaseModel):
+    """Secciones del reporte que los papers nuevos obligan a revisar."""
+    section_ids: List[str] = Field(description="Identificadores de las secciones afectadas; vacía si ninguna")
 
-        ### 2.1. Técnicas y Enfoques Predominantes
-        Basándote exclusivamente en los papers, resume las soluciones, arquitecturas y tecnologías que se emplean actualmente para abordar el problema central del proyecto. Agrupa enfoques similares si es posible.
-        
-        ### 2.2. Limitaciones Identificadas y Brechas en la Investigación
-        Identifica y detalla los desafíos no resueltos, las limitaciones de los métodos actuales o las "brechas" (gaps) que la propia investigación académica señala. Sé específico. Por ejemplo: "baja precisión en condiciones de poca luz", "alto coste computacional", "falta de datasets estandarizados", etc.
 
-        ### 2.3. Posicionamiento e Innovación Clave del Proyecto
-        Este es el punto más importante. Explica de forma precisa cómo {project_title} se posiciona frente al estado del arte. Argumenta cuál de las limitaciones identificadas en el punto anterior aborda directamente. Define su principal propuesta de valor innovadora en el contexto de la investigación actual.
+SOTA_SECTIONS_PROMPT = ChatPromptTemplate.from_template(
+    """
+    **Rol:** Eres un Investigador Senior y Analista Científico con alta especialización en la redacción de documentos técnicos (whitepapers) y secciones de introducción para artículos de investigación (papers).
+
+    **Tarea:** Redactar secciones de un reporte de fundamentación exhaustivo para un proyecto tecnológico. El reporte sintetiza la investigación académica proporcionada para construir un sólido **Marco Teórico** y un detallado **Análisis del Estado del Arte**, y justifica la relevancia y la innovación del proyecto.
 
-        ---
+    **Contexto del Proyecto:**
+    - Título: {project_title}
+    - Descripción: {project_description}
 
-        **REQUISITOS ADICIONALES:**
-        - **Lenguaje:** Utiliza un tono formal, objetivo y académico.
-        - **Citas:** Cuando un hallazgo o concepto provenga de una fuente específica, referéncialo sutilmente en el texto. Ejemplo: "...tal como se demuestra en el estudio sobre Fusión de Sensores (Fuente: [Nombre de la Fuente], Título: [Título del Paper])".
-        - **Formato:** Usa formato Markdown (`##`, `###`, `**`, `-`) para garantizar una estructura limpia y legible.
+    **Fuentes de Investigación Primarias (Síntesis y Resúmenes de Artículos Académicos):**
+    {papers}
+
+    **Secciones a redactar:**
+    {sections}
+
+    {current_sections}
+
+    **REQUISITOS:**
+    - **Lenguaje:** Utiliza un tono formal, objetivo y académico. Sé analítico, profundo y conecta siempre la teoría con el proyecto específico.
+    - **Citas:** Cuando un hallazgo o concepto provenga de una fuente específica, referéncialo sutilmente en el texto. Ejemplo: "...tal como se demuestra en el estudio sobre Fusión de Sensores (Fuente: [Nombre de la Fuente], Título: [Título del Paper])".
+    - **Formato:** Usa Markdown (`**`, `-`, `####`) dentro de cada sección, sin repetir su encabezado.
+    - Para cada sección, indica los índices de los papers en los que se basa.
+    """
+)
 
-        **COMIENZA EL REPORTE A CONTINUACIÓN:**
-        """
+AFFECTED_SECTIONS_PROMPT = ChatPromptTemplate.from_template(
+    """
+    Se han añadido papers nuevos a la investigación del proyecto "{project_title}". Este es el
+    inicio de cada sección del reporte de estado del arte actual:
+
+    {sections}
+
+    Papers nuevos:
+    {papers}
+
+    Indica qué secciones deben reescribirse porque los papers nuevos aportan conceptos, métodos,
+    técnicas o limitaciones que cambian su contenido. No incluyas secciones a las que los papers
+    no añaden nada relevante.
+    """
+)
+
+
+def _sections_spec(section_ids: List[str]) -> str:
+    return "\n".join(
+        f"- {section_id}. **{title}:** {instructions}"
+        for section_id, title, instructions in SOTA_SECTIONS if section_id in section_ids
     )
-    
-    report_chain = academic_report_prompt | llm
-    report_response = report_chain.invoke({
+
+
+async def _write_sections(state: ProjectState, section_ids: List[str], papers: List[Dict],
+                          llm, current: Dict[str, Dict] = None) -> Dict[str, Dict]:
+    """
+    Redacta las secciones pedidas a partir de `papers` y devuelve
+    {id: {"content", "papers"}} con las claves de los papers usados. Con
+    `current`, el LLM parte del texto actual de esas secciones.
+    """
+    current_sections = ""
+    if current:
+        current_sections = "**Texto actual de las secciones (actualízalo incorporando los papers nuevos, sin perder lo que siga siendo válido):**\n" + "\n\n".join(
+            f"{section_id}:\n{current[section_id]['content']}" for section_id in section_ids if section_id in current
+        )
+    chain = (SOTA_SECTIONS_PROMPT | structured_output(llm, ReportSections)).with_retry(
+        stop_after_attempt=3,
+        wait_exponential_jitter=True,
+    )
+    response = await chain.ainvoke({
         "project_title": state["project_title"],
         "project_description": state["project_description"],
-        "papers": papers_summary
+        "papers": format_paper_context(
+            papers, state.get("paper_digests") or {}, state.get("research_synthesis"), with_url=True, indexed=True
+        ),
+        "sections": _sections_spec(section_ids),
+        "current_sections": current_sections,
     })
-    academic_content = report_response.content
-    print("   -> Reporte académico completo generado.")
+    return {
+        section["id"]: {
+            "content": section["content"],
+            "papers": [paper_key(papers[i]) for i in section["paper_indices"] if 0 <= i < len(papers)],
+        }
+        for section in response.get("sections", []) if section["id"] in section_ids
+    }
+
+
+async def _affected_sections(state: ProjectState, sections: Dict[str, Dict], new_papers: List[Dict], llm) -> List[str]:
+    """Secciones que los papers nuevos obligan a revisar (todas si la clasificación falla)."""
+    chain = AFFECTED_SECTIONS_PROMPT | structured_output(llm, AffectedSections)
+    try:
+        response = await chain.ainvoke({
+            "project_title": state["project_title"],
+            "sections": "\n".join(
+                f"- {section_id}. {title}: {sections.get(section_id, {}).get('content', '')[:300]}"
+                for section_id, title, _ in SOTA_SECTIONS
+            ),
+            "papers": format_paper_context(new_papers, state.get("paper_digests") or {}, None),
+        })
+    except Exception as e:
+        print(f"   ⚠️ No se pudieron clasificar los papers nuevos ({e}). Se revisan todas las secciones.")
+        return [section_id for section_id, _, _ in SOTA_SECTIONS]
+    return [section_id for section_id, _, _ in SOTA_SECTIONS if section_id in response.get("section_ids", [])]
+
+
+def assemble_sections(sections: Dict[str, Dict]) -> str:
+    """Une las secciones en el cuerpo Markdown del reporte, en el orden de SOTA_SECTIONS."""
+    parts = []
+    for chapter, chapter_title in SOTA_CHAPTERS.items():
+        parts.append(f"## {chapter}. {chapter_title}")
+        for section_id, title, _ in SOTA_SECTIONS:
+            if section_id.startswith(f"{chapter}.") and section_id in sections:
+                parts.append(f"### {section_id}. {title}\n{sections[section_id]['content']}")
+        parts.append("---")
+    return "\n\n".join(parts[:-1])
+
+
+async def generate_state_of_the_art_report(state: ProjectState) -> Dict[str, Any]:
+    """
+    Genera un reporte académico que establece el marco teórico y el estado del arte
+    del proyecto, basándose en la investigación académica proporcionada.
+
+    Guarda cada sección y los papers en los que se basó ('report_sections').
+    En modo "incremental", si ya hay un reporte y han llegado papers nuevos,
+    solo se reescriben las secciones a las que afectan.
+    """
+    print("\n" + "="*80)
+    print("NODO: GENERACIÓN DE REPORTE ACADÉMICO (MARCO TEÓRICO Y ESTADO DEL ARTE)")
+    print("="*80)
+    
+    papers = state.get("academic_papers", [])
+    if not papers:
+        print("   -> No hay investigación académica para generar un reporte. Saltando.")
+        return {"improvement_report": "No se pudo generar el reporte ya que no se encontró investigación académica."}
+
+    level = await llm_budget_level()
+    if level == "exhausted":
+        print("   ⚠️ Presupuesto agotado. Saltando.")
+        return {"improvement_report": "No se pudo generar el reporte porque se agotó el presupuesto del proyecto."}
+
+    llm = get_llm(cheap=level == "reduced")
+    all_section_ids = [section_id for section_id, _, _ in SOTA_SECTIONS]
+    sections = dict(state.get("report_sections") or {})
+    covered = set(state.get("report_paper_keys") or [])
+    new_papers = [paper for paper in papers if paper_key(paper) not in covered]
+    incremental = SOTA_REPORT_MODE == "incremental" and set(all_section_ids) <= sections.keys()
+
+    started_at = time.perf_counter()
+    emit_progress("state_of_the_art_report", "started", counts={"papers": len(papers), "new_papers": len(new_papers)})
+
+    if incremental and not new_papers:
+        print("   -> Sin papers nuevos desde el último reporte. Se reutilizan sus secciones.")
+        regenerated = []
+    elif incremental:
+        regenerated = await _affected_sections(state, sections, new_papers, llm)
+        print(f"\n[1/1] {len(new_papers)} papers nuevos. Reescribiendo secciones: {regenerated or 'ninguna'}")
+        if regenerated:
+            # Contexto de la actualización: los papers que ya alimentaban esas secciones y los nuevos
+            fed = {key for section_id in regenerated for key in sections[section_id]["papers"]}
+            context_papers = [paper for paper in papers if paper_key(paper) in fed] + new_papers
+            try:
+                sections.update(await _write_sections(state, regenerated, context_papers, llm, current=sections))
+            except Exception as e:
+                print(f"   ⚠️ Error en la actualización incremental ({e}). Regenerando el reporte completo.")
+                regenerated = all_section_ids
+                sections = await _write_sections(state, all_section_ids, papers, llm)
+    else:
+        print("\n[1/1] Generando reporte de Marco Teórico y Estado del Arte...")
+        regenerated = all_section_ids
+        sections = await _write_sections(state, all_section_ids, papers, llm)
+
+    academic_content = assemble_sections(sections)
+    print(f"   -> Reporte académico listo ({len(regenerated)}/{len(all_section_ids)} secciones redactadas).")
+    emit_progress("state_of_the_art_report", "completed", started_at=started_at,
+                  counts={"sections_regenerated": len(regenerated), "sections_total": len(all_section_ids)})
     
     # --- ENSAMBLAJE FINAL DEL REPORTE ---
     current_date = datetime.now().strftime("%d de %B de %Y")
-    academic_sources = "\n".join([f"- [{p.get('source', 'N/A')}] {p.get('title', 'N/A')}\n  URL: {p.get('url', 'No disponible')}" for p in state.get("academic_papers", [])])
-    #web_sources = "\n".join([f"- {res.get('title', 'N/A')}\n  URL: {res.get('url', 'No disponible')}" for res in state.get("relevant_results", [])])
+    academic_sources = "\n".join([f"- [{p.get('source', 'N/A')}] {p.get('title', 'N/A')}\n  URL: {p.get('url', 'No disponible')}" for p in papers])
 
     full_report = f"""
 # Reporte de Fundamentación y Estado del Arte
@@ -252,9 +470,6 @@ def generate_state_of_the_art_report(state: ProjectState) -> Dict[str, Any]:
 
 
 """
-
-### Fuentes Web Relevantes
-#{web_sources if web_sources else "No se encontraron fuentes web relevantes."}
     
     print(f"\n{'='*80}")
     print("REPORTE COMPLETO GENERADO Y FORMATEADO")
@@ -263,6 +478,8 @@ def generate_state_of_the_art_report(state: ProjectState) -> Dict[str, Any]:
     return {
         "improvement_report": full_report,
         "report_type": "general",  
+        "report_sections": sections,
+        "report_paper_keys": [paper_key(paper) for paper in papers],
         "messages": [{
             "role": "assistant",
             "content": "He finalizado el reporte de fundamentación, incluyendo el marco teórico y el estado del arte. Ahora procederé a guardarlo como un archivo PDF."
@@ -273,7 +490,86 @@ def generate_state_of_the_art_report(state: ProjectState) -> Dict[str, Any]:
 # ============================================================================
 # NODO PARA REPORTE ESPECÍFICO
 # ============================================================================
-def generate_specific_report(state: ProjectState) -> Dict[str, Any]:
+# Prompt para generar el reporte específico
+SPECIFIC_REPORT_PROMPT = ChatPromptTemplate.from_template(
+    """
+    Actúa como un consultor estratégico. Tu tarea es generar un reporte de análisis y recomendaciones
+    para alinear un proyecto tecnológico con una oportunidad de financiación específica.
+
+    **PROYECTO:**
+    Título: {project_title}
+    Descripción: {project_description}
+
+    **OPORTUNIDAD DE FINANCIACIÓN A ANALIZAR:**
+    {opportunity_details}
+
+    **HALLAZGOS DE INVESTIGACIÓN ACADÉMICA (Contexto):**
+    {papers_summary}
+
+    **INSTRUCCIONES PARA EL REPORTE:**
+    Genera un reporte conciso que incluya los siguientes puntos:
+    1.  **Análisis de Alineación:** Evalúa qué tan bien encaja el proyecto con los objetivos y requisitos de la oportunidad. Destaca las sinergias.
+    2.  **Recomendaciones de Adaptación:** Sugiere 2-3 modificaciones o puntos clave a enfatizar en la propuesta del proyecto para maximizar las posibilidades de éxito con esta financiación. Conecta tus sugerencias con la investigación académica.
+    3.  **Borrador de Pitch:** Escribe un párrafo breve (pitch) que se podría usar en la aplicación, explicando por qué este proyecto es el candidato ideal para esta oportunidad.
+
+    Usa un tono profesional y directo.
+    """
+)
+
+
+def build_report_context(state: ProjectState) -> Dict[str, str]:
+    """
+    Contexto del proyecto común a todos los reportes específicos. En el modo
+    por lotes se calcula una sola vez para todas las oportunidades.
+    """
+    return {
+        "project_title": state["project_title"],
+        "project_description": state["project_description"],
+        "papers_summary": format_paper_context(
+            state.get("academic_papers", []), state.get("paper_digests") or {}, state.get("research_synthesis")
+        ),
+    }
+
+
+async def write_specific_report(opportunity: Dict, context: Dict[str, str], llm) -> str:
+    """
+    Redacta el reporte Markdown (con encabezado) de una oportunidad. Si el
+    prefetch ya descargó y refinó la oportunidad, el reporte parte de ahí.
+    """
+    opportunity_details = f"Origen: {opportunity['origin']}\nDescripción: {opportunity['description']}"
+    prepared = await get_prepared(opportunity, wait=PREFETCH_REPORT_WAIT)
+    if prepared:
+        refined = prepared["opportunity"]
+        requirements = "; ".join(refined.get("main_requirements", []))
+        opportunity_details = (
+            f"Origen: {refined.get('origin') or opportunity['origin']}\n"
+            f"Descripción: {refined.get('description') or opportunity['description']}\n"
+            f"Tipo de financiación: {refined.get('financing_type', '')}\n"
+            f"Requisitos principales: {requirements}\n"
+            f"Fecha límite: {refined.get('application_deadline', '')}\n"
+            f"URL: {refined.get('opportunity_url', '')}\n"
+            f"Extracto de la convocatoria: {prepared['page_excerpt']}"
+        )
+    print(f"   -> Redactando reporte: {opportunity['origin'][:60]} (prefetch: {'sí' if prepared else 'no'})")
+
+    chain = SPECIFIC_REPORT_PROMPT | llm
+    report_content = (await chain.ainvoke({**context, "opportunity_details": opportunity_details})).content
+
+    # Añadimos un encabezado al reporte para guardarlo como PDF
+    current_date = datetime.now().strftime("%d de %B de %Y")
+    return f"""
+# ANÁLISIS DE OPORTUNIDAD ESPECÍFICA
+
+**Proyecto:** {context['project_title']}
+**Oportunidad Analizada:** {opportunity['origin']}
+**Fecha de Generación:** {current_date}
+
+---
+{report_content}
+"""
+
+
+async def generate_specific_report(state: ProjectState) -> Dict[str, Any]:
     """
     Genera un reporte detallado para una ÚNICA oportunidad seleccionada.
     """
@@ -281,75 +577,120 @@ def generate_specific_report(state: ProjectState) -> Dict[str, Any]:
     print("NODO: Generar Reporte Específico")
     print("="*80)
 
-    llm = get_llm()
+    # Este nodo siempre pasa por 'save_report_as_pdf': sin reporte nuevo se vacía
+    # 'improvement_report' para que no se guarde otra vez el anterior con este nombre
+    level = await llm_budget_level()
+    if level == "exhausted":
+        return {
+            "improvement_report": None,
+            "messages": [{"role": "assistant", "content": "⚠️ Se ha agotado el presupuesto de este proyecto, así que no puedo generar más reportes."}],
+            "next_action": "continue"
+        }
+
+    llm = get_llm(cheap=level == "reduced")
     opportunity_index = state.get("action_input")
     
     try:
-        # Obtener la oportunidad específica del estado
-        opportunity = state["investment_opportunities"][opportunity_index]
-        opportunity_details = f"Origen: {opportunity['origin']}\nDescripción: {opportunity['description']}"
+        # El chat numera las oportunidades sobre el historial completo
+        # ('investment_opportunities' se vacía tras la selección)
+        opportunities = state.get("all_opportunities_history") or state.get("investment_opportunities", [])
+        opportunity = opportunities[opportunity_index]
     except (TypeError, IndexError):
         return {
+            "improvement_report": None,
             "messages": [{"role": "assistant", "content": "No pude encontrar la oportunidad solicitada. Por favor, verifica el índice."}],
             "next_action": "continue"
         }
 
     print(f"   -> Generando reporte para la oportunidad con índice: {opportunity_index}")
+    started_at = time.perf_counter()
+    emit_progress("specific_report", "started", counts={"opportunity_index": opportunity_index})
 
-    # Prompt para generar el reporte específico
-    specific_report_prompt = ChatPromptTemplate.from_template(
-        """
-        Actúa como un consultor estratégico. Tu tarea es generar un reporte de análisis y recomendaciones
-        para alinear un proyecto tecnológico con una oportunidad de financiación específica.
+    full_specific_report = await write_specific_report(opportunity, build_report_context(state), llm)
 
-        **PROYECTO:**
-        Título: {project_title}
-        Descripción: {project_description}
+    emit_progress("specific_report", "completed", counts={"opportunity_index": opportunity_index}, started_at=started_at)
 
-        **OPORTUNIDAD DE FINANCIACIÓN A ANALIZAR:**
-        {opportunity_details}
+    return {
+        "improvement_report": full_specific_report, 
+        "report_type": "specific",
+        "messages": [{"role": "assistant", "content": f"He generado el análisis para la oportunidad {opportunity_index}. Procederé a guardarlo como PDF."}],
+        "next_action": "continue",
+        "action_input": None
+    }
 
-        **HALLAZGOS DE INVESTIGACIÓN ACADÉMICA (Contexto):**
-        {papers_summary}
 
-        **INSTRUCCIONES PARA EL REPORTE:**
-        Genera un reporte conciso que incluya los siguientes puntos:
-        1.  **Análisis de Alineación:** Evalúa qué tan bien encaja el proyecto con los objetivos y requisitos de la oportunidad. Destaca las sinergias.
-        2.  **Recomendaciones de Adaptación:** Sugiere 2-3 modificaciones o puntos clave a enfatizar en la propuesta del proyecto para maximizar las posibilidades de éxito con esta financiación. Conecta tus sugerencias con la investigación académica.
-        3.  **Borrador de Pitch:** Escribe un párrafo breve (pitch) que se podría usar en la aplicación, explicando por qué este proyecto es el candidato ideal para esta oportunidad.
+async def generate_batch_reports(state: ProjectState) -> Dict[str, Any]:
+    """
+    Genera y guarda como PDF los reportes de TODAS las oportunidades
+    seleccionadas a la vez, en lugar de una por turno de chat.
 
-        Usa un tono profesional y directo.
-        """
-    )
-    
-    papers_summary = "\n".join([f"- {p['title']}" for p in state.get("academic_papers", [])])
-    
-    chain = specific_report_prompt | llm
-    
-    report_content = chain.invoke({
-        "project_title": state["project_title"],
-        "project_description": state["project_description"],
-        "opportunity_details": opportunity_details,
-        "papers_summary": papers_summary
-    }).content
+    El contexto del proyecto se formatea una sola vez; las redacciones corren
+    en paralelo (hasta BATCH_REPORT_CONCURRENCY, y el limitador compartido del
+    LLM sigue regulando las llamadas) y cada PDF se renderiza en cuanto su
+    reporte está listo, mientras los demás se siguen redactando.
+    """
+    print("\n" + "="*80)
+    print("NODO: Generar Reportes de Todas las Oportunidades Seleccionadas")
+    print("="*80)
 
-    # Añadimos un encabezado al reporte para guardarlo como PDF
-    current_date = datetime.now().strftime("%d de %B de %Y")
-    full_specific_report = f"""
-# ANÁLISIS DE OPORTUNIDAD ESPECÍFICA
+    selected = state.get("selected_opportunities", [])
+    if not selected:
+        return {
+            "messages": [{"role": "assistant", "content": "Aún no has seleccionado oportunidades. Busca financiación y elige algunas primero."}],
+            "next_action": "continue"
+        }
 
-**Proyecto:** {state['project_title']}
-**Oportunidad Analizada:** {opportunity['origin']}
-**Fecha de Generación:** {current_date}
+    level = await llm_budget_level()
+    if level == "exhausted":
+        return {
+            "messages": [{"role": "assistant", "content": "⚠️ Se ha agotado el presupuesto de este proyecto, así que no puedo generar más reportes."}],
+            "next_action": "continue"
+        }
 
----
-{report_content}
-"""
+    llm = get_llm(cheap=level == "reduced")
+    context = build_report_context(state)
+    semaphore = asyncio.Semaphore(BATCH_REPORT_CONCURRENCY)
+    total = len(selected)
+    completed = 0
+    started_at = time.perf_counter()
+    emit_progress("specific_report", "started", total=total)
+    print(f"   -> Generando {total} reportes (hasta {BATCH_REPORT_CONCURRENCY} a la vez)...")
+
+    async def report_and_render(position: int, opportunity: Dict) -> str:
+        nonlocal completed
+        item_started_at = time.perf_counter()
+        async with semaphore:
+            report = await write_specific_report(opportunity, context, llm)
+        # El PDF no ocupa hueco del semáforo: ReportLab corre en un hilo aparte
+        file_path = await render_report_pdf(
+            report, "specific", f"Analisis_Seleccionada_{position}",
+            state.get("thread_id", "unknown"), context["project_title"],
+        )
+        completed += 1
+        emit_progress("specific_report", "item", index=completed, total=total,
+                      started_at=item_started_at, message=os.path.basename(file_path))
+        return file_path
+
+    results = await asyncio.gather(
+        *(report_and_render(position, opp) for position, opp in enumerate(selected)),
+        return_exceptions=True,
+    )
 
+    new_paths = [r for r in results if isinstance(r, str)]
+    errors = [
+        f"- {opp.get('origin', 'N/A')}: {r}"
+        for opp, r in zip(selected, results) if isinstance(r, BaseException)
+    ]
+    emit_progress("specific_report", "completed", total=total, started_at=started_at,
+                  counts={"reports": len(new_paths), "errors": len(errors)})
+    print(f"   ✅ {len(new_paths)}/{total} reportes generados en {time.perf_counter() - started_at:.1f}s")
+
+    content = f"✅ He generado {len(new_paths)} de {total} reportes:\n" + "\n".join(f"`{p}`" for p in new_paths)
+    if errors:
+        content += "\n\n❌ No se pudieron generar:\n" + "\n".join(errors)
     return {
-        "improvement_report": full_specific_report, 
-        "report_type": "specific",
-        "messages": [{"role": "assistant", "content": f"He generado el análisis para la oportunidad {opportunity_index}. Procederé a guardarlo como PDF."}],
+        "report_paths": state.get("report_paths", []) + new_paths,
+        "messages": [{"role": "assistant", "content": content}],
         "next_action": "continue",
         "action_input": None
-    }
\ No newline at end of file
+    }
@@ -1,12 +1,14 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Literal, Optional
 from langgraph.types import interrupt
 from langchain_core.messages import HumanMessage
 from pydantic import BaseModel, Field
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate 
 
 from ..state import ProjectState
-from ..config import get_llm
+from ..config import get_llm, structured_output, PREFETCH_TOP_N
+from ..budget import llm_budget_level, remaining
+from ..progress import emit_progress
+from ..prefetch import start_prefetch
 
 
 # --- MODELO DE DATOS PARA LA DECISIÓN DEL CHAT ---
@@ -15,16 +17,16 @@ class ChatDecision(BaseModel):
     Clasifica la intención del usuario y extrae la información necesaria.
     """
     response: str = Field(description="La respuesta conversacional directa a la pregunta del usuario.")
-    action: str = Field(
-        description="La acción a seguir. Debe ser una de: 'continue' (para seguir chateando), 'find_funding' (para buscar financiación), 'specific_report' (para generar un reporte de una oportunidad), o 'end' (para finalizar)."
+    action: Literal["continue", "find_funding", "specific_report", "batch_reports", "update_research", "end"] = Field(
+        description="La acción a seguir. Debe ser una de: 'continue' (para seguir chateando), 'find_funding' (para buscar financiación), 'specific_report' (para generar un reporte de una oportunidad), 'batch_reports' (para generar los reportes de todas las oportunidades seleccionadas), 'update_research' (para ampliar la investigación académica y actualizar el reporte de estado del arte), o 'end' (para finalizar)."
     )
-    target_index: int = Field(
+    target_index: Optional[int] = Field(
         default=None, 
         description="Si la acción es 'specific_report', este es el índice numérico de la oportunidad mencionada por el usuario."
     )
 
 
-def select_opportunities(state: ProjectState) -> Dict[str, Any]:
+async def select_opportunities(state: ProjectState) -> Dict[str, Any]:
     """
     Nodo que presenta las oportunidades de la ÚLTIMA búsqueda.
     ✅ Ahora solo muestra las oportunidades nuevas, no todo el historial.
@@ -43,8 +45,13 @@ def select_opportunities(state: ProjectState) -> Dict[str, Any]:
             "investment_opportunities": []
         }
     
+    emit_progress("selection", "started", total=len(current_opportunities))
     print(f"\n   Se encontraron {len(current_opportunities)} nuevas oportunidades.")
     print("   Pausando ejecución para esperar selección del usuario...\n")
+
+    # Mientras el usuario lee la lista, se preparan en segundo plano las primeras.
+    # Al reanudar, el nodo se repite, pero las ya preparadas o en curso no se relanzan.
+    await start_prefetch(current_opportunities[:PREFETCH_TOP_N])
     
     opportunities_info = {
         "total_opportunities": len(current_opportunities),
@@ -69,7 +76,7 @@ def select_opportunities(state: ProjectState) -> Dict[str, Any]:
     }
 
 
-def process_selection(state: ProjectState) -> Dict[str, Any]:
+async def process_selection(state: ProjectState) -> Dict[str, Any]:
     """
     Procesa la selección del usuario.
     ✅ Las seleccionadas se AÑADEN a las ya existentes (acumulación).
@@ -110,8 +117,12 @@ def process_selection(state: ProjectState) -> Dict[str, Any]:
 
     # ✅ ACUMULAR: Combinar las previamente seleccionadas con las nuevas
     total_selected = previously_selected + newly_selected
+
+    # Las elegidas que el prefetch especulativo no cubrió se preparan ahora
+    await start_prefetch(newly_selected)
     
     print(f"\n   📊 Total acumulado de oportunidades seleccionadas: {len(total_selected)}\n")
+    emit_progress("selection", "completed", counts={"selected": len(newly_selected), "total_selected": len(total_selected)})
 
     return {
         "selected_opportunities": total_selected,  # ✅ Acumulación
@@ -124,7 +135,7 @@ def process_selection(state: ProjectState) -> Dict[str, Any]:
     }
 
 
-def chat_responder(state: ProjectState) -> Dict[str, Any]:
+async def chat_responder(state: ProjectState) -> Dict[str, Any]:
     """
     Nodo interactivo del chat.
     ✅ Ahora reporta correctamente el historial completo.
@@ -145,14 +156,17 @@ def chat_responder(state: ProjectState) -> Dict[str, Any]:
             "selected_for_analysis": total_selected,
             "academic_papers": len(state.get("academic_papers", [])),
             "reports_generated": len(state.get("report_paths", []))
-        }
+        },
+        # Unidades restantes de cada presupuesto (None = sin límite)
+        "budget": await remaining(),
     })
     
     question = str(user_input)
     print(f"\n   ➡️ Procesando entrada: {question[:80]}...")
     
-    llm = get_llm()
-    parser = JsonOutputParser(pydantic_object=ChatDecision)
+    # El chat sigue respondiendo con el modelo barato aunque el presupuesto
+    # esté agotado; son los nodos de búsqueda y reportes los que se niegan
+    llm = get_llm(cheap=await llm_budget_level() != "ok")
 
     # ✅ Formatear el HISTORIAL COMPLETO para el prompt
     all_history = state.get("all_opportunities_history", [])
@@ -174,8 +188,14 @@ def chat_responder(state: ProjectState) -> Dict[str, Any]:
         - "Analiza la oportunidad 0"
         - "Dame un reporte sobre la de Minciencias"
         - "Profundiza en la segunda opción"
-    3.  `continue`: Para CUALQUIER OTRA PREGUNTA. Si el usuario pide un resumen, pregunta "qué oportunidades hay", o simplemente conversa, la acción es 'continue'.
-    4.  `end`: Si el usuario quiere terminar la sesión ("adiós", "fin", "terminar").
+    3.  `batch_reports`: Dispara la generación de reportes para TODAS las oportunidades seleccionadas a la vez.
+        - "Genera los reportes de todas las seleccionadas"
+        - "Analiza todas las oportunidades que elegí"
+    4.  `update_research`: Amplía la investigación académica con papers nuevos y actualiza el reporte de estado del arte.
+        - "Busca más papers"
+        - "Amplía el estado del arte"
+    5.  `continue`: Para CUALQUIER OTRA PREGUNTA. Si el usuario pide un resumen, pregunta "qué oportunidades hay", o simplemente conversa, la acción es 'continue'.
+    6.  `end`: Si el usuario quiere terminar la sesión ("adiós", "fin", "terminar").
 
     **Contexto (Historial de Oportunidades Encontradas):**
     {opportunities_summary}
@@ -185,39 +205,36 @@ def chat_responder(state: ProjectState) -> Dict[str, Any]:
     2.  Determina la **acción** correcta según las reglas de arriba.
     3.  Si la acción es `specific_report`, extrae el **índice numérico** correspondiente.
     4.  Genera una **respuesta** conversacional corta que confirme la acción.
-    5.  Devuelve un objeto JSON con el formato exacto.
+    5.  Devuelve la decisión en el formato estructurado pedido.
 
     **Ejemplos de Decisión:**
 
     - Usuario: "¿Qué oportunidades hemos encontrado hasta ahora?"
       - Acción: `continue` (Es una pregunta, no un comando de acción)
-      - JSON: {{{{ "response": "Hasta ahora, hemos encontrado las siguientes oportunidades...", "action": "continue", "target_index": null }}}}
+      - JSON: {{ "response": "Hasta ahora, hemos encontrado las siguientes oportunidades...", "action": "continue", "target_index": null }}
 
     - Usuario: "investiga nuevas oportunidades de financiamiento"
       - Acción: `find_funding` (Es un comando de acción explícito)
-      - JSON: {{{{ "response": "Entendido. Iniciando una nueva búsqueda de oportunidades de financiación.", "action": "find_funding", "target_index": null }}}}
+      - JSON: {{ "response": "Entendido. Iniciando una nueva búsqueda de oportunidades de financiación.", "action": "find_funding", "target_index": null }}
 
     - Usuario: "Analiza la oportunidad con índice 1, por favor."
       - Acción: `specific_report` (Comando de acción con un objetivo claro)
-      - JSON: {{{{ "response": "Claro, generando un análisis detallado para la oportunidad 1.", "action": "specific_report", "target_index": 1 }}}}
-
-    {{format_instructions}}
+      - JSON: {{ "response": "Claro, generando un análisis detallado para la oportunidad 1.", "action": "specific_report", "target_index": 1 }}
 """
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
-        ("human", "{{question}}")
+        ("human", "{question}")
     ])
     
-    chain = prompt | llm | parser
+    chain = prompt | structured_output(llm, ChatDecision)
 
     try:
-        decision = chain.invoke({
+        decision = await chain.ainvoke({
             "question": question,
             "opportunities_summary": opportunities_summary,
             "total_history": total_history,
             "total_selected": total_selected,
-            "format_instructions": parser.get_format_instructions()
         })
         
         action = decision.get("action", "continue")
@@ -263,6 +280,10 @@ def route_chat(state: ProjectState) -> str:
         return "find_funding"
     elif action == "specific_report":
         return "specific_report"
+    elif action == "batch_reports":
+        return "batch_reports"
+    elif action == "update_research":
+        return "update_research"
     elif action == "end":
         return "end"
     else:  # Por defecto o si es 'continue'
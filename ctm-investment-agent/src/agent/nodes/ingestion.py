@@ -2,9 +2,11 @@
 
 from typing import Dict, Any
 from ..state import ProjectState
+from ..progress import emit_progress
+from ..similarity import find_similar_projects, merge_papers
 from langchain_core.runnables import RunnableConfig 
 
-def ingest_project_info(state: ProjectState, config: RunnableConfig) -> Dict[str, Any]:
+async def ingest_project_info(state: ProjectState, config: RunnableConfig) -> Dict[str, Any]:
     """
     Nodo de entrada del grafo.
     Confirma la recepción de los datos del proyecto y prepara el siguiente paso.
@@ -18,13 +20,34 @@ def ingest_project_info(state: ProjectState, config: RunnableConfig) -> Dict[str
     # Obtenemos el título del estado actual
     title = state.get("project_title", "sin título")
 
+    # Buscar hilos anteriores con un proyecto casi idéntico para reutilizar su investigación
+    academic_papers = state.get("academic_papers", [])
+    seed_queries = list(state.get("seed_queries", []))
+    seed_threads = list(state.get("seed_threads", []))
+    if not seed_threads:
+        similar_projects = await find_similar_projects(
+            title, state.get("project_description", ""), exclude_thread_id=thread_id
+        )
+        for project in similar_projects:
+            print(f"   ♻️ Proyecto similar: '{project['title']}' ({project['thread_id']}, similitud {project['similarity']})")
+            seed_threads.append(project["thread_id"])
+            seed_queries = list(dict.fromkeys(seed_queries + project["academic_queries"]))
+            academic_papers = merge_papers(academic_papers, project["academic_papers"])
+
     # Preparamos el mensaje de confirmación
+    if seed_threads:
+        research_note = (f"Partiré de la investigación de {len(seed_threads)} proyecto(s) similar(es) "
+                         f"({len(academic_papers)} artículos) y solo buscaré lo que los diferencia.")
+    else:
+        research_note = "Comenzaré con la investigación del estado del arte."
     confirmation_message = {
         "role": "assistant",
-        "content": f"He recibido la información para el proyecto '{title}'.\n"
-                   "Comenzaré con la investigación del estado del arte."
+        "content": f"He recibido la información para el proyecto '{title}'.\n{research_note}"
     }
 
+    emit_progress("ingestion", "completed", counts={"seed_threads": len(seed_threads), "seed_papers": len(academic_papers)},
+                  message=f"Proyecto recibido: {title}")
+
     # CRÍTICO: Inicializar todas las listas acumulativas
     # Si ya existen en el estado, las mantenemos; si no, las inicializamos vacías
     return {
@@ -34,10 +57,11 @@ def ingest_project_info(state: ProjectState, config: RunnableConfig) -> Dict[str
         # Inicializar listas acumulativas (solo si no existen)
         "investment_opportunities": state.get("investment_opportunities", []),
         "selected_opportunities": state.get("selected_opportunities", []),
-        "academic_papers": state.get("academic_papers", []),
+        "academic_papers": academic_papers,
         "report_paths": state.get("report_paths", []),
+        "academic_queries": state.get("academic_queries", []),
+        "seed_threads": seed_threads,
+        "seed_queries": seed_queries,
         "search_queries": state.get("search_queries", []),
-        "search_results": state.get("search_results", []),
-        "relevant_results": state.get("relevant_results", []),
         "document_paths": state.get("document_paths", []),
     }
\ No newline at end of file
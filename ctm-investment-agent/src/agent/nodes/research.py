@@ -2,13 +2,13 @@
 
 import os
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, TypedDict
 from datetime import datetime
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient
 from typing import Literal 
+from langgraph.types import Send
 
 try:
     from langchain_community.tools import BraveSearch
@@ -17,7 +17,20 @@ except ImportError:
     BRAVE_AVAILABLE = False
 
 from ..state import ProjectState
-from ..config import get_llm
+from ..config import (
+    get_llm,
+    structured_output,
+    SEARCH_RATE_LIMITER,
+    BUDGET_REDUCED_MAX_QUERIES,
+    FUNDING_TARGET_OPPORTUNITIES,
+    FUNDING_PRIORITY_BATCH,
+)
+from ..budget import llm_budget_level, remaining, try_consume
+from ..cancellation import is_cancelled, run_cancellable
+from ..singleflight import single_flight
+from ..progress import emit_progress
+from ..metrics import track_external
+from ..tracing import tracer
 
 
 # ============================================================================
@@ -63,7 +76,7 @@ class FundingOpportunityList(BaseModel):
 # PASO 1: GENERACIÓN DE QUERIES
 # ============================================================================
 
-def generate_funding_search_queries(project_details: str, llm) -> List[str]:
+async def generate_funding_search_queries(project_details: str, llm) -> List[str]:
     """
     Genera queries de búsqueda estratégicas basadas en la descripción del proyecto.
     
@@ -86,24 +99,17 @@ def generate_funding_search_queries(project_details: str, llm) -> List[str]:
     - Focus on finding direct funding opportunities, not just news articles.
     - Be creative and combine different keywords in each query.
     - Avoid overly broad terms.
-
-    {format_instructions}
     """
     
-    parser = JsonOutputParser(pydantic_object=QueryList)
-    
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("user", "{project_details}"),
     ])
     
-    chain = prompt_template | llm | parser
+    chain = prompt_template | structured_output(llm, QueryList)
     
     try:
-        result = chain.invoke({
-            "project_details": project_details,
-            "format_instructions": parser.get_format_instructions()
-        })
+        result = await chain.ainvoke({"project_details": project_details})
         
         queries = result.get("queries", [])
         print(f"   ✅ Generadas {len(queries)} ideas de búsqueda")
@@ -122,29 +128,20 @@ def generate_funding_search_queries(project_details: str, llm) -> List[str]:
 
 
 # ============================================================================
-# PASO 2: BÚSQUEDA WEB
+# PASO 2: BÚSQUEDA WEB (UNA QUERY POR WORKER)
 # ============================================================================
 
-def search_web(queries: List[str]) -> List[Dict]:
+def create_search_clients():
     """
-    Realiza búsquedas web usando Tavily API y opcionalmente Brave Search.
-    
+    Inicializa los clientes asíncronos de Tavily y (opcionalmente) Brave Search.
+
     Returns:
-        Lista de resultados de búsqueda normalizados
+        Tupla (tavily_client, brave_client); cualquiera puede ser None.
     """
-    print(f"\n[2/4] Buscando en la web ({len(queries)} queries)...")
-    
     tavily_api_key = os.getenv("TAVILY_API_KEY")
     brave_api_key = os.getenv("BRAVE_SEARCH_API_KEY")
-    
-    if not tavily_api_key and not brave_api_key:
-        print("   ⚠️ Ni TAVILY_API_KEY ni BRAVE_SEARCH_API_KEY configuradas")
-        return []
-    
-    all_results = []
-    
-    # Inicializar clientes
-    tavily_client = TavilyClient(api_key=tavily_api_key) if tavily_api_key else None
+
+    tavily_client = AsyncTavilyClient(api_key=tavily_api_key) if tavily_api_key else None
     brave_client = None
     if brave_api_key and BRAVE_AVAILABLE:
         try:
@@ -154,62 +151,82 @@ def search_web(queries: List[str]) -> List[Dict]:
             )
         except Exception as e:
             print(f"   ⚠️ Error inicializando Brave Search: {e}")
+
+    return tavily_client, brave_client
+
+
+async def search_single_query(query: str, tavily_client, brave_client) -> List[Dict]:
+    """
+    Realiza la búsqueda web de UNA query usando Tavily y opcionalmente Brave Search.
+    Las búsquedas simultáneas de la misma query se hacen una sola vez.
     
-    for idx, query in enumerate(queries, 1):
-        print(f"   -> Query {idx}/{len(queries)}: {query[:60]}...")
-        
-        # Buscar con Tavily
-        if tavily_client:
-            try:
-                response = tavily_client.search(query=query, max_results=2)
-                for result in response.get("results", []):
-                    all_results.append({
-                        "title": result.get("title", ""),
-                        "url": result.get("url", ""),
-                        "content": result.get("content", ""),
-                        "score": result.get("score", 0),
-                        "source": "tavily"
-                    })
-            except Exception as e:
-                print(f"      ⚠️ Error en Tavily: {e}")
-        
-        # Buscar con Brave
-        if brave_client:
-            try:
-                brave_results = brave_client.run(query)
-                # Brave devuelve un string, necesitamos parsearlo
-                if isinstance(brave_results, str):
-                    # Extraer información básica del string
-                    all_results.append({
-                        "title": f"Brave Search: {query[:40]}",
-                        "url": "",
-                        "content": brave_results[:500],
-                        "score": 0.5,
-                        "source": "brave"
-                    })
-            except Exception as e:
-                print(f"      ⚠️ Error en Brave: {e}")
-        
-        time.sleep(1)  # Pausa entre búsquedas
-    
-    print(f"   ✅ Encontrados {len(all_results)} resultados")
+    Returns:
+        Lista de resultados de búsqueda normalizados
+    """
+    return await single_flight(
+        "search", (query, bool(tavily_client), bool(brave_client)),
+        lambda: _search_single_query(query, tavily_client, brave_client),
+    )
+
+
+async def _search_single_query(query: str, tavily_client, brave_client) -> List[Dict]:
+    results = []
+
+    # Buscar con Tavily
     if tavily_client:
-        print(f"      - Tavily habilitado")
+        if not await try_consume("search_calls"):
+            print("      ⚠️ Presupuesto de búsquedas agotado")
+            return results
+        try:
+            with tracer.start_as_current_span("rate_limit search"):
+                await SEARCH_RATE_LIMITER.aacquire()
+            async with track_external("tavily"):
+                response = await tavily_client.search(query=query, max_results=2)
+            for result in response.get("results", []):
+                results.append({
+                    "title": result.get("title", ""),
+                    "url": result.get("url", ""),
+                    "content": result.get("content", ""),
+                    "score": result.get("score", 0),
+                    "source": "tavily"
+                })
+        except Exception as e:
+            print(f"      ⚠️ Error en Tavily: {e}")
+
+    # Buscar con Brave
     if brave_client:
-        print(f"      - Brave Search habilitado")
-    
-    return all_results
+        if not await try_consume("search_calls"):
+            print("      ⚠️ Presupuesto de búsquedas agotado")
+            return results
+        try:
+            with tracer.start_as_current_span("rate_limit search"):
+                await SEARCH_RATE_LIMITER.aacquire()
+            async with track_external("brave"):
+                brave_results = await brave_client.arun(query)
+            # Brave devuelve un string, necesitamos parsearlo
+            if isinstance(brave_results, str):
+                # Extraer información básica del string
+                results.append({
+                    "title": f"Brave Search: {query[:40]}",
+                    "url": "",
+                    "content": brave_results[:500],
+                    "score": 0.5,
+                    "source": "brave"
+                })
+        except Exception as e:
+            print(f"      ⚠️ Error en Brave: {e}")
+
+    return results
 
 
 # ============================================================================
-# PASO 3: ESCRUTINIO (FILTRADO DE RELEVANCIA)
+# PASO 3: ESCRUTINIO (FILTRADO DE RELEVANCIA, UN RESULTADO POR WORKER)
 # ============================================================================
-def scrutinize_results(search_results: List[Dict], llm) -> List[Dict]:
+
+def create_scrutiny_chain(llm):
     """
-    Filters and categorizes search results to identify relevant funding sources.
+    Crea la cadena que categoriza un resultado de búsqueda según su potencial de financiación.
     """
-    print(f"\n[3/4] Escrutando {len(search_results)} resultados...")
-    
     # --- PROMPT DE ESCRUTINIO REINVENTADO ---
     system_prompt = """
     You are an expert financial analyst. Your task is to categorize a web search result to determine its potential for finding project funding.
@@ -222,71 +239,59 @@ def scrutinize_results(search_results: List[Dict], llm) -> List[Dict]:
     4.  **"Not Relevant"**: The page is a news article, a blog post, a scientific paper, a finished project, or a general information page that does not directly relate to obtaining funding.
 
     Your goal is to find actionable leads. Err on the side of inclusion for categories 2 and 3.
-
-    {format_instructions}
     """
     
-    parser = JsonOutputParser(pydantic_object=ScrutinyResult)
-    
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("user", "Analyze the following web page content:\n\nTitle: {title}\nURL: {url}\n\nContent Snippet:\n{content}"),
     ])
     
-    chain = prompt_template | llm | parser
-    
-    relevant_results = []
+    return (prompt_template | structured_output(llm, ScrutinyResult)).with_retry(
+        stop_after_attempt=3,
+        wait_exponential_jitter=True,
+    )
+
+
+async def scrutinize_single_result(result: Dict, chain) -> Optional[Dict]:
+    """
+    Categoriza UN resultado de búsqueda.
+
+    Returns:
+        El resultado (con su categoría) si es relevante; None si se descarta.
+    """
+    # Limitar el contenido para no exceder el contexto del LLM
+    content_snippet = result.get("content", "")
+    if len(content_snippet) > 1500:
+        content_snippet = content_snippet[:1500]
+
+    inputs = {
+        "title": result.get("title", ""),
+        "content": content_snippet,
+        "url": result.get("url", ""),
+    }
+    # El mismo resultado escrutado a la vez por varios hilos se paga una vez
+    scrutiny = await single_flight("scrutiny", (inputs,), lambda: chain.ainvoke(inputs))
     
-    for result in search_results:
-        try:
-            # Limitar el contenido para no exceder el contexto del LLM
-            content_snippet = result.get("content", "")
-            if len(content_snippet) > 1500:
-                content_snippet = content_snippet[:1500]
-
-            scrutiny = chain.invoke({
-                "title": result.get("title", ""),
-                "content": content_snippet,
-                "url": result.get("url", ""),
-                "format_instructions": parser.get_format_instructions()
-            })
-            
-            category = scrutiny.get("relevance_category")
-            
-            # --- LÓGICA DE FILTRADO MEJORADA ---
-            # Aceptamos las 3 primeras categorías
-            if category and category != "Not Relevant":
-                print(f"   ✅ Relevante ({category}): {result.get('title', '')[:60]}")
-                relevant_results.append(result)
-            else:
-                print(f"   ❌ Descartado: {result.get('title', '')[:60]}")
-            
-            time.sleep(10) 
-            
-        except Exception as e:
-            print(f"   ⚠️ Error en escrutinio: {e}")
-            continue
+    category = scrutiny.get("relevance_category")
     
-    print(f"   ✅ Resultados relevantes: {len(relevant_results)}/{len(search_results)}")
-    return relevant_results
+    # --- LÓGICA DE FILTRADO MEJORADA ---
+    # Aceptamos las 3 primeras categorías
+    if category and category != "Not Relevant":
+        print(f"   ✅ Relevante ({category}): {result.get('title', '')[:60]}")
+        return {**result, "relevance_category": category}
+
+    print(f"   ❌ Descartado: {result.get('title', '')[:60]}")
+    return None
 
 
 # ============================================================================
-# PASO 4: EXTRACCIÓN DE OPORTUNIDADES
+# PASO 4: EXTRACCIÓN DE OPORTUNIDADES (UNA FUENTE POR WORKER)
 # ============================================================================
 
-def extract_opportunities(relevant_results: List[Dict], llm) -> List[Dict]:
+def create_extraction_chain(llm):
     """
-    Extrae información estructurada de oportunidades de las fuentes relevantes.
-    
-    Returns:
-        Lista de diccionarios con oportunidades de financiación
+    Crea la cadena que extrae oportunidades VIGENTES del contenido de una fuente.
     """
-    print(f"\n[4/4] Extrayendo oportunidades de {len(relevant_results)} fuentes...")
-    
-    # Obtener fecha actual para filtrar oportunidades vigentes
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    
     system_prompt = """
     Eres un experto en analizar convocatorias de financiación.
     
@@ -309,71 +314,175 @@ def extract_opportunities(relevant_results: List[Dict], llm) -> List[Dict]:
     3. Si el contenido dice "cerrada", "vencida" o tiene fecha anterior a {current_date}, NO la incluyas
     4. Si el contenido menciona múltiples oportunidades vigentes, extrae TODAS
     5. Si no encuentras información específica para algún campo, déjalo vacío o usa una lista vacía
-    
-    {format_instructions}
     """
     
-    parser = JsonOutputParser(pydantic_object=FundingOpportunityList)
-    
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("user", "Título: {title}\n\nContenido: {content}\n\nURL: {url}"),
     ])
     
-    chain = prompt_template | llm | parser
-    
-    all_opportunities = []
-    
-    for result in relevant_results:
-        try:
-            print(f"   -> Extrayendo de: {result.get('url', '')[:60]}")
-            
-            extraction = chain.invoke({
-                "title": result.get("title", ""),
-                "content": result.get("content", ""),
-                "url": result.get("url", ""),
-                "current_date": current_date,
-                "format_instructions": parser.get_format_instructions()
-            })
-            
-            opportunities = extraction.get("opportunities", [])
-            
-            for opp in opportunities:
-                all_opportunities.append({
-                    "origin": opp.get("origin", ""),
-                    "description": opp.get("description", ""),
-                    "financing_type": opp.get("financing_type", ""),
-                    "main_requirements": opp.get("main_requirements", []),
-                    "application_deadline": opp.get("application_deadline", ""),
-                    "opportunity_url": opp.get("opportunity_url", result.get("url", ""))
-                })
-            
-            print(f"      ✅ Encontradas {len(opportunities)} oportunidades")
-            time.sleep(2)  # Pausa entre extracciones
-            
-        except Exception as e:
-            print(f"   ⚠️ Error en extracción: {e}")
-            continue
+    return (prompt_template | structured_output(llm, FundingOpportunityList)).with_retry(
+        stop_after_attempt=3,
+        wait_exponential_jitter=True,
+    )
+
+
+async def extract_from_single_source(result: Dict, chain) -> List[Dict]:
+    """
+    Extrae información estructurada de oportunidades de UNA fuente relevante.
     
-    print(f"   ✅ Total de oportunidades extraídas: {len(all_opportunities)}")
-    return all_opportunities
+    Returns:
+        Lista de diccionarios con oportunidades de financiación
+    """
+    # Obtener fecha actual para filtrar oportunidades vigentes
+    current_date = datetime.now().strftime("%Y-%m-%d")
 
+    inputs = {
+        "title": result.get("title", ""),
+        "content": result.get("content", ""),
+        "url": result.get("url", ""),
+        "current_date": current_date,
+    }
+    extraction = await single_flight("extraction", (inputs,), lambda: chain.ainvoke(inputs))
+    
+    return [
+        {
+            "origin": opp.get("origin", ""),
+            "description": opp.get("description", ""),
+            "financing_type": opp.get("financing_type", ""),
+            "main_requirements": opp.get("main_requirements", []),
+            "application_deadline": opp.get("application_deadline", ""),
+            "opportunity_url": opp.get("opportunity_url", result.get("url", ""))
+        }
+        for opp in extraction.get("opportunities", [])
+    ]
 
 
 # ============================================================================
-# NODOS MODULARES
+# PRIORIDAD Y PARADA TEMPRANA (MODO "priority")
 # ============================================================================
 
+# Orden de extracción por categoría del escrutinio
+CATEGORY_PRIORITY = {
+    "Direct Funding Opportunity": 0,
+    "Funding Source Portal": 1,
+    "Potential Funding Organization": 2,
+}
+
+# Señales baratas de que un resultado es una convocatoria (pre-filtro léxico)
+FUNDING_KEYWORDS = (
+    "convocatoria", "call for proposals", "grant", "funding", "financiación", "financiamiento",
+    "deadline", "fecha límite", "cierre", "apply", "postula", "subsidio", "capital semilla",
+)
+
+
+def source_key(result: Dict) -> str:
+    """Identificador de una fuente en 'processed_sources'."""
+    return result.get("url") or result.get("title", "")
+
+
+def prefilter_score(result: Dict) -> float:
+    """Puntuación léxica (0-1): 3 o más palabras clave de financiación dan la máxima."""
+    text = f"{result.get('title', '')} {result.get('content', '')}".lower()
+    return min(sum(keyword in text for keyword in FUNDING_KEYWORDS) / 3, 1.0)
+
+
+def candidate_score(result: Dict) -> float:
+    """Score del buscador más el del pre-filtro."""
+    return (result.get("score") or 0) + prefilter_score(result)
+
+
+def opportunity_signature(opportunity: Dict) -> tuple:
+    """Firma para deduplicar oportunidades (organización + descripción)."""
+    return (opportunity.get("origin", "").lower(), opportunity.get("description", "").lower())
+
+
+def count_new_unique_opportunities(state: ProjectState) -> int:
+    """Oportunidades extraídas en esta búsqueda que no están en el historial."""
+    signatures = {opportunity_signature(opp) for opp in state.get("all_opportunities_history", [])}
+    new = {opportunity_signature(opp) for opp in state.get("extracted_opportunities", [])}
+    return len(new - signatures)
+
+
+def pending_scrutiny(state: ProjectState) -> List[Dict]:
+    """Resultados sin escrutar, del más al menos prometedor."""
+    processed = set(state.get("processed_sources", []))
+    return sorted(
+        (r for r in unique_search_results(state) if f"scrutiny:{source_key(r)}" not in processed),
+        key=candidate_score, reverse=True,
+    )
+
+
+def pending_extraction(state: ProjectState) -> List[Dict]:
+    """Fuentes relevantes sin extraer: primero las convocatorias directas, luego por score."""
+    processed = set(state.get("processed_sources", []))
+    return sorted(
+        (r for r in state.get("relevant_results", []) if f"extraction:{source_key(r)}" not in processed),
+        key=lambda r: (CATEGORY_PRIORITY.get(r.get("relevance_category"), len(CATEGORY_PRIORITY)), -candidate_score(r)),
+    )
+
+
+# ============================================================================
+# NODOS MODULARES (MAP-REDUCE CON Send)
+# ============================================================================
+#
+#   generate_funding_queries --Send x query--> search_query ------> collect_search_results
+#   collect_search_results --Send x resultado--> scrutinize_result --> collect_relevant_results
+#   collect_relevant_results --Send x fuente--> extract_source -----> extract_opportunities
+#
+# En modo "priority" el escrutinio y la extracción van por lotes y
+# 'route_funding_work' decide, tras cada lote, el siguiente o el final:
+#
+#   collect_search_results / collect_relevant_results / collect_extracted
+#       --route_funding_work--> scrutinize_result | extract_source | extract_opportunities
+#
+# Cada worker escribe en una clave con reducer (ver 'merge_items' en state.py),
+# así que sus salidas se combinan en el estado y quedan guardadas por separado
+# en el checkpoint: si la ejecución se cae, los items terminados no se repiten.
+
+class QueryTask(TypedDict):
+    """Entrada de un worker de búsqueda."""
+    query: str
+    index: int
+    total: int
+
+
+class ResultTask(TypedDict):
+    """Entrada de un worker de escrutinio o de extracción."""
+    result: Dict[str, Any]
+    index: int
+    total: int
+
+
 # NODO 1: Genera las queries de búsqueda
-def generate_funding_queries_node(state: ProjectState) -> Dict[str, Any]:
+async def generate_funding_queries_node(state: ProjectState) -> Dict[str, Any]:
     """
     Nodo que genera las queries de búsqueda y las guarda en el estado.
+    Reinicia las listas intermedias de la búsqueda anterior.
     """
     print("\n" + "="*80)
     print("NODO: Generando Queries de Búsqueda")
     print("="*80)
-    
-    llm = get_llm()
+
+    # Sin presupuesto no se lanza la búsqueda; el chat informa al usuario
+    level = await llm_budget_level()
+    search_calls_left = (await remaining())["search_calls"]
+    if level == "exhausted" or search_calls_left == 0:
+        print("   ⚠️ Presupuesto agotado. Se omite la búsqueda de financiación.")
+        emit_progress("funding_queries", "error", message="Presupuesto agotado")
+        return {
+            "search_queries": [],
+            "search_results": None,
+            "relevant_results": None,
+            "extracted_opportunities": None,
+            "processed_sources": None,
+            "messages": [{
+                "role": "assistant",
+                "content": "⚠️ Se ha agotado el presupuesto de este proyecto, así que no puedo lanzar una nueva búsqueda de financiación."
+            }],
+        }
+
+    llm = get_llm(cheap=level == "reduced")
     project_details = f"Título: {state['project_title']}\nDescripción: {state['project_description']}"
 
     existing_opportunities = state.get("investment_opportunities", [])
@@ -399,104 +508,326 @@ def generate_funding_queries_node(state: ProjectState) -> Dict[str, Any]:
     else:
         print("   -> No hay oportunidades previas. Iniciando búsqueda desde cero.")
     
-    queries = generate_funding_search_queries(project_details, llm)
-    
-    # Devuelve un diccionario para actualizar el estado
-    return {"search_queries": queries}
+    started_at = time.perf_counter()
+    emit_progress("funding_queries", "started")
+    queries = await run_cancellable(generate_funding_search_queries(project_details, llm), [])
+    if level == "reduced":
+        queries = queries[:BUDGET_REDUCED_MAX_QUERIES]
+    if search_calls_left is not None:
+        # Cada query consume al menos una llamada a un buscador
+        queries = queries[:search_calls_left]
+    emit_progress("funding_queries", "completed", counts={"queries": len(queries)}, started_at=started_at)
+    
+    # Devuelve un diccionario para actualizar el estado.
+    # None reinicia las listas con reducer (ver 'merge_items').
+    return {
+        "search_queries": queries,
+        "search_results": None,
+        "relevant_results": None,
+        "extracted_opportunities": None,
+        "processed_sources": None,
+        "funding_cancelled": False,
+    }
+
 
-# NODO 2: Realiza la búsqueda web
-def search_web_node(state: ProjectState) -> Dict[str, Any]:
+def dispatch_search_queries(state: ProjectState):
     """
-    Nodo que toma las queries del estado y realiza la búsqueda web.
+    MAP: Lanza un worker 'search_query' por cada query generada.
     """
-    print("\n" + "="*80)
-    print("NODO: Buscando en la Web")
-    print("="*80)
-
-    queries = state.get("search_queries", [])
+    queries = [q for q in state.get("search_queries", []) if q]
     if not queries:
+        return "collect_search_results"
+
+    print(f"\n[2/4] Buscando en la web ({len(queries)} queries)...")
+    emit_progress("search", "started", total=len(queries))
+    return [
+        Send("search_query", {"query": query, "index": idx, "total": len(queries)})
+        for idx, query in enumerate(queries, 1)
+    ]
+
+
+# NODO 2a (worker): Búsqueda web de una query
+async def search_query_node(task: QueryTask) -> Dict[str, Any]:
+    """
+    Worker que realiza la búsqueda web de UNA query.
+    """
+    print(f"   -> Query {task['index']}/{task['total']}: {task['query'][:60]}...")
+    started_at = time.perf_counter()
+
+    tavily_client, brave_client = create_search_clients()
+    if not tavily_client and not brave_client:
+        print("   ⚠️ Ni TAVILY_API_KEY ni BRAVE_SEARCH_API_KEY configuradas")
+        emit_progress("search", "error", index=task["index"], total=task["total"],
+                      message="Ni TAVILY_API_KEY ni BRAVE_SEARCH_API_KEY configuradas")
         return {"search_results": []}
-    
-    # Llama a tu función original
-    results = search_web(queries)
-    
+
+    results = await run_cancellable(search_single_query(task["query"], tavily_client, brave_client), [])
+    emit_progress("search", "item", index=task["index"], total=task["total"],
+                  counts={"results": len(results)}, started_at=started_at)
     return {"search_results": results}
 
-# NODO 3: Filtra los resultados relevantes
-def scrutinize_results_node(state: ProjectState) -> Dict[str, Any]:
+
+# NODO 2b (reduce): Punto de unión de la búsqueda web
+async def collect_search_results_node(state: ProjectState) -> Dict[str, Any]:
     """
-    Nodo que filtra los resultados de búsqueda para encontrar los más relevantes.
+    Nodo que se ejecuta cuando terminan todas las búsquedas.
+    Los resultados ya están combinados en 'search_results' por el reducer.
     """
     print("\n" + "="*80)
-    print("NODO: Escrutando Resultados")
+    print("NODO: Resultados de Búsqueda Web")
     print("="*80)
+    print(f"   ✅ Encontrados {len(state.get('search_results', []))} resultados")
+    emit_progress("search", "completed", counts={"results": len(state.get("search_results", []))})
+    return {"funding_cancelled": await is_cancelled()}
+
+
+def unique_search_results(state: ProjectState) -> List[Dict]:
+    """Resultados de la búsqueda sin URLs repetidas, en orden de llegada."""
+    seen_urls = set()
+    results = []
+    for result in state.get("search_results", []):
+        url = result.get("url", "")
+        if url and url in seen_urls:
+            continue
+        seen_urls.add(url)
+        results.append(result)
+    return results
+
+
+def dispatch_scrutiny(state: ProjectState):
+    """
+    MAP: Lanza un worker 'scrutinize_result' por cada resultado (sin URLs repetidas).
+    """
+    results = unique_search_results(state)
+    if not results or state.get("funding_cancelled"):
+        return "collect_relevant_results"
+
+    print(f"\n[3/4] Escrutando {len(results)} resultados...")
+    emit_progress("scrutiny", "started", total=len(results))
+    return [
+        Send("scrutinize_result", {"result": result, "index": idx, "total": len(results)})
+        for idx, result in enumerate(results, 1)
+    ]
+
+
+# NODO 3a (worker): Escrutinio de un resultado
+async def scrutinize_result_node(task: ResultTask) -> Dict[str, Any]:
+    """
+    Worker que decide si UN resultado de búsqueda es relevante.
+    """
+    started_at = time.perf_counter()
+    processed = [f"scrutiny:{source_key(task['result'])}"]
+    level = await llm_budget_level()
+    if level == "exhausted":
+        emit_progress("scrutiny", "error", index=task["index"], total=task["total"], message="Presupuesto agotado")
+        return {"relevant_results": [], "processed_sources": processed}
+
+    chain = create_scrutiny_chain(get_llm(cheap=level == "reduced"))
+    try:
+        relevant = await run_cancellable(scrutinize_single_result(task["result"], chain), None)
+    except Exception as e:
+        print(f"   ⚠️ Error en escrutinio: {e}")
+        emit_progress("scrutiny", "error", index=task["index"], total=task["total"],
+                      started_at=started_at, message=str(e))
+        return {"relevant_results": [], "processed_sources": processed}
+
+    emit_progress("scrutiny", "item", index=task["index"], total=task["total"],
+                  counts={"relevant": 1 if relevant else 0}, started_at=started_at)
+    return {"relevant_results": [relevant] if relevant else [], "processed_sources": processed}
+
+
+# NODO 3b (reduce): Punto de unión del escrutinio
+async def collect_relevant_results_node(state: ProjectState) -> Dict[str, Any]:
+    """
+    Nodo que se ejecuta cuando termina el escrutinio de todos los resultados.
+    """
+    print("\n" + "="*80)
+    print("NODO: Resultados Relevantes")
+    print("="*80)
+    print(f"   ✅ Resultados relevantes: {len(state.get('relevant_results', []))}/{len(state.get('search_results', []))}")
+    # En modo "priority" este nodo cierra cada lote: 'pending' dice cuántos quedan sin escrutar
+    emit_progress("scrutiny", "completed", counts={
+        "relevant": len(state.get("relevant_results", [])),
+        "results": len(state.get("search_results", [])),
+        "pending": len(pending_scrutiny(state)),
+    })
+    return {"funding_cancelled": await is_cancelled()}
 
-    llm = get_llm()
-    results = state.get("search_results", [])
-    if not results:
-        return {"relevant_results": []}
-    
-    # Llama a tu función original
-    relevant = scrutinize_results(results, llm)
-    
-    return {"relevant_results": relevant}
 
-# NODO 4: Extrae las oportunidades estructuradas
-def extract_opportunities_node(state: ProjectState) -> Dict[str, Any]:
+def dispatch_extraction(state: ProjectState):
     """
-    Nodo final que extrae los datos y los AÑADE al historial completo.
+    MAP: Lanza un worker 'extract_source' por cada fuente relevante.
+    """
+    relevant = state.get("relevant_results", [])
+    if not relevant or state.get("funding_cancelled"):
+        return "extract_opportunities"
+
+    print(f"\n[4/4] Extrayendo oportunidades de {len(relevant)} fuentes...")
+    emit_progress("extraction", "started", total=len(relevant))
+    return [
+        Send("extract_source", {"result": result, "index": idx, "total": len(relevant)})
+        for idx, result in enumerate(relevant, 1)
+    ]
+
+
+# NODO 4a (worker): Extracción de oportunidades de una fuente
+async def extract_source_node(task: ResultTask) -> Dict[str, Any]:
+    """
+    Worker que extrae las oportunidades de UNA fuente relevante.
+    """
+    result = task["result"]
+    started_at = time.perf_counter()
+    processed = [f"extraction:{source_key(result)}"]
+
+    # Con poco presupuesto solo se extraen las convocatorias directas;
+    # portales y organizaciones se dejan para cuando haya margen
+    level = await llm_budget_level()
+    if level == "exhausted" or (level == "reduced" and result.get("relevance_category") != "Direct Funding Opportunity"):
+        print(f"   -> Omitida por presupuesto: {result.get('url', '')[:60]}")
+        emit_progress("extraction", "item", index=task["index"], total=task["total"],
+                      counts={"opportunities": 0, "skipped": 1}, started_at=started_at)
+        return {"extracted_opportunities": [], "processed_sources": processed}
+
+    print(f"   -> Extrayendo de: {result.get('url', '')[:60]}")
+    chain = create_extraction_chain(get_llm(cheap=level == "reduced"))
+    try:
+        opportunities = await run_cancellable(extract_from_single_source(result, chain), [])
+    except Exception as e:
+        print(f"   ⚠️ Error en extracción: {e}")
+        emit_progress("extraction", "error", index=task["index"], total=task["total"],
+                      started_at=started_at, message=str(e))
+        return {"extracted_opportunities": [], "processed_sources": processed}
+
+    print(f"      ✅ Encontradas {len(opportunities)} oportunidades")
+    emit_progress("extraction", "item", index=task["index"], total=task["total"],
+                  counts={"opportunities": len(opportunities)}, started_at=started_at)
+    return {"extracted_opportunities": opportunities, "processed_sources": processed}
+
+
+# NODO 4a' (modo "priority"): Punto de unión de cada lote de extracción
+async def collect_extracted_node(state: ProjectState) -> Dict[str, Any]:
+    """
+    Nodo que se ejecuta al terminar cada lote de extracción; el siguiente paso
+    lo decide 'route_funding_work'.
+    """
+    print(f"   ✅ Oportunidades nuevas: {count_new_unique_opportunities(state)}/{FUNDING_TARGET_OPPORTUNITIES}")
+    return {"funding_cancelled": await is_cancelled()}
+
+
+def route_funding_work(state: ProjectState):
+    """
+    MAP (modo "priority"): Despacha el siguiente lote de trabajo, en este orden:
+
+    1. Si ya hay FUNDING_TARGET_OPPORTUNITIES oportunidades nuevas o se canceló
+       la búsqueda, termina.
+    2. Extrae las convocatorias directas pendientes.
+    3. Escruta los siguientes resultados más prometedores.
+    4. Extrae portales y organizaciones pendientes.
+    5. Si no queda nada, termina.
+    """
+    processed = state.get("processed_sources", [])
+    if state.get("funding_cancelled"):
+        print("   -> Búsqueda cancelada. Se conservan las oportunidades ya extraídas.")
+        return "extract_opportunities"
+    if count_new_unique_opportunities(state) >= FUNDING_TARGET_OPPORTUNITIES:
+        print(f"   -> Objetivo de {FUNDING_TARGET_OPPORTUNITIES} oportunidades alcanzado. Parada temprana.")
+        return "extract_opportunities"
+
+    to_extract = pending_extraction(state)
+    to_scrutinize = pending_scrutiny(state)
+    direct = [r for r in to_extract if r.get("relevance_category") == "Direct Funding Opportunity"]
+
+    if direct or (to_extract and not to_scrutinize):
+        batch = (direct or to_extract)[:FUNDING_PRIORITY_BATCH]
+        done = sum(key.startswith("extraction:") for key in processed)
+        total = done + len(to_extract)
+        if not done:
+            emit_progress("extraction", "started", total=total)
+        print(f"\n[4/4] Extrayendo oportunidades de {len(batch)} fuentes (quedan {len(to_extract)})...")
+        return [
+            Send("extract_source", {"result": result, "index": done + idx, "total": total})
+            for idx, result in enumerate(batch, 1)
+        ]
+
+    if to_scrutinize:
+        batch = to_scrutinize[:FUNDING_PRIORITY_BATCH]
+        total = len(unique_search_results(state))
+        done = total - len(to_scrutinize)
+        if not done:
+            emit_progress("scrutiny", "started", total=total)
+        print(f"\n[3/4] Escrutando {len(batch)} resultados (quedan {len(to_scrutinize)})...")
+        return [
+            Send("scrutinize_result", {"result": result, "index": done + idx, "total": total})
+            for idx, result in enumerate(batch, 1)
+        ]
+
+    return "extract_opportunities"
+
+
+# NODO 4b (reduce): Extrae las oportunidades estructuradas
+async def extract_opportunities_node(state: ProjectState) -> Dict[str, Any]:
+    """
+    Nodo final que deduplica lo extraído por los workers y lo AÑADE al historial completo.
     ✅ Ahora usa 'all_opportunities_history' para acumular TODO.
     """
     print("\n" + "="*80)
     print("NODO: Extrayendo y Acumulando Oportunidades")
     print("="*80)
 
-    llm = get_llm()
     relevant = state.get("relevant_results", [])
+    cancelled = state.get("funding_cancelled", False)
     
     # ✅ Obtener el HISTORIAL COMPLETO (todas las oportunidades de todas las búsquedas)
     all_history = state.get("all_opportunities_history", [])
     
     if not relevant:
         print("   -> No se encontraron nuevos resultados relevantes.")
+        emit_progress("extraction", "completed", counts={"extracted": 0, "unique": 0, "history": len(all_history)})
         return {
             "investment_opportunities": [],  # ✅ Limpiar las de la búsqueda actual
-            "all_opportunities_history": all_history  # ✅ Mantener el historial
+            "all_opportunities_history": all_history,  # ✅ Mantener el historial
+            "messages": [{"role": "assistant", "content": "⏹️ Búsqueda cancelada. No se encontraron oportunidades nuevas."}] if cancelled else [],
         }
 
-    # Extraer las NUEVAS oportunidades
-    new_opportunities = extract_opportunities(relevant, llm)
+    # Las NUEVAS oportunidades ya fueron extraídas por los workers
+    new_opportunities = state.get("extracted_opportunities", [])
+    print(f"   ✅ Total de oportunidades extraídas: {len(new_opportunities)}")
     
     if not new_opportunities:
         print("   -> No se pudieron extraer oportunidades.")
+        emit_progress("extraction", "completed", counts={"extracted": 0, "unique": 0, "history": len(all_history)})
         return {
             "investment_opportunities": [],
-            "all_opportunities_history": all_history
+            "all_opportunities_history": all_history,
+            "messages": [{"role": "assistant", "content": "⏹️ Búsqueda cancelada. No se encontraron oportunidades nuevas."}] if cancelled else [],
         }
     
     # ✅ Crear firmas del HISTORIAL COMPLETO para evitar duplicados globales
-    existing_signatures = {
-        (opp.get('origin', '').lower(), opp.get('description', '').lower()) 
-        for opp in all_history
-    }
+    existing_signatures = {opportunity_signature(opp) for opp in all_history}
     
     # Filtrar duplicados
     unique_new_opportunities = []
     for opp in new_opportunities:
-        signature = (opp.get('origin', '').lower(), opp.get('description', '').lower())
+        signature = opportunity_signature(opp)
         if signature not in existing_signatures:
             unique_new_opportunities.append(opp)
             existing_signatures.add(signature)
     
     print(f"   -> Se extrajeron {len(new_opportunities)} nuevas oportunidades.")
     print(f"   -> Se añadirán {len(unique_new_opportunities)} oportunidades únicas.")
+    emit_progress("extraction", "completed", counts={
+        "extracted": len(new_opportunities),
+        "unique": len(unique_new_opportunities),
+        "history": len(all_history) + len(unique_new_opportunities),
+    }, message="Búsqueda cancelada" if cancelled else None)
 
     # ✅ Actualizar el HISTORIAL COMPLETO
     updated_history = all_history + unique_new_opportunities
     
     message = {
         "role": "assistant",
-        "content": f"✅ Nueva búsqueda completada. Se encontraron {len(unique_new_opportunities)} oportunidades nuevas. Total en historial: {len(updated_history)}."
+        "content": f"⏹️ Búsqueda cancelada. Se conservan las {len(unique_new_opportunities)} oportunidades nuevas encontradas hasta ahora. Total en historial: {len(updated_history)}."
+        if cancelled else f"✅ Nueva búsqueda completada. Se encontraron {len(unique_new_opportunities)} oportunidades nuevas. Total en historial: {len(updated_history)}."
     }
     
     return {
@@ -505,4 +836,4 @@ def extract_opportunities_node(state: ProjectState) -> Dict[str, Any]:
         # ✅ Se añaden al historial completo
         "all_opportunities_history": updated_history,
         "messages": [message]
-    }
\ No newline at end of file
+    }
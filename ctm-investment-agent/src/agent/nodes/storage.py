@@ -1,10 +1,15 @@
+import asyncio
 import os
+import time
 from datetime import datetime
 from typing import Dict, Any
 from pathlib import Path
 import re
 
 from ..state import ProjectState
+from ..progress import emit_progress
+from ..metrics import track_external
+from ..profiling import to_thread
 
 # --- IMPORTACIONES DE REPORTLAB ---
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, PageBreak, Table, TableStyle
@@ -325,7 +330,56 @@ def page_template(canvas, doc):
 # ============================================================================
 # FUNCIÓN PRINCIPAL
 # ============================================================================
-def save_report_as_pdf(state: ProjectState) -> Dict[str, Any]:
+async def render_report_pdf(
+    report_content: str,
+    report_type: str,
+    file_prefix: str,
+    thread_id: str,
+    project_title: str,
+) -> str:
+    """
+    Renderiza un reporte Markdown como PDF en REPORTS_DIR/<report_type>/ y
+    devuelve su ruta. ReportLab corre en un hilo aparte, así que varios PDFs
+    pueden renderizarse en paralelo.
+    """
+    subfolder = os.path.join(REPORTS_DIR, report_type)
+    
+    # Operaciones de disco fuera del event loop
+    if not await asyncio.to_thread(os.path.exists, subfolder):
+        await asyncio.to_thread(os.makedirs, subfolder, exist_ok=True)
+        print(f"   📁 Directorio creado: {subfolder}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_name = f"{file_prefix}_{(thread_id or 'unknown')[:8]}_{timestamp}.pdf"
+    file_path = os.path.join(subfolder, file_name)
+
+    # Crear documento con márgenes ajustados
+    doc = SimpleDocTemplate(
+        file_path,
+        pagesize=letter,
+        topMargin=2.5*cm,
+        bottomMargin=2.5*cm,
+        leftMargin=2*cm,
+        rightMargin=2*cm
+    )
+
+    # Metadatos
+    doc.project_title = project_title or "Sin título"
+    doc.report_type = report_type
+    doc.author = "COTECMAR"
+    doc.title = file_prefix
+
+    # Crear historia - CONTENIDO COMPLETO SIN FILTROS
+    story = parse_markdown_to_flowables(report_content, get_styles())
+
+    # ReportLab es síncrono y pesado en CPU: lo ejecutamos fuera del event loop
+    # (con PROFILING_ENABLED su tiempo se atribuye al nodo que genera el PDF)
+    async with track_external("reportlab"):
+        await to_thread(doc.build, story, onFirstPage=page_template, onLaterPages=page_template)
+    return file_path
+
+
+async def save_report_as_pdf(state: ProjectState) -> Dict[str, Any]:
     """
     Guarda el reporte como PDF profesional.
     Versión mejorada que respeta completamente la estructura generada por la IA.
@@ -340,11 +394,6 @@ def save_report_as_pdf(state: ProjectState) -> Dict[str, Any]:
         return {}
     
     report_type = state.get("report_type", "general")
-    subfolder = os.path.join(REPORTS_DIR, report_type)
-    
-    if not os.path.exists(subfolder):
-        os.makedirs(subfolder)
-        print(f"   📁 Directorio creado: {subfolder}")
     
     # Nombre del archivo
     if report_type == "general":
@@ -352,44 +401,18 @@ def save_report_as_pdf(state: ProjectState) -> Dict[str, Any]:
     else:
         opp_id = state.get('action_input', 'idx')
         file_prefix = f"Analisis_Oportunidad_{opp_id}"
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    thread_id_short = state.get("thread_id", "unknown")[:8]
-    file_name = f"{file_prefix}_{thread_id_short}_{timestamp}.pdf"
-    file_path = os.path.join(subfolder, file_name)
 
+    started_at = time.perf_counter()
+    emit_progress("pdf", "started", message=file_prefix)
     try:
-        # Crear documento con márgenes ajustados
-        doc = SimpleDocTemplate(
-            file_path,
-            pagesize=letter,
-            topMargin=2.5*cm,
-            bottomMargin=2.5*cm,
-            leftMargin=2*cm,
-            rightMargin=2*cm
-        )
-
-        # Metadatos
-        doc.project_title = state.get("project_title", "Sin título")
-        doc.report_type = report_type
-        doc.author = "COTECMAR"
-        doc.title = file_prefix
-
-        # Generar estilos
-        print("   🎨 Generando estilos...")
-        styles = get_styles()
-        
-        # Crear historia - CONTENIDO COMPLETO SIN FILTROS
-        story = []
-        
-        print("   📝 Parseando contenido completo del reporte...")
-        story.extend(parse_markdown_to_flowables(report_content, styles))
-
-        # Construir PDF
         print("   🔨 Construyendo PDF...")
-        doc.build(story, onFirstPage=page_template, onLaterPages=page_template)
+        file_path = await render_report_pdf(
+            report_content, report_type, file_prefix,
+            state.get("thread_id", "unknown"), state.get("project_title", "Sin título"),
+        )
         
         print(f"   ✅ Reporte guardado exitosamente")
+        emit_progress("pdf", "completed", started_at=started_at, message=os.path.basename(file_path))
         print(f"   📍 {file_path}")
 
         # Actualizar estado
@@ -408,6 +431,7 @@ def save_report_as_pdf(state: ProjectState) -> Dict[str, Any]:
 
     except Exception as e:
         print(f"   ❌ Error: {e}")
+        emit_progress("pdf", "error", started_at=started_at, message=str(e))
         import traceback
         traceback.print_exc()
         return {
@@ -415,4 +439,4 @@ def save_report_as_pdf(state: ProjectState) -> Dict[str, Any]:
                 "role": "assistant",
                 "content": f"❌ Error al generar el PDF: {str(e)}"
             }]
-        }
\ No newline at end of file
+        }
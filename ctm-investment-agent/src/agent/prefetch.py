@@ -0,0 +1,190 @@
+# src/agent/prefetch.py
+
+"""
+Prefetch especulativo de oportunidades de financiación.
+
+Mientras `select_opportunities` espera la selección del usuario (a menudo
+varios minutos sin trabajo), se preparan en segundo plano las primeras
+PREFETCH_TOP_N oportunidades de la lista: se descarga su página y el LLM la
+usa para completar y corregir la oportunidad (fecha límite, requisitos,
+descripción). `process_selection` lanza lo mismo para las elegidas que
+falten y `generate_specific_report` usa el resultado si ya está listo (o
+espera un poco si está en curso) en lugar de empezar en frío.
+
+La caché vive en el proceso: el gateway envía todos los turnos de un hilo a
+la misma réplica (hashing consistente), así que el reporte la encuentra.
+
+El trabajo especulativo respeta el presupuesto (agent/budget.py): solo se
+lanza con el presupuesto del LLM en "ok", sus llamadas se cargan al hilo y
+al usuario, y cada oportunidad tiene un tiempo máximo (PREFETCH_TIMEOUT).
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_community.document_loaders import WebBaseLoader
+from langchain_core.prompts import ChatPromptTemplate
+from langgraph.config import get_config
+
+from .budget import budget_callback, llm_budget_level
+from .config import (
+    get_llm,
+    structured_output,
+    PREFETCH_CACHE_SIZE,
+    PREFETCH_CACHE_TTL,
+    PREFETCH_CONCURRENCY,
+    PREFETCH_ENABLED,
+    PREFETCH_TIMEOUT,
+)
+from .metrics import metrics_callback, record_cache, track_external
+from .nodes.research import FundingOpportunity, opportunity_signature
+from .singleflight import single_flight
+
+# Caracteres de la página que se guardan para el reporte específico
+PAGE_EXCERPT_CHARS = 3000
+
+DEEP_DIVE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """
+    Eres un analista de investigación experto y meticuloso. Tu tarea es tomar una oportunidad
+    de financiación preliminar y, basándote en el contenido de su página web, verificar,
+    completar y refinar la información:
+    - Corrige cualquier dato incorrecto de la oportunidad original.
+    - Completa los campos vacíos (como la fecha límite o los requisitos) si están en el texto.
+    - Mejora la descripción para que sea más precisa y concisa.
+    - Si la página menciona varias convocatorias, céntrate en la que más se parezca a la original.
+    """),
+    ("human", "Oportunidad preliminar:\n{opportunity}\n\nContenido de la página:\n{page_content}"),
+])
+
+# firma de la oportunidad -> (momento en que se guardó, datos preparados)
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+# firma de la oportunidad -> tarea en curso
+_inflight: Dict[tuple, asyncio.Task] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_cached(opportunity: Dict) -> Optional[Dict]:
+    """Datos preparados de la oportunidad, o None si no están (o caducaron)."""
+    key = opportunity_signature(opportunity)
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    stored_at, data = entry
+    if time.monotonic() - stored_at > PREFETCH_CACHE_TTL:
+        _cache.pop(key, None)
+        return None
+    return data
+
+
+def _store(opportunity: Dict, data: Dict) -> None:
+    key = opportunity_signature(opportunity)
+    _cache[key] = (time.monotonic(), data)
+    _cache.move_to_end(key)
+    while len(_cache) > PREFETCH_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def _load_page(url: str) -> str:
+    # La misma página pedida a la vez desde varios hilos se descarga una vez
+    return await single_flight("page", (url,), lambda: _fetch_page(url))
+
+
+async def _fetch_page(url: str) -> str:
+    loader = WebBaseLoader(url)
+    with track_external("web_loader"):
+        docs = await asyncio.to_thread(loader.load)
+    return " ".join(doc.page_content for doc in docs)[:15000]
+
+
+async def prepare_opportunity(opportunity: Dict, llm, config: Dict) -> Dict:
+    """
+    Descarga la página de la oportunidad y la refina con el LLM.
+
+    Returns:
+        {"opportunity": oportunidad refinada, "page_excerpt": inicio de la página}
+    """
+    url = opportunity.get("opportunity_url")
+    page_content = await _load_page(url) if url else ""
+    refined = opportunity
+    if page_content:
+        chain = DEEP_DIVE_PROMPT | structured_output(llm, FundingOpportunity)
+        refined = await chain.ainvoke(
+            {"opportunity": opportunity, "page_content": page_content},
+            config=config,
+        )
+    return {"opportunity": refined, "page_excerpt": page_content[:PAGE_EXCERPT_CHARS]}
+
+
+async def _prepare_and_store(opportunity: Dict, llm, config: Dict) -> None:
+    async with _semaphore:
+        if get_cached(opportunity) is not None:
+            return
+        try:
+            data = await asyncio.wait_for(prepare_opportunity(opportunity, llm, config), PREFETCH_TIMEOUT)
+        except Exception as e:
+            print(f"   ⚠️ Prefetch fallido para '{opportunity.get('origin', '')[:40]}': {e!r}")
+            return
+        _store(opportunity, data)
+        print(f"   ✅ Prefetch listo: {opportunity.get('origin', '')[:60]}")
+
+
+async def start_prefetch(opportunities: List[Dict]) -> None:
+    """
+    Lanza en segundo plano la preparación de las oportunidades que no estén
+    en caché ni en curso. No espera a que termine.
+    """
+    global _semaphore
+    pending = [
+        opp for opp in opportunities
+        if get_cached(opp) is None and opportunity_signature(opp) not in _inflight
+    ]
+    if not PREFETCH_ENABLED or not pending:
+        return
+    if await llm_budget_level() != "ok":
+        print("   -> Prefetch omitido: poco presupuesto de LLM.")
+        return
+
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        configurable = {}
+    # Las llamadas se cargan al hilo y al usuario aunque la ejecución ya haya terminado
+    config = {
+        "callbacks": [metrics_callback, budget_callback],
+        "metadata": {
+            "langgraph_node": "prefetch",
+            "thread_id": configurable.get("thread_id"),
+            "user_id": configurable.get("user_id"),
+        },
+    }
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    llm = get_llm()
+    print(f"   -> Prefetch de {len(pending)} oportunidades en segundo plano...")
+    for opp in pending:
+        key = opportunity_signature(opp)
+        # Contexto vacío: la tarea sobrevive al nodo y no hereda su traza ni sus callbacks
+        task = asyncio.create_task(_prepare_and_store(dict(opp), llm, config), context=contextvars.Context())
+        _inflight[key] = task
+        task.add_done_callback(lambda _, key=key: _inflight.pop(key, None))
+
+
+async def get_prepared(opportunity: Dict, wait: float) -> Optional[Dict]:
+    """
+    Datos preparados de la oportunidad. Si el prefetch está en curso, espera
+    hasta `wait` segundos; si no se lanzó o no termina a tiempo, devuelve None.
+    """
+    data = get_cached(opportunity)
+    task = _inflight.get(opportunity_signature(opportunity))
+    if data is None and task is not None:
+        try:
+            await asyncio.wait_for(asyncio.shield(task), wait)
+        except (asyncio.TimeoutError, RuntimeError):
+            pass
+        data = get_cached(opportunity)
+    record_cache("prefetch", data is not None)
+    return data
@@ -0,0 +1,255 @@
+# src/agent/profiling.py
+
+"""
+Perfilado de CPU y memoria por nodo del grafo (opcional, para staging).
+
+Con PROFILING_ENABLED=true, `profile_nodes(builder)` envuelve cada nodo que
+se registra en el grafo:
+
+- CPU: un thread muestrea cada PROFILING_SAMPLE_INTERVAL segundos las pilas
+  de todos los threads (`sys._current_frames`) y asigna cada muestra al nodo
+  cuyo wrapper está en la pila. Un nodo que espera a la red o al limitador
+  del LLM no está en ninguna pila, así que `sampled_seconds` es el tiempo de
+  CPU (o de llamadas síncronas que bloquean el event loop) y el resto de
+  `wall_seconds` es espera. El trabajo que se manda a un thread con
+  `to_thread` de este módulo (p. ej. el layout de ReportLab) cuenta aparte,
+  en `thread_seconds`.
+- Memoria: tracemalloc, con un snapshot al entrar y otro al salir de cada
+  ejecución del nodo. Los nodos que corren a la vez se mezclan en la
+  diferencia; `traced_mb` (memoria trazada al terminar) muestra cómo crece el
+  proceso con 'academic_papers' o el historial de oportunidades, cuyo tamaño
+  se guarda en `state_sizes`.
+
+Los reportes se escriben por hilo en PROFILING_DIR/<thread_id>/:
+`<nodo>.folded` (pilas colapsadas para flamegraph.pl o speedscope),
+`<nodo>.alloc.txt` (asignaciones netas acumuladas, por traceback) y
+`summary.json`. Se reescriben al terminar cada ejecución del nodo.
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langgraph.config import get_config
+
+from .config import (
+    PROFILING_ALLOC_FRAMES,
+    PROFILING_DIR,
+    PROFILING_ENABLED,
+    PROFILING_SAMPLE_INTERVAL,
+    PROFILING_TOP_ALLOCATIONS,
+)
+
+# (hilo, nodo)
+NodeKey = Tuple[str, str]
+
+_lock = threading.Lock()
+# id del frame de cada wrapper en curso -> su nodo; ident del thread de `to_thread` -> su nodo
+_active_frames: Dict[int, NodeKey] = {}
+_thread_nodes: Dict[int, NodeKey] = {}
+_sampler: Optional[threading.Thread] = None
+# Muestras tomadas y segundos transcurridos: el intervalo real es mayor que el pedido (GIL)
+_ticks = [0, 0.0]
+
+_samples: Dict[NodeKey, Counter] = defaultdict(Counter)
+_allocations: Dict[NodeKey, Counter] = defaultdict(Counter)
+_summary: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+# Nodo en curso en este contexto, para atribuirle el trabajo de `to_thread`
+_node_var: contextvars.ContextVar[Optional[NodeKey]] = contextvars.ContextVar("profiled_node", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _sample_forever() -> None:
+    own = threading.get_ident()
+    last = time.perf_counter()
+    while True:
+        time.sleep(PROFILING_SAMPLE_INTERVAL)
+        now = time.perf_counter()
+        _ticks[0] += 1
+        _ticks[1] += now - last
+        last = now
+        if not _active_frames and not _thread_nodes:
+            continue
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack, key = [], None
+            while frame is not None:
+                key = _active_frames.get(id(frame))
+                if key is not None:
+                    break
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            kind = "loop"
+            if key is None:
+                key = _thread_nodes.get(ident)
+                if key is None:
+                    continue
+                kind = "thread"
+            folded = ";".join([key[1], *reversed(stack)])
+            with _lock:
+                _samples[key][(kind, folded)] += 1
+
+
+def _ensure_started() -> None:
+    global _sampler
+    if _sampler is not None:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(PROFILING_ALLOC_FRAMES)
+    _sampler = threading.Thread(target=_sample_forever, name="node-profiler", daemon=True)
+    _sampler.start()
+    print(f"🔬 Perfilado por nodo activo: reportes en {PROFILING_DIR}/")
+
+
+def _thread_id() -> str:
+    try:
+        thread_id = get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        thread_id = None
+    return re.sub(r"[^\w.-]", "_", str(thread_id or "sin_hilo"))
+
+
+def _state_sizes(args: tuple) -> Dict[str, int]:
+    state = args[0] if args and isinstance(args[0], dict) else {}
+    return {key: len(value) for key, value in state.items() if isinstance(value, (list, dict))}
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+
+
+def _start(node: str, args: tuple, frame) -> Dict[str, Any]:
+    _ensure_started()
+    key = (_thread_id(), node)
+    _active_frames[id(frame)] = key
+    return {"key": key, "frame": id(frame), "token": _node_var.set(key), "started": time.perf_counter(),
+            "sizes": _state_sizes(args), "snapshot": _snapshot()}
+
+
+def _finish(run: Dict[str, Any]) -> None:
+    key = run["key"]
+    _active_frames.pop(run["frame"], None)
+    _node_var.reset(run["token"])
+    wall = time.perf_counter() - run["started"]
+    try:
+        diff = _snapshot().compare_to(run["snapshot"], "traceback")
+        for stat in diff:
+            if stat.size_diff:
+                _allocations[key][tuple(stat.traceback.format())] += stat.size_diff
+        current, peak = tracemalloc.get_traced_memory()
+
+        thread_id, node = key
+        entry = _summary[thread_id].setdefault(node, {"runs": 0, "wall_seconds": 0.0})
+        entry["runs"] += 1
+        entry["wall_seconds"] = round(entry["wall_seconds"] + wall, 3)
+        with _lock:
+            samples = dict(_samples[key])
+        interval = _ticks[1] / _ticks[0] if _ticks[0] else PROFILING_SAMPLE_INTERVAL
+        for kind in ("loop", "thread"):
+            count = sum(n for (sample_kind, _), n in samples.items() if sample_kind == kind)
+            entry["sampled_seconds" if kind == "loop" else "thread_seconds"] = round(count * interval, 3)
+        entry["net_alloc_kb"] = round(sum(_allocations[key].values()) / 1024, 1)
+        entry["traced_mb"] = round(current / 2**20, 1)
+        entry["traced_peak_mb"] = round(peak / 2**20, 1)
+        entry["state_sizes"] = run["sizes"]
+        _write_reports(thread_id, node, samples)
+    except Exception as e:
+        # El perfilado nunca rompe la ejecución
+        print(f"   ⚠️ No se pudo escribir el perfil de '{key[1]}': {e}")
+
+
+def _write_reports(thread_id: str, node: str, samples: Dict[Tuple[str, str], int]) -> None:
+    folder = os.path.join(PROFILING_DIR, thread_id)
+    os.makedirs(folder, exist_ok=True)
+
+    stacks = Counter()
+    for (kind, folded), count in samples.items():
+        stacks[folded if kind == "loop" else folded.replace(node, f"{node};[thread]", 1)] += count
+    with open(os.path.join(folder, f"{node}.folded"), "w", encoding="utf-8") as f:
+        f.writelines(f"{folded} {count}\n" for folded, count in sorted(stacks.items()))
+
+    top = _allocations[(thread_id, node)].most_common(PROFILING_TOP_ALLOCATIONS)
+    with open(os.path.join(folder, f"{node}.alloc.txt"), "w", encoding="utf-8") as f:
+        f.write(f"Asignaciones netas acumuladas de '{node}' (top {PROFILING_TOP_ALLOCATIONS})\n\n")
+        for lines, size in top:
+            f.write(f"{size / 1024:.1f} KiB\n")
+            f.writelines(f"    {line}\n" for line in lines)
+            f.write("\n")
+
+    with open(os.path.join(folder, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(_summary[thread_id], f, ensure_ascii=False, indent=2)
+
+
+def profiled(node: str, action: Callable) -> Callable:
+    """Envuelve un nodo (síncrono o asíncrono) para perfilarlo con el nombre `node`."""
+    if asyncio.iscoroutinefunction(action):
+        @functools.wraps(action)
+        async def async_wrapper(*args, **kwargs):
+            run = _start(node, args, sys._getframe())
+            try:
+                return await action(*args, **kwargs)
+            finally:
+                _finish(run)
+        return async_wrapper
+
+    @functools.wraps(action)
+    def wrapper(*args, **kwargs):
+        run = _start(node, args, sys._getframe())
+        try:
+            return action(*args, **kwargs)
+        finally:
+            _finish(run)
+    return wrapper
+
+
+def profile_nodes(builder):
+    """
+    Con PROFILING_ENABLED, hace que los nodos que se registren en `builder`
+    (un StateGraph) se perfilen. Sin él, devuelve el builder tal cual.
+    """
+    if not PROFILING_ENABLED:
+        return builder
+    add_node = builder.add_node
+
+    def add_profiled_node(node: str, action: Callable, **kwargs):
+        return add_node(node, profiled(node, action), **kwargs)
+
+    builder.add_node = add_profiled_node
+    return builder
+
+
+async def to_thread(func: Callable, *args, **kwargs) -> Any:
+    """
+    `asyncio.to_thread` cuyo trabajo se atribuye al nodo que lo lanza
+    (`thread_seconds` y la rama `[thread]` del flamegraph).
+    """
+    if not PROFILING_ENABLED:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    def run():
+        # asyncio.to_thread copia el contexto, así que aquí se ve el nodo que lo lanzó
+        key, ident = _node_var.get(), threading.get_ident()
+        if key is not None:
+            _thread_nodes[ident] = key
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _thread_nodes.pop(ident, None)
+
+    return await asyncio.to_thread(run)
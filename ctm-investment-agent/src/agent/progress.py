@@ -0,0 +1,85 @@
+# src/agent/progress.py
+
+"""
+Eventos de progreso estructurados emitidos por los nodos.
+
+Se publican con el stream writer de LangGraph, así que llegan a los clientes
+que piden `stream_mode="custom"` (o lo incluyen en una lista de modos) sin
+tener que sondear el estado completo del hilo.
+
+Esquema de cada evento (todas las claves están siempre presentes):
+
+    {
+        "type": "progress",
+        "stage": str,          # etapa lógica, ver STAGES
+        "status": str,         # "started" | "item" | "completed" | "error"
+        "node": str | None,    # nodo de LangGraph que emitió el evento
+        "index": int | None,   # posición del item (1..total) en eventos "item"
+        "total": int | None,   # número de items de la etapa
+        "counts": dict,        # contadores propios de la etapa (resultados, papers...)
+        "elapsed_ms": int | None,  # duración del item o de la etapa
+        "message": str | None, # texto corto legible para la UI
+        "ts": float,           # marca de tiempo UNIX
+    }
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from langgraph.config import get_config, get_stream_writer
+
+# Etapas que emiten eventos, en el orden en que aparecen en un hilo
+STAGES = (
+    "ingestion",
+    "academic_queries",
+    "academic_research",
+    "paper_digests",
+    "state_of_the_art_report",
+    "funding_queries",
+    "search",
+    "scrutiny",
+    "extraction",
+    "selection",
+    "specific_report",
+    "pdf",
+)
+
+STATUSES = ("started", "item", "completed", "error")
+
+
+def emit_progress(
+    stage: str,
+    status: str,
+    *,
+    index: Optional[int] = None,
+    total: Optional[int] = None,
+    counts: Optional[Dict[str, Any]] = None,
+    started_at: Optional[float] = None,
+    message: Optional[str] = None,
+) -> None:
+    """
+    Emite un evento de progreso. Fuera de una ejecución del grafo no hace nada.
+
+    Args:
+        started_at: Valor de `time.perf_counter()` al inicio del item o etapa;
+            se usa para calcular `elapsed_ms`.
+    """
+    try:
+        writer = get_stream_writer()
+        node = get_config().get("metadata", {}).get("langgraph_node")
+    except RuntimeError:
+        # Llamado fuera de un contexto de ejecución de LangGraph
+        return
+
+    writer({
+        "type": "progress",
+        "stage": stage,
+        "status": status,
+        "node": node,
+        "index": index,
+        "total": total,
+        "counts": counts or {},
+        "elapsed_ms": int((time.perf_counter() - started_at) * 1000) if started_at is not None else None,
+        "message": message,
+        "ts": time.time(),
+    })
@@ -0,0 +1,166 @@
+# src/agent/similarity.py
+
+"""
+Índice de similitud entre proyectos.
+
+Guarda en Chroma, por cada hilo, el embedding de título + descripción junto
+con las queries académicas ejecutadas y los papers más citados (hasta
+PROJECT_SIMILARITY_MAX_PAPERS, con el abstract recortado). Un hilo nuevo
+cuyo proyecto supera PROJECT_SIMILARITY_THRESHOLD frente a uno anterior parte
+de esa investigación y solo busca la diferencia.
+
+Si Chroma no está disponible el flujo sigue igual que antes (investigación
+completa desde cero) y la conexión se reintenta pasados
+PROJECT_SIMILARITY_RETRY_SECONDS, p. ej. si Chroma aún estaba arrancando.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import (
+    CHROMA_HOST,
+    CHROMA_PORT,
+    EMBEDDING_MODEL,
+    PROJECT_SIMILARITY_ABSTRACT_CHARS,
+    PROJECT_SIMILARITY_ENABLED,
+    PROJECT_SIMILARITY_MAX_PAPERS,
+    PROJECT_SIMILARITY_MAX_SEEDS,
+    PROJECT_SIMILARITY_RETRY_SECONDS,
+    PROJECT_SIMILARITY_THRESHOLD,
+)
+from .metrics import record_cache
+
+COLLECTION_NAME = "project_similarity"
+
+_collection = None
+# Instante (time.monotonic) a partir del cual se reintenta conectar tras un fallo
+_retry_at = 0.0
+# _query y _upsert corren en threads (asyncio.to_thread): la colección se crea una vez
+_lock = threading.Lock()
+
+
+def _project_text(title: str, description: str) -> str:
+    return f"{title}\n\n{description}"
+
+
+def _get_collection():
+    """
+    Crea la colección de Chroma la primera vez que se necesita. Devuelve None
+    si no hay índice; tras un fallo no se reintenta hasta pasado
+    PROJECT_SIMILARITY_RETRY_SECONDS.
+    """
+    global _collection, _retry_at
+    if _collection is not None or not PROJECT_SIMILARITY_ENABLED:
+        return _collection
+
+    with _lock:
+        if _collection is not None or time.monotonic() < _retry_at:
+            return _collection
+        try:
+            import chromadb
+            from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+            client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            _collection = client.get_or_create_collection(
+                COLLECTION_NAME,
+                embedding_function=SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL),
+                metadata={"hnsw:space": "cosine"},
+            )
+        except Exception as e:
+            _retry_at = time.monotonic() + PROJECT_SIMILARITY_RETRY_SECONDS
+            print(f"   ⚠️ Índice de similitud no disponible ({e}). Se investigará desde cero; "
+                  f"se reintentará en {PROJECT_SIMILARITY_RETRY_SECONDS:.0f} s.")
+    return _collection
+
+
+def _query(text: str, exclude_thread_id: Optional[str]) -> List[Dict[str, Any]]:
+    collection = _get_collection()
+    if collection is None or collection.count() == 0:
+        return []
+
+    result = collection.query(
+        query_texts=[text],
+        n_results=min(PROJECT_SIMILARITY_MAX_SEEDS + 1, collection.count()),
+        include=["metadatas", "distances"],
+    )
+    matches = []
+    for thread_id, metadata, distance in zip(result["ids"][0], result["metadatas"][0], result["distances"][0]):
+        similarity = 1 - distance
+        if thread_id == exclude_thread_id or similarity < PROJECT_SIMILARITY_THRESHOLD:
+            continue
+        matches.append({
+            "thread_id": thread_id,
+            "title": metadata.get("title", ""),
+            "similarity": round(similarity, 3),
+            "academic_queries": json.loads(metadata.get("academic_queries", "[]")),
+            "academic_papers": json.loads(metadata.get("academic_papers", "[]")),
+        })
+    return matches[:PROJECT_SIMILARITY_MAX_SEEDS]
+
+
+def _indexed_papers(papers: List[dict]) -> List[dict]:
+    """
+    Papers que se guardan en la metadata del hilo: los más citados, con el
+    abstract recortado, para no meter la colección entera en un solo campo.
+    """
+    ranked = sorted(papers, key=lambda paper: paper.get("citation_count") or 0, reverse=True)
+    return [
+        {**paper, "content": (paper.get("content") or "")[:PROJECT_SIMILARITY_ABSTRACT_CHARS]}
+        for paper in ranked[:PROJECT_SIMILARITY_MAX_PAPERS]
+    ]
+
+
+def _upsert(thread_id: str, text: str, title: str, queries: List[str], papers: List[dict]) -> None:
+    collection = _get_collection()
+    if collection is None:
+        return
+    collection.upsert(
+        ids=[thread_id],
+        documents=[text],
+        metadatas=[{
+            "title": title,
+            "academic_queries": json.dumps(queries, ensure_ascii=False),
+            "academic_papers": json.dumps(_indexed_papers(papers), ensure_ascii=False),
+        }],
+    )
+
+
+async def find_similar_projects(title: str, description: str, exclude_thread_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Busca hilos anteriores con un proyecto similar (de mayor a menor similitud).
+    Cada resultado trae 'thread_id', 'title', 'similarity', 'academic_queries'
+    y 'academic_papers'. Nunca lanza: ante cualquier error devuelve [].
+    """
+    try:
+        matches = await asyncio.to_thread(_query, _project_text(title, description), exclude_thread_id)
+    except Exception as e:
+        print(f"   ⚠️ Error consultando el índice de similitud: {e}")
+        return []
+    if _collection is not None:
+        record_cache("project_similarity", bool(matches))
+    return matches
+
+
+async def index_project_research(thread_id: str, title: str, description: str,
+                                 academic_queries: List[str], academic_papers: List[dict]) -> None:
+    """Guarda (o actualiza) la investigación académica del hilo en el índice."""
+    try:
+        await asyncio.to_thread(
+            _upsert, thread_id, _project_text(title, description), title, academic_queries, academic_papers
+        )
+    except Exception as e:
+        print(f"   ⚠️ Error actualizando el índice de similitud: {e}")
+
+
+def merge_papers(*collections: List[dict]) -> List[dict]:
+    """Une colecciones de papers sin duplicados (por título), como academic_research."""
+    unique = {}
+    for papers in collections:
+        for paper in papers:
+            title = paper.get("title", "N/A")
+            if title != "N/A":
+                unique.setdefault(title.lower().strip(), paper)
+    return list(unique.values())
@@ -0,0 +1,145 @@
+# src/agent/singleflight.py
+
+"""
+Single-flight: las llamadas idénticas que coinciden en el tiempo se hacen una vez.
+
+Cuando varios hilos analizan proyectos parecidos a la vez, o un usuario envía
+dos veces lo mismo, se repiten en paralelo las mismas búsquedas de Tavily,
+el escrutinio de la misma URL o el scrapeo de la misma página. Con
+`single_flight(tipo, partes_de_la_clave, llamada)`:
+
+- Dentro del proceso, la primera petición con una clave lanza la llamada y
+  las que llegan mientras está en curso esperan su resultado (cada una
+  recibe una copia). Si todas las que esperan se cancelan, la llamada se
+  cancela también.
+- Con SINGLE_FLIGHT_REDIS y REDIS_URI, además, entre procesos y réplicas:
+  quien consigue el lock en Redis hace la llamada y publica el resultado
+  (JSON) durante SINGLE_FLIGHT_RESULT_TTL segundos; el resto lo espera.
+  Si el líder falla o el lock caduca, cada uno hace su propia llamada.
+
+La llamada corre en el contexto de quien llegó primero, así que el gasto
+(presupuesto, métricas, trazas) se carga a su hilo.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from .config import (
+    SINGLE_FLIGHT_ENABLED,
+    SINGLE_FLIGHT_LOCK_TTL,
+    SINGLE_FLIGHT_POLL_INTERVAL,
+    SINGLE_FLIGHT_REDIS,
+    SINGLE_FLIGHT_RESULT_TTL,
+)
+from .metrics import SINGLE_FLIGHT_CALLS
+
+T = TypeVar("T")
+
+KEY_PREFIX = "singleflight:"
+
+# Borra el lock solo si sigue siendo de quien lo tomó
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_redis = None
+if SINGLE_FLIGHT_REDIS and os.getenv("REDIS_URI"):
+    import redis.asyncio as redis
+    _redis = redis.from_url(os.environ["REDIS_URI"], decode_responses=True)
+
+# clave -> llamada en curso, y cuántas peticiones la esperan
+_inflight: Dict[str, asyncio.Task] = {}
+_waiters: Dict[str, int] = {}
+
+
+def flight_key(kind: str, *parts: Any) -> str:
+    """Clave de la llamada: el tipo y un hash de sus entradas."""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{kind}:{digest}"
+
+
+async def _remote(coro: Awaitable, default: Any = None) -> Any:
+    """Operación contra Redis que nunca rompe la llamada: ante un error, `default`."""
+    try:
+        return await coro
+    except Exception as e:
+        print(f"   ⚠️ Single-flight sin Redis: {e}")
+        return default
+
+
+async def _lead(kind: str, key: str, call: Callable[[], Awaitable[T]]) -> T:
+    """Hace la llamada, coordinándose con otros procesos si hay Redis."""
+    if _redis is None:
+        return await call()
+
+    lock_key, result_key = f"{KEY_PREFIX}lock:{key}", f"{KEY_PREFIX}result:{key}"
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SINGLE_FLIGHT_LOCK_TTL
+    token = uuid.uuid4().hex
+    while True:
+        published = await _remote(_redis.get(result_key))
+        if published is not None:
+            SINGLE_FLIGHT_CALLS.labels(kind, "remote_follower").inc()
+            return json.loads(published)["value"]
+
+        acquired = await _remote(
+            _redis.set(lock_key, token, nx=True, px=int(SINGLE_FLIGHT_LOCK_TTL * 1000)), default=True
+        )
+        if acquired:
+            break
+        if loop.time() >= deadline:
+            # El líder remoto no terminó a tiempo: cada uno por su cuenta
+            return await call()
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+    try:
+        value = await call()
+        try:
+            payload = json.dumps({"value": value}, ensure_ascii=False)
+        except TypeError:
+            payload = None
+        if payload is not None:
+            await _remote(_redis.set(result_key, payload, ex=SINGLE_FLIGHT_RESULT_TTL))
+        return value
+    finally:
+        await _remote(_redis.eval(RELEASE_SCRIPT, 1, lock_key, token))
+
+
+async def single_flight(kind: str, key_parts: tuple, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Ejecuta `call()` compartiendo la llamada con las peticiones simultáneas
+    de igual `kind` y `key_parts`. El resultado debe ser serializable a JSON
+    para compartirse entre procesos (si no, solo se comparte en el proceso).
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return await call()
+
+    key = flight_key(kind, *key_parts)
+    task = _inflight.get(key)
+    leader = task is None
+    if leader:
+        task = asyncio.ensure_future(_lead(kind, key, call))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _inflight.pop(key) if _inflight.get(key) is done else None)
+    SINGLE_FLIGHT_CALLS.labels(kind, "leader" if leader else "follower").inc()
+
+    _waiters[key] = _waiters.get(key, 0) + 1
+    try:
+        value = await asyncio.shield(task)
+    finally:
+        _waiters[key] -= 1
+        if not _waiters[key]:
+            del _waiters[key]
+            # Nadie espera ya el resultado (p. ej. búsqueda cancelada): no se paga
+            if not task.done():
+                task.cancel()
+    # Cada seguidor recibe su propia copia para que nadie modifique la del resto
+    return value if leader else copy.deepcopy(value)
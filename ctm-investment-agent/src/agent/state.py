@@ -1,7 +1,19 @@
 # src/agent/state.py
 
-from typing import List, TypedDict, Any, Optional
-from langchain_core.messages import HumanMessage, AIMessage
+from typing import Annotated, Dict, List, TypedDict, Any, Optional
+from langchain_core.messages import AnyMessage
+from langgraph.graph.message import add_messages
+
+
+def merge_items(current: Optional[list], update: Optional[list]) -> list:
+    """
+    Reducer para listas que se llenan desde workers paralelos (Send).
+    Concatena las actualizaciones; un None reinicia la lista.
+    """
+    if update is None:
+        return []
+    return (current or []) + list(update)
+
 
 class ProjectState(TypedDict, total=False):
     """
@@ -16,9 +28,21 @@ class ProjectState(TypedDict, total=False):
     document_paths: List[str]
 
     # --- Búsqueda de Información ---
+    academic_queries: List[str]
+    # Reutilización de hilos similares (ver agent/similarity.py): hilos usados
+    # como semilla y queries académicas que sus papers ya cubren
+    seed_threads: List[str]
+    seed_queries: List[str]
     search_queries: List[str]
-    search_results: List[dict]
-    relevant_results: List[dict]
+    # Con reducer: cada worker del map-reduce añade sus propios items
+    search_results: Annotated[List[dict], merge_items]
+    relevant_results: Annotated[List[dict], merge_items]
+    extracted_opportunities: Annotated[List[dict], merge_items]
+    # Fuentes ya escrutadas o extraídas ("scrutiny:<url>", "extraction:<url>"),
+    # para que el modo "priority" despache cada una una sola vez
+    processed_sources: Annotated[List[str], merge_items]
+    # El gateway pidió cancelar la búsqueda en curso (ver agent/cancellation.py)
+    funding_cancelled: bool
 
     # --- Resultados de los Nodos ---
     all_opportunities_history: List[dict]
@@ -26,6 +50,14 @@ class ProjectState(TypedDict, total=False):
     selected_opportunities: List[dict]
     
     academic_papers: List[dict]
+    # Resúmenes condensados por paper (clave: título normalizado) y síntesis
+    # de toda la colección; ver agent/digests.py
+    paper_digests: Dict[str, str]
+    research_synthesis: Optional[str]
+    # Secciones del reporte de estado del arte ({id: {"content", "papers"}}) y
+    # papers que cubría al redactarse, para actualizarlo de forma incremental
+    report_sections: Dict[str, dict]
+    report_paper_keys: List[str]
     improvement_report: Optional[str]
     report_paths: List[str]
 
@@ -33,7 +65,9 @@ class ProjectState(TypedDict, total=False):
     user_selection: Any
 
     # --- Historial de Conversación ---
-    messages: List[HumanMessage | AIMessage]
+    # Con reducer: las ramas paralelas del modo "eager" pueden escribir
+    # mensajes en el mismo paso sin colisionar.
+    messages: Annotated[List[AnyMessage], add_messages]
 
     # ---- Routing de acciones ---------------
     next_action: Optional[str]
@@ -49,13 +83,23 @@ def create_initial_state(project_title: str, project_description: str) -> Projec
         "project_title": project_title,
         "project_description": project_description,
         "document_paths": [],
+        "academic_queries": [],
+        "seed_threads": [],
+        "seed_queries": [],
         "search_queries": [],
         "search_results": [],
         "relevant_results": [],
+        "extracted_opportunities": [],
+        "processed_sources": [],
+        "funding_cancelled": False,
         "all_opportunities_history": [],  # ✅ Historial completo
         "investment_opportunities": [],   # ✅ Oportunidades de la última búsqueda
         "selected_opportunities": [],      # ✅ Seleccionadas para análisis
         "academic_papers": [],
+        "paper_digests": {},
+        "research_synthesis": None,
+        "report_sections": {},
+        "report_paper_keys": [],
         "improvement_report": None,
         "report_paths": [],
         "user_selection": None,
@@ -0,0 +1,189 @@
+# src/agent/tracing.py
+
+"""
+Trazas OpenTelemetry del agente.
+
+- Un span por nodo del grafo y por llamada al LLM (`TracingCallbackHandler`,
+  registrado como callback del grafo compilado, igual que las métricas).
+- Un span por llamada a servicios externos (`track_external` en
+  agent/metrics.py), hijo del span del nodo que la hace, y, si está
+  instalada la instrumentación, por cada petición HTTP saliente de
+  httpx/requests.
+- Todos los spans llevan `thread_id`. Si el gateway envía un `traceparent`
+  en la metadata de la ejecución, la traza del agente cuelga de la suya.
+
+Exportador según AGENT_TRACES_EXPORTER: "none" (por defecto), "console",
+"file" (JSON por línea en AGENT_TRACES_FILE) u "otlp" (necesita
+opentelemetry-exporter-otlp y OTEL_EXPORTER_OTLP_ENDPOINT).
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.config import get_config
+from opentelemetry import trace
+from opentelemetry.propagate import extract
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import Status, StatusCode
+
+TRACES_EXPORTER = os.getenv("AGENT_TRACES_EXPORTER", "none").lower()
+TRACES_FILE = os.getenv("AGENT_TRACES_FILE", "traces/agent.jsonl")
+
+tracer = trace.get_tracer("agent")
+
+
+class JsonLinesFileExporter(SpanExporter):
+    """Escribe cada span como una línea JSON; no necesita ningún colector."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans) -> SpanExportResult:
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(json.loads(span.to_json())) + "\n")
+        return SpanExportResult.SUCCESS
+
+
+def _create_exporter() -> Optional[SpanExporter]:
+    if TRACES_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if TRACES_EXPORTER == "file":
+        return JsonLinesFileExporter(TRACES_FILE)
+    if TRACES_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("⚠️ AGENT_TRACES_EXPORTER=otlp requiere opentelemetry-exporter-otlp. Trazas desactivadas.")
+            return None
+        return OTLPSpanExporter()
+    return None
+
+
+def setup_tracing() -> None:
+    """Configura el proveedor de trazas y la instrumentación HTTP (una vez por proceso)."""
+    exporter = _create_exporter()
+    if exporter is None:
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "ctm-agent")}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    # Instrumentación opcional de las peticiones HTTP salientes
+    try:
+        from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+        HTTPXClientInstrumentor().instrument()
+    except ImportError:
+        pass
+    try:
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+        RequestsInstrumentor().instrument()
+    except ImportError:
+        pass
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Abre un span por ejecución del grafo, por nodo y por llamada al LLM."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._spans: Dict[UUID, trace.Span] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+
+    def _parent_context(self, parent_run_id: Optional[UUID]):
+        """Contexto del span del ancestro más cercano que tenga uno."""
+        while parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return trace.set_span_in_context(self._spans[parent_run_id])
+            parent_run_id = self._parents.get(parent_run_id)
+        return None
+
+    def _start(self, name: str, run_id: UUID, parent_run_id: Optional[UUID], metadata: dict,
+               parent_context=None) -> None:
+        # El padre se pasa explícitamente: los callbacks de inicio y fin pueden correr
+        # en contextos distintos, así que no se toca el contexto actual (attach/detach)
+        span = tracer.start_span(name, context=parent_context or self._parent_context(parent_run_id))
+        if metadata.get("thread_id"):
+            span.set_attribute("thread_id", str(metadata["thread_id"]))
+        if metadata.get("langgraph_node"):
+            span.set_attribute("langgraph.node", metadata["langgraph_node"])
+        self._spans[run_id] = span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        self._parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        if error is not None and type(error).__name__ not in ("GraphInterrupt", "NodeInterrupt"):
+            span.record_exception(error)
+            span.set_status(Status(StatusCode.ERROR))
+        span.end()
+
+    def current_context(self):
+        """
+        Contexto del span del nodo que está ejecutando el código que llama, o
+        None fuera del grafo. Lo usan los spans que se abren dentro de un nodo
+        (`track_external`) para colgar de él.
+        """
+        try:
+            callbacks = get_config().get("callbacks")
+        except RuntimeError:
+            return None
+        # Dentro de un nodo, el gestor de callbacks hijo apunta a la ejecución del nodo
+        return self._parent_context(getattr(callbacks, "parent_run_id", None))
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       metadata=None, **kwargs) -> None:
+        metadata = metadata or {}
+        self._parents[run_id] = parent_run_id
+        node = metadata.get("langgraph_node")
+        if parent_run_id is None:
+            # Raíz de la ejecución: continúa la traza del gateway si trae 'traceparent'
+            carrier = {"traceparent": metadata["traceparent"]} if metadata.get("traceparent") else {}
+            self._start("agent.run", run_id, None, metadata, parent_context=extract(carrier) if carrier else None)
+        elif node and kwargs.get("name") == node:
+            self._start(f"node {node}", run_id, parent_run_id, metadata)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            metadata=None, **kwargs) -> None:
+        self._parents[run_id] = parent_run_id
+        self._start("llm", run_id, parent_run_id, metadata or {})
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        if run_id in self._spans:
+            usage = {}
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+            span = self._spans[run_id]
+            span.set_attribute("llm.input_tokens", usage.get("input_tokens", 0))
+            span.set_attribute("llm.output_tokens", usage.get("output_tokens", 0))
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, error)
+
+
+setup_tracing()
+tracing_callback = TracingCallbackHandler()
@@ -0,0 +1,19 @@
+# src/agent/webapp.py
+
+"""
+Rutas HTTP propias que el servidor de LangGraph monta junto a su API
+(clave "http.app" de langgraph.json).
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+
+async def metrics(request):
+    """Métricas Prometheus del agente (ver agent/metrics.py)."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+app = Starlette(routes=[Route("/metrics", metrics)])
@@ -0,0 +1 @@
+"""Offline end-to-end benchmarks of the agent graph (fake LLM and search backends)."""
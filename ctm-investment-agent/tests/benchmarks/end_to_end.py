@@ -0,0 +1,194 @@
+"""End-to-end benchmark of the compiled graph against local fakes.
+
+Runs one project through the whole flow (ingestion -> state-of-the-art report
+-> chat -> funding search -> selection -> specific report -> end) with the
+fakes in `tests.benchmarks.fakes`, answering every interrupt from a script.
+Reports, as JSON:
+
+- per-node wall time and number of runs,
+- LLM calls and approximate prompt tokens (characters / 4), total, per call
+  and per node,
+- checkpoints written and their serialized bytes (checkpoints + pending writes).
+
+Save one JSON per commit and compare them with ``--compare``.
+
+Usage:
+    python -m tests.benchmarks.end_to_end --output bench.json
+    python -m tests.benchmarks.end_to_end --eager --llm-latency 0.2 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+from tests.benchmarks.fakes import Latency, install
+
+PROJECT = {
+    "project_title": "AUV para inspección de cascos",
+    "project_description": "Vehículo submarino autónomo con sonar y visión para inspeccionar cascos de buques en puerto.",
+}
+
+# Respuestas a las interrupciones, en orden de aparición por tipo
+CHAT_SCRIPT = [
+    "Busca nuevas oportunidades de financiación",
+    "Genera el reporte de la oportunidad 0",
+    "Genera los reportes de todas las seleccionadas",
+    "Busca más papers para el estado del arte",
+    "Terminar",
+]
+SELECTION_SCRIPT = [[0, 1]]
+
+
+class MetricsHandler(BaseCallbackHandler):
+    """Collects per-node wall time and LLM usage from the run's callbacks."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.started: Dict[Any, tuple] = {}
+        self.nodes: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"runs": 0, "wall_s": 0.0, "llm_calls": 0, "prompt_tokens": 0}
+        )
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self.started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id) -> None:
+        if run_id in self.started:
+            node, start = self.started.pop(run_id)
+            self.nodes[node]["runs"] += 1
+            self.nodes[node]["wall_s"] += time.perf_counter() - start
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        # Incluye GraphInterrupt: el tiempo hasta la pausa cuenta para el nodo
+        self._finish(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        chars = sum(len(str(message.content)) for batch in messages for message in batch)
+        self.nodes[node]["llm_calls"] += 1
+        self.nodes[node]["prompt_tokens"] += chars // 4
+
+
+class MeasuringSaver(InMemorySaver):
+    """In-memory checkpointer that counts what it would persist."""
+
+    checkpoints = 0
+    bytes_written = 0
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self.checkpoints += 1
+        self.bytes_written += len(self.serde.dumps_typed(checkpoint)[1])
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, *args, **kwargs):
+        self.bytes_written += sum(len(self.serde.dumps_typed(value)[1]) for _, value in writes)
+        return super().put_writes(config, writes, task_id, *args, **kwargs)
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    from agent.graph import build_graph
+
+    latency = Latency(llm=args.llm_latency, search=args.search_latency, papers=args.paper_latency)
+    with tempfile.TemporaryDirectory() as reports_dir:
+        install(latency, reports_dir)
+        saver = MeasuringSaver()
+        graph = build_graph(eager=args.eager, checkpointer=saver)
+        metrics = MetricsHandler()
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}, "callbacks": [metrics]}
+
+        chat_inputs, selections = deque(CHAT_SCRIPT), deque(SELECTION_SCRIPT)
+        payload: Any = dict(PROJECT)
+        interrupts = 0
+        start = time.perf_counter()
+        while True:
+            await graph.ainvoke(payload, config)
+            snapshot = await graph.aget_state(config)
+            pending = [item for task in snapshot.tasks for item in task.interrupts]
+            if not pending:
+                break
+            interrupts += 1
+            if "opportunities" in pending[0].value:
+                payload = Command(resume=selections.popleft() if selections else "all")
+            elif chat_inputs:
+                payload = Command(resume=chat_inputs.popleft())
+            else:
+                break
+        wall_time = time.perf_counter() - start
+
+    nodes = {name: {**values, "wall_s": round(values["wall_s"], 4)} for name, values in sorted(metrics.nodes.items())}
+    llm_calls = sum(node["llm_calls"] for node in nodes.values())
+    prompt_tokens = sum(node["prompt_tokens"] for node in nodes.values())
+    return {
+        "commit": current_commit(),
+        "mode": "eager" if args.eager else "linear",
+        "latency": vars(latency),
+        "wall_time_s": round(wall_time, 4),
+        "interrupts": interrupts,
+        "llm_calls": llm_calls,
+        "prompt_tokens": prompt_tokens,
+        "prompt_tokens_per_call": round(prompt_tokens / llm_calls, 1) if llm_calls else 0,
+        "checkpoints": saver.checkpoints,
+        "checkpoint_bytes": saver.bytes_written,
+        "nodes": nodes,
+    }
+
+
+def print_comparison(baseline: dict, result: dict) -> None:
+    print(f"{'métrica':<40} {baseline['commit']:>12} {result['commit']:>12} {'Δ %':>8}")
+
+    def row(label: str, before: float, after: float) -> None:
+        delta = f"{(after - before) / before * 100:+.1f}" if before else "-"
+        print(f"{label:<40} {before:>12} {after:>12} {delta:>8}")
+
+    for key in ("wall_time_s", "llm_calls", "prompt_tokens", "prompt_tokens_per_call", "checkpoints", "checkpoint_bytes"):
+        row(key, baseline.get(key, 0), result[key])
+    for node in sorted(set(baseline["nodes"]) | set(result["nodes"])):
+        before = baseline["nodes"].get(node, {}).get("wall_s", 0)
+        after = result["nodes"].get(node, {}).get("wall_s", 0)
+        row(f"{node} (wall_s)", before, after)
+
+
+async def main(args: argparse.Namespace) -> None:
+    result = await run_benchmark(args)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), result)
+    elif not args.output:
+        print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eager", action="store_true", help="Usa el grafo en modo eager.")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--paper-latency", type=float, default=0.02)
+    parser.add_argument("--output", help="Fichero donde guardar el JSON de resultados.")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior con el que comparar.")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,264 @@
+"""Deterministic local fakes for the agent's external services.
+
+Every fake sleeps a configurable latency and answers from a hash of its input,
+so the same scenario always produces the same queries, results and
+opportunities. `install()` patches them into the agent modules.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import RunnableLambda
+from pydantic import ValidationError
+
+from agent.academic import AcademicPaper
+
+
+@dataclass
+class Latency:
+    """Injected latency (seconds) per backend."""
+
+    llm: float = 0.05
+    search: float = 0.02
+    papers: float = 0.02
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha1(text.encode()).hexdigest()[:8], 16)
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+def _last_user_text(messages: List[BaseMessage]) -> str:
+    return str(messages[-1].content) if messages else ""
+
+
+def chat_decision(question: str) -> dict:
+    """Maps a scripted user input to the decision the chat dispatcher would make."""
+    text = question.lower()
+    index = re.search(r"\d+", text)
+    if "financ" in text:
+        return {"response": "Buscando financiación.", "action": "find_funding", "target_index": None}
+    if "papers" in text or "amplía" in text:
+        return {"response": "Ampliando la investigación.", "action": "update_research", "target_index": None}
+    if "todas" in text:
+        return {"response": "Generando todos los reportes.", "action": "batch_reports", "target_index": None}
+    if "reporte" in text or "analiza" in text:
+        return {"response": "Generando reporte.", "action": "specific_report",
+                "target_index": int(index.group()) if index else 0}
+    if "termin" in text or "salir" in text:
+        return {"response": "Hasta luego.", "action": "end", "target_index": None}
+    return {"response": "De acuerdo.", "action": "continue", "target_index": None}
+
+
+def fake_answer(messages: List[BaseMessage], schema_name: str = None) -> str:
+    """Answers each agent prompt with the structured output schema it asks for."""
+    user_text = _last_user_text(messages)
+    seed = _digest(user_text)
+
+    if schema_name == "QueryList":
+        return json.dumps({"queries": [
+            {"idea": f"idea {i}", "international_query": f"funding grants topic {seed % 97} {i}",
+             "national_query": f"convocatoria financiación tema {seed % 97} {i}"}
+            for i in range(5)
+        ]})
+    if schema_name == "ScrutinyResult":
+        category = "Direct Funding Opportunity" if seed % 3 else "Not Relevant"
+        return json.dumps({"relevance_category": category, "justification": "Fake scrutiny."})
+    if schema_name == "FundingOpportunityList":
+        return json.dumps({"opportunities": [{
+            "origin": f"Fondo {seed % 1000}",
+            "description": f"Convocatoria simulada {seed}",
+            "financing_type": "grant",
+            "main_requirements": ["Requisito A", "Requisito B"],
+            "application_deadline": "2030-01-01",
+            "opportunity_url": f"https://funding.example/{seed}",
+        }]})
+    if schema_name == "FundingOpportunity":
+        return json.dumps({
+            "origin": f"Fondo {seed % 1000}",
+            "description": f"Convocatoria refinada {seed}",
+            "financing_type": "grant",
+            "main_requirements": ["Requisito A", "Requisito B", "Requisito C"],
+            "application_deadline": "2030-01-01",
+            "opportunity_url": f"https://funding.example/{seed}",
+        })
+    if schema_name == "ChatDecision":
+        return json.dumps(chat_decision(user_text))
+    if schema_name == "PaperDigestList":
+        indices = re.findall(r"^\[(\d+)\] ", user_text, flags=re.MULTILINE)
+        return json.dumps({"digests": [
+            {"index": int(i), "summary": f"Resumen condensado simulado {seed % 97}-{i}."} for i in indices
+        ]})
+    if schema_name == "ReportSections":
+        section_ids = re.findall(r"^\s*- (\d\.\d)\. \*\*", user_text, flags=re.MULTILINE)
+        indices = [int(i) for i in re.findall(r"^\[(\d+)\] ", user_text, flags=re.MULTILINE)]
+        return json.dumps({"sections": [
+            {"id": section_id, "content": f"Sección {section_id} simulada. " * 20, "paper_indices": indices[:3]}
+            for section_id in section_ids
+        ]})
+    if schema_name == "AffectedSections":
+        return json.dumps({"section_ids": ["2.1", "2.2"] if seed % 2 else ["2.1"]})
+    if schema_name == "AcademicQueries":
+        return json.dumps({"queries": [f"academic topic {seed % 97} aspect {i}" for i in range(3)]})
+    return "## Reporte simulado\n\n" + "Contenido del reporte generado sin LLM. " * 40
+
+
+def _fake_result(messages: List[BaseMessage], schema_name: str = None) -> ChatResult:
+    content = fake_answer(messages, schema_name)
+    # Approximate usage (characters / 4) so token counters see something
+    input_tokens = len(_prompt_text(messages)) // 4
+    output_tokens = len(content) // 4
+    message = AIMessage(content=content, usage_metadata={
+        "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens,
+    })
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeChatModel(BaseChatModel):
+    """Stands in for Gemini: schema-aware canned answers after `latency` seconds."""
+
+    latency: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        def parse(message: AIMessage):
+            try:
+                parsed, error = schema.model_validate_json(message.content), None
+            except ValidationError as e:
+                parsed, error = None, e
+            if include_raw:
+                return {"raw": message, "parsed": parsed, "parsing_error": error}
+            return parsed
+
+        return self.bind(schema_name=schema.__name__) | RunnableLambda(parse)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, schema_name=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return _fake_result(messages, schema_name)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, schema_name=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return _fake_result(messages, schema_name)
+
+
+class FakeTavilyClient:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def search(self, query: str, max_results: int = 2, **kwargs) -> dict:
+        await asyncio.sleep(self.latency)
+        seed = _digest(query)
+        return {"results": [
+            {"title": f"Convocatoria {seed % 1000}-{i}", "url": f"https://tavily.example/{seed}/{i}",
+             "content": f"Resultado simulado para '{query}'.", "score": 0.9 - i * 0.1}
+            for i in range(max_results)
+        ]}
+
+
+class FakeBraveSearch:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def arun(self, query: str) -> str:
+        await asyncio.sleep(self.latency)
+        return json.dumps([{"title": f"Brave {query[:20]}", "link": f"https://brave.example/{_digest(query)}"}])
+
+
+class FakeWebLoader:
+    latency = 0.02
+
+    def __init__(self, url: str, **kwargs: Any):
+        self.url = url
+
+    def load(self) -> List[Document]:
+        time.sleep(self.latency)
+        return [Document(page_content=f"Página simulada de {self.url}. Requisitos, fechas y montos de la convocatoria.")]
+
+
+class _FakeAcademicClient:
+    latency = 0.02
+
+    def __init__(self, **kwargs: Any):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+
+class FakeArxivClient(_FakeAcademicClient):
+    async def search(self, query: str, limit: int) -> List[AcademicPaper]:
+        await asyncio.sleep(self.latency)
+        seed = _digest(query)
+        return [
+            AcademicPaper(source="Arxiv", title=f"arXiv paper {seed % 1000}-{i}", abstract=f"Abstract arXiv {seed}-{i}.",
+                          url=f"https://arxiv.org/pdf/{seed}.{i}", arxiv_id=f"{seed}.{i}")
+            for i in range(limit)
+        ]
+
+
+class FakeSemanticScholarClient(_FakeAcademicClient):
+    async def search(self, query: str, limit: int) -> List[AcademicPaper]:
+        await asyncio.sleep(self.latency)
+        seed = _digest(query)
+        return [
+            AcademicPaper(source="Semantic Scholar", title=f"S2 paper {seed % 1000}-{i}", abstract="Abstract.",
+                          url=f"https://s2.example/{seed}/{i}", semantic_scholar_id=f"{seed}{i}", citation_count=i)
+            for i in range(limit)
+        ]
+
+    async def enrich(self, papers: List[AcademicPaper]) -> List[AcademicPaper]:
+        await asyncio.sleep(self.latency)
+        return [paper if paper.citation_count is not None else paper.model_copy(update={"citation_count": 0})
+                for paper in papers]
+
+
+def install(latency: Latency, reports_dir: str) -> FakeChatModel:
+    """
+    Replaces the LLM, search and paper backends in the agent modules with the
+    fakes above (the prefetch's web loader included), lifts the search rate
+    limit, disables the similarity index and keeps the budget counters in memory.
+    Returns the fake LLM.
+    """
+    import agent.nodes.analysis as analysis
+    import agent.nodes.chat as chat
+    import agent.nodes.research as research
+    import agent.nodes.storage as storage
+    import agent.similarity as similarity
+    import agent.budget as budget
+    import agent.prefetch as prefetch
+
+    model = FakeChatModel(latency=latency.llm)
+    for module in (analysis, chat, research, prefetch):
+        module.get_llm = lambda cheap=False: model
+
+    research.create_search_clients = lambda: (FakeTavilyClient(latency.search), FakeBraveSearch(latency.search))
+    research.SEARCH_RATE_LIMITER = InMemoryRateLimiter(requests_per_second=1000, check_every_n_seconds=0.001)
+
+    _FakeAcademicClient.latency = latency.papers
+    analysis.ArxivClient = FakeArxivClient
+    analysis.SemanticScholarClient = FakeSemanticScholarClient
+    FakeWebLoader.latency = latency.search
+    prefetch.WebBaseLoader = FakeWebLoader
+
+    storage.REPORTS_DIR = reports_dir
+    similarity._unavailable = True
+    budget._counters = budget._MemoryCounters()
+    return model
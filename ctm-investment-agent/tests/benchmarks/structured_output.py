@@ -0,0 +1,210 @@
+"""Before/after benchmark of native structured output against the real LLM.
+
+Runs the agent's structured LLM calls (funding queries, scrutiny, extraction
+and academic queries) on a fixed set of inputs in two modes:
+
+- ``native``: the nodes as they are, with ``structured_output`` (the model is
+  constrained to the schema).
+- ``legacy``: the same nodes, but the LLM is wrapped so that it behaves like
+  the old ``JsonOutputParser`` chains: the schema's format instructions are
+  appended to the system prompt and the free-text answer is parsed.
+
+Reports, per call site and mode, LLM calls, prompt and completion tokens per
+call (from the provider's usage metadata) and the parse-failure rate. Retries
+triggered by parse failures count as extra calls, as in production.
+
+Needs GEMINI_API_KEY; it spends real tokens.
+
+Usage:
+    python -m tests.benchmarks.structured_output --repeat 3 --output structured.json
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import RunnableLambda
+from pydantic import ValidationError
+
+PROJECTS = [
+    {
+        "project_title": "AUV para inspección de cascos",
+        "project_description": "Vehículo submarino autónomo con sonar y visión para inspeccionar cascos de buques en puerto.",
+    },
+    {
+        "project_title": "Sensores IoT para cultivos de café",
+        "project_description": "Red de sensores de humedad y temperatura con predicción de riego para pequeños caficultores en Colombia.",
+    },
+]
+
+SEARCH_RESULTS = [
+    {
+        "title": "Convocatoria 950 de 2025: Proyectos de I+D+i en tecnologías marinas",
+        "url": "https://minciencias.gov.co/convocatorias/950",
+        "content": "Minciencias abre la convocatoria para financiar proyectos de investigación y desarrollo tecnológico "
+                   "en tecnologías marinas y oceánicas. Monto máximo: 800 millones COP. Cierre: 30 de junio de 2030. "
+                   "Pueden participar universidades y empresas con grupos reconocidos.",
+    },
+    {
+        "title": "Horizon Europe - Cluster 6 calls",
+        "url": "https://ec.europa.eu/info/funding-tenders/cluster6",
+        "content": "List of open calls for proposals in food, bioeconomy, natural resources, agriculture and environment. "
+                   "Several topics accept international consortia with partners from Latin America.",
+    },
+    {
+        "title": "Drones submarinos: la nueva frontera de la inspección naval",
+        "url": "https://noticias.example/drones-submarinos",
+        "content": "Un reportaje sobre cómo los vehículos autónomos están cambiando el mantenimiento de buques.",
+    },
+]
+
+
+class UsageHandler(BaseCallbackHandler):
+    """Counts LLM calls and provider-reported tokens."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.calls += 1
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.prompt_tokens += usage.get("input_tokens", 0)
+                self.completion_tokens += usage.get("output_tokens", 0)
+
+
+class LegacyJsonLLM:
+    """
+    Wraps a chat model so that ``with_structured_output`` reproduces the old
+    chains: format instructions in the system prompt and JsonOutputParser on
+    the free-text answer.
+    """
+
+    def __init__(self, llm) -> None:
+        self.llm = llm
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        parser = JsonOutputParser(pydantic_object=schema)
+
+        def add_instructions(prompt_value):
+            messages = prompt_value.to_messages()
+            messages[0] = SystemMessage(f"{messages[0].content}\n\n{parser.get_format_instructions()}")
+            return messages
+
+        def parse(message):
+            try:
+                parsed, error = schema.model_validate(parser.parse(message.content)), None
+            except (OutputParserException, ValidationError) as e:
+                parsed, error = None, e
+            if include_raw:
+                return {"raw": message, "parsed": parsed, "parsing_error": error}
+            return parsed
+
+        return RunnableLambda(add_instructions) | self.llm | RunnableLambda(parse)
+
+
+def parse_failures() -> float:
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value("agent_llm_parse_failures_total", {"node": "unknown"}) or 0
+
+
+async def run_site(name: str, call, llm, base_llm, repeat: int) -> Dict[str, float]:
+    """Runs one call site `repeat` times per input and returns its usage."""
+    usage = UsageHandler()
+    # Los callbacks del propio modelo ven todas sus llamadas, también las internas de los nodos
+    base_llm.callbacks = [usage]
+    failures_before = parse_failures()
+    errors = 0
+    for _ in range(repeat):
+        try:
+            await call(llm)
+        except Exception as e:
+            # Agotados los reintentos: el resultado se habría perdido
+            print(f"   {name}: {type(e).__name__}: {e}")
+            errors += 1
+    failures = parse_failures() - failures_before
+    calls = usage.calls or 1
+    return {
+        "llm_calls": usage.calls,
+        "prompt_tokens_per_call": round(usage.prompt_tokens / calls, 1),
+        "completion_tokens_per_call": round(usage.completion_tokens / calls, 1),
+        "parse_failures": int(failures),
+        "parse_failure_rate": round(failures / calls, 4),
+        "lost_results": errors,
+    }
+
+
+def call_sites():
+    """(name, coroutine factory taking an llm) for every structured call of the nodes."""
+    import agent.nodes.analysis as analysis
+    from agent.nodes.research import (
+        create_extraction_chain, create_scrutiny_chain, extract_from_single_source,
+        generate_funding_search_queries, scrutinize_single_result,
+    )
+
+    async def funding_queries(llm):
+        for project in PROJECTS:
+            details = f"Título: {project['project_title']}\nDescripción: {project['project_description']}"
+            if not await generate_funding_search_queries(details, llm):
+                raise OutputParserException("sin queries")
+
+    async def scrutiny(llm):
+        chain = create_scrutiny_chain(llm)
+        for result in SEARCH_RESULTS:
+            await scrutinize_single_result(result, chain)
+
+    async def extraction(llm):
+        chain = create_extraction_chain(llm)
+        for result in SEARCH_RESULTS[:2]:
+            await extract_from_single_source(result, chain)
+
+    async def academic_queries(llm):
+        analysis.get_llm = lambda cheap=False: llm
+        for project in PROJECTS:
+            result = await analysis.generate_academic_queries_node(dict(project))
+            if not result["academic_queries"]:
+                raise OutputParserException("sin queries")
+
+    return [
+        ("funding_queries", funding_queries),
+        ("scrutiny", scrutiny),
+        ("extraction", extraction),
+        ("academic_queries", academic_queries),
+    ]
+
+
+async def main(args: argparse.Namespace) -> None:
+    from agent.config import get_llm
+
+    base_llm = get_llm()
+    results: Dict[str, Dict[str, dict]] = defaultdict(dict)
+    for name, call in call_sites():
+        for mode, llm in (("legacy", LegacyJsonLLM(base_llm)), ("native", base_llm)):
+            print(f"-> {name} ({mode})")
+            results[name][mode] = await run_site(name, call, llm, base_llm, args.repeat)
+
+    print(f"\n{'llamada':<18} {'modo':<8} {'llamadas':>9} {'prompt/ll':>10} {'compl/ll':>9} {'fallos %':>9}")
+    for name, modes in results.items():
+        for mode, values in modes.items():
+            print(f"{name:<18} {mode:<8} {values['llm_calls']:>9} {values['prompt_tokens_per_call']:>10} "
+                  f"{values['completion_tokens_per_call']:>9} {values['parse_failure_rate'] * 100:>8.1f}%")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones de cada llamada por entrada.")
+    parser.add_argument("--output", help="Fichero donde guardar el JSON de resultados.")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1 @@
+"""Load tests that measure how the graph behaves under concurrent threads."""
@@ -0,0 +1,114 @@
+"""How many concurrent threads one agent worker sustains.
+
+Drives N threads at once through the chat loop (`chat_responder` interrupt ->
+resume -> LLM -> interrupt) inside a single event loop, with a fake LLM that
+takes `--latency` seconds per call. Two modes are compared:
+
+- ``blocking``: the LLM call occupies a thread of a bounded pool, as the old
+  synchronous nodes did (LangGraph runs sync nodes in an executor).
+- ``async``: the LLM call is awaited (`ainvoke`), as the current nodes do.
+
+A thread count is "sustained" while the p95 turn latency stays under
+``--slo`` times the LLM latency.
+
+Usage:
+    python -m tests.load_tests.thread_concurrency --threads 1 8 32 64 128
+"""
+import argparse
+import asyncio
+import functools
+import os
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+import agent.nodes.chat as chat_nodes
+from agent.graph import build_graph
+from tests.benchmarks.fakes import FakeChatModel
+
+# Mismo tamaño que el executor por defecto de asyncio (donde corren los nodos síncronos)
+DEFAULT_WORKER_THREADS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class SlowFakeChatModel(FakeChatModel):
+    """The benchmark fake LLM (it also answers the chat node's structured
+    `ChatDecision`); with an executor, each call occupies one of its threads."""
+
+    executor: Optional[Any] = None
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.executor is None:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        generate = functools.partial(self._generate, messages, stop, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, generate)
+
+
+async def run_thread(graph, turns: int) -> List[float]:
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph.aupdate_state(
+        config,
+        {"project_title": "Load test", "project_description": "Load test"},
+        as_node="save_report_as_pdf",
+    )
+    await graph.ainvoke(None, config)  # Llega a la interrupción de chat_responder
+
+    latencies = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        await graph.ainvoke(Command(resume=f"pregunta {turn}"), config)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def measure(mode: str, threads: int, turns: int, latency: float, worker_threads: int) -> dict:
+    executor = ThreadPoolExecutor(max_workers=worker_threads) if mode == "blocking" else None
+    model = SlowFakeChatModel(latency=latency, executor=executor)
+    chat_nodes.get_llm = lambda cheap=False: model
+
+    graph = build_graph(checkpointer=InMemorySaver())
+    start = time.perf_counter()
+    results = await asyncio.gather(*[run_thread(graph, turns) for _ in range(threads)])
+    elapsed = time.perf_counter() - start
+    if executor:
+        executor.shutdown()
+
+    latencies = sorted(lat for thread in results for lat in thread)
+    return {
+        "mode": mode,
+        "threads": threads,
+        "turns_per_s": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(f"{'modo':<9} {'hilos':>6} {'turnos/s':>9} {'p50 (s)':>8} {'p95 (s)':>8}")
+    sustained = {}
+    for mode in ("blocking", "async"):
+        for threads in args.threads:
+            row = await measure(mode, threads, args.turns, args.latency, args.worker_threads)
+            print(f"{row['mode']:<9} {row['threads']:>6} {row['turns_per_s']:>9.1f} {row['p50']:>8.2f} {row['p95']:>8.2f}")
+            if row["p95"] <= args.slo * args.latency:
+                sustained[mode] = threads
+
+    print()
+    for mode in ("blocking", "async"):
+        print(f"{mode}: sostiene {sustained.get(mode, 0)} hilos concurrentes (p95 <= {args.slo} x latencia LLM)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32, 64, 128])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--slo", type=float, default=2.0)
+    parser.add_argument("--worker-threads", type=int, default=DEFAULT_WORKER_THREADS)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from agent.academic import SEMANTIC_SCHOLAR_FIELDS, ArxivClient, SemanticScholarClient
+
+S2_PAPERS = [
+    {"paperId": f"p{i}", "title": f"Paper {i}", "abstract": f"Abstract {i}", "year": 2020 + i,
+     "venue": "ICRA", "citationCount": i, "externalIds": {"DOI": f"10.1/{i}"}}
+    for i in range(5)
+]
+
+ARXIV_FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <entry>
+    <id>http://arxiv.org/abs/2101.00001v2</id>
+    <published>2021-01-01T00:00:00Z</published>
+    <title>Autonomous
+      Hull Inspection</title>
+    <summary>  Underwater drones inspect hulls.  </summary>
+  </entry>
+</feed>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like the Semantic Scholar Graph API and the arXiv API."""
+
+    requests = []
+
+    def _reply(self, body: str, content_type: str = "application/json") -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append(("GET", url.path, params))
+        if url.path == "/graph/v1/paper/search":
+            offset, limit = int(params["offset"]), int(params["limit"])
+            end = offset + limit
+            body = {"total": len(S2_PAPERS), "offset": offset, "data": S2_PAPERS[offset:end]}
+            if end < len(S2_PAPERS):
+                body["next"] = end
+            self._reply(json.dumps(body))
+        elif url.path == "/arxiv/query":
+            self._reply(ARXIV_FEED, "application/atom+xml")
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        ids = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["ids"]
+        self.requests.append(("POST", url.path, ids))
+        known = {"ARXIV:2101.00001": {**S2_PAPERS[0], "paperId": "arxiv-match", "citationCount": 42}}
+        self._reply(json.dumps([known.get(paper_id) for paper_id in ids]))
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_semantic_scholar_search_paginates_with_projected_fields(stub_server) -> None:
+    async def scenario():
+        async with SemanticScholarClient(f"{stub_server}/graph/v1", page_size=2) as client:
+            return await client.search("hull inspection", limit=4)
+
+    papers = asyncio.run(scenario())
+    assert [paper.title for paper in papers] == ["Paper 0", "Paper 1", "Paper 2", "Paper 3"]
+    assert papers[1].citation_count == 1 and papers[1].doi == "10.1/1"
+    assert papers[0].to_paper()["content"] == "Abstract 0"
+    assert [params["offset"] for _, _, params in StubHandler.requests] == ["0", "2"]
+    assert all(params["fields"] == SEMANTIC_SCHOLAR_FIELDS for _, _, params in StubHandler.requests)
+
+
+def test_arxiv_papers_are_enriched_with_one_batch_lookup(stub_server) -> None:
+    async def scenario():
+        async with ArxivClient(f"{stub_server}/arxiv") as arxiv, \
+                SemanticScholarClient(f"{stub_server}/graph/v1") as semantic_scholar:
+            return await semantic_scholar.enrich(await arxiv.search("hull inspection", limit=3))
+
+    [paper] = asyncio.run(scenario())
+    assert paper.title == "Autonomous Hull Inspection"
+    assert paper.abstract == "Underwater drones inspect hulls."
+    assert paper.url == "https://arxiv.org/pdf/2101.00001v2"
+    assert paper.year == 2021 and paper.arxiv_id == "2101.00001"
+    assert paper.citation_count == 42 and paper.venue == "ICRA"
+    assert ("POST", "/graph/v1/paper/batch", ["ARXIV:2101.00001"]) in StubHandler.requests
@@ -0,0 +1,20 @@
+import asyncio
+
+import agent.budget as budget
+
+
+def test_try_consume_rolls_back_when_any_budget_is_exceeded(monkeypatch) -> None:
+    monkeypatch.setattr(budget, "_counters", budget._MemoryCounters())
+    monkeypatch.setattr(budget, "_scope", lambda: ("thread-1", "user-1"))
+    monkeypatch.setitem(budget.THREAD_BUDGETS, "search_calls", 5)
+    monkeypatch.setitem(budget.USER_DAILY_BUDGETS, "search_calls", 2)
+
+    async def scenario():
+        consumed = [await budget.try_consume("search_calls") for _ in range(3)]
+        return consumed, await budget.remaining()
+
+    consumed, left = asyncio.run(scenario())
+    assert consumed == [True, True, False]
+    # El intento rechazado no cuenta en el presupuesto del hilo
+    assert left["search_calls"] == 0
+    assert budget._counters._values["budget:thread:thread-1:search_calls"] == 2
@@ -0,0 +1,35 @@
+import asyncio
+
+import agent.cancellation as cancellation
+
+
+def test_cancel_aborts_the_call_in_flight_and_returns_default(monkeypatch) -> None:
+    monkeypatch.setattr(cancellation, "_redis", None)
+    monkeypatch.setattr(cancellation, "_cancelled", set())
+    monkeypatch.setattr(cancellation, "CANCEL_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(cancellation, "_cancel_key", lambda: "run-1")
+    aborted = []
+
+    async def slow_llm_call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            aborted.append(True)
+            raise
+        return ["resultado"]
+
+    async def scenario():
+        asyncio.get_running_loop().call_later(0.05, lambda: cancellation._cancelled.add("run-1"))
+        return await asyncio.wait_for(cancellation.run_cancellable(slow_llm_call(), []), 1)
+
+    assert asyncio.run(scenario()) == []
+    assert aborted == [True]
+
+
+def test_without_cancel_key_the_work_runs_normally(monkeypatch) -> None:
+    monkeypatch.setattr(cancellation, "_cancel_key", lambda: None)
+
+    async def work():
+        return 42
+
+    assert asyncio.run(cancellation.run_cancellable(work(), 0)) == 42
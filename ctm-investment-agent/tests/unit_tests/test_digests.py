@@ -0,0 +1,23 @@
+from agent.digests import format_paper_context, paper_key, pending_papers
+
+PAPERS = [
+    {"title": "Sonar Fusion ", "source": "Arxiv", "url": "https://arxiv.org/pdf/1", "content": "A" * 1000},
+    {"title": "Hull Inspection", "source": "Semantic Scholar", "url": "https://s2.example/2", "content": "Short."},
+]
+
+
+def test_only_papers_without_digest_are_pending() -> None:
+    digests = {paper_key(PAPERS[0]): "Fusiona sonar y visión."}
+    assert pending_papers(PAPERS, digests) == [PAPERS[1]]
+    assert paper_key({"title": "  Sonar FUSION"}) == "sonar fusion"
+
+
+def test_context_uses_synthesis_digests_and_abstract_fallback() -> None:
+    digests = {paper_key(PAPERS[0]): "Fusiona sonar y visión."}
+    context = format_paper_context(PAPERS, digests, "Dos líneas temáticas.", with_url=True)
+    assert context.startswith("Síntesis de la investigación:\nDos líneas temáticas.")
+    assert "Fusiona sonar y visión." in context
+    # El abstract largo nunca se pega completo: el paper resumido usa su ficha
+    assert "A" * 500 not in context
+    assert "Short." in context
+    assert "URL: https://s2.example/2" in context
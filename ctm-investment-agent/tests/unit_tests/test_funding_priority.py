@@ -0,0 +1,59 @@
+from langgraph.types import Send
+
+from agent.nodes import research
+from agent.nodes.research import route_funding_work
+
+
+def _result(url: str, score: float, category: str = None) -> dict:
+    result = {"title": url, "url": url, "content": "", "score": score}
+    if category:
+        result["relevance_category"] = category
+    return result
+
+
+def test_direct_opportunities_are_extracted_before_more_scrutiny(monkeypatch) -> None:
+    monkeypatch.setattr(research, "FUNDING_PRIORITY_BATCH", 2)
+    state = {
+        "search_results": [_result("a", 0.2), _result("b", 0.9), _result("c", 0.5)],
+        "relevant_results": [
+            _result("a", 0.2, "Funding Source Portal"),
+            _result("b", 0.9, "Direct Funding Opportunity"),
+        ],
+        "processed_sources": ["scrutiny:a", "scrutiny:b"],
+    }
+    sends = route_funding_work(state)
+    assert [(s.node, s.arg["result"]["url"]) for s in sends] == [("extract_source", "b")]
+
+    # Sin directas pendientes, se escruta el siguiente resultado antes que el portal
+    state["processed_sources"].append("extraction:b")
+    sends = route_funding_work(state)
+    assert [(s.node, s.arg["result"]["url"]) for s in sends] == [("scrutinize_result", "c")]
+
+
+def test_stops_once_target_opportunities_are_reached(monkeypatch) -> None:
+    monkeypatch.setattr(research, "FUNDING_TARGET_OPPORTUNITIES", 2)
+    state = {
+        "search_results": [_result("a", 0.9), _result("b", 0.1)],
+        "relevant_results": [],
+        "processed_sources": [],
+        "all_opportunities_history": [{"origin": "Fondo 1", "description": "x"}],
+        "extracted_opportunities": [
+            {"origin": "Fondo 1", "description": "x"},
+            {"origin": "Fondo 2", "description": "y"},
+        ],
+    }
+    # Solo una es nueva: aún no se alcanza el objetivo
+    assert isinstance(route_funding_work(state)[0], Send)
+
+    state["extracted_opportunities"].append({"origin": "Fondo 3", "description": "z"})
+    assert route_funding_work(state) == "extract_opportunities"
+
+
+def test_cancelled_search_goes_straight_to_consolidation() -> None:
+    state = {
+        "search_results": [_result("a", 0.9)],
+        "relevant_results": [_result("b", 0.9, "Direct Funding Opportunity")],
+        "processed_sources": [],
+        "funding_cancelled": True,
+    }
+    assert route_funding_work(state) == "extract_opportunities"
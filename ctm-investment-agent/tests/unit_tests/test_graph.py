@@ -0,0 +1,46 @@
+from typing import Annotated, get_origin, get_type_hints
+
+from agent.graph import FOUNDATION_KEYS, FUNDING_KEYS, _branch_update, build_graph
+from agent.state import ProjectState
+
+
+def test_linear_graph_starts_with_academic_branch() -> None:
+    edges = {(e.source, e.target) for e in build_graph().get_graph().edges}
+    assert ("ingest_info", "generate_academic_queries") in edges
+    assert ("ingest_info", "generate_funding_queries") not in edges
+    assert ("academic_research", "digest_papers") in edges
+    assert ("digest_papers", "generate_state_of_the_art_report") in edges
+
+
+def test_eager_graph_fans_out_and_joins_before_selection() -> None:
+    edges = {(e.source, e.target) for e in build_graph(eager=True).get_graph().edges}
+    assert ("ingest_info", "foundation_research") in edges
+    assert ("ingest_info", "funding_discovery") in edges
+    assert ("foundation_research", "select_opportunities") in edges
+    assert ("funding_discovery", "select_opportunities") in edges
+    assert ("process_selection", "chat_responder") in edges
+
+
+def test_batch_reports_route_back_to_chat() -> None:
+    edges = {(e.source, e.target) for e in build_graph().get_graph().edges}
+    assert ("chat_responder", "generate_batch_reports") in edges
+    assert ("generate_batch_reports", "chat_responder") in edges
+
+
+def test_chat_can_extend_the_research_in_both_modes() -> None:
+    for eager in (False, True):
+        edges = {(e.source, e.target) for e in build_graph(eager=eager).get_graph().edges}
+        assert ("chat_responder", "generate_academic_queries") in edges
+        assert ("generate_state_of_the_art_report", "save_report_as_pdf") in edges
+
+
+def test_eager_branches_do_not_return_reducer_keys() -> None:
+    hints = get_type_hints(ProjectState, include_extras=True)
+    reducer_keys = {key for key, hint in hints.items() if get_origin(hint) is Annotated}
+    assert "search_results" in reducer_keys
+    assert not reducer_keys & set(FOUNDATION_KEYS + FUNDING_KEYS)
+
+    state = {"search_results": [{"url": "a"}], "messages": [{"id": "m1"}]}
+    result = {"search_results": [{"url": "a"}, {"url": "b"}], "search_queries": ["q"],
+              "messages": [{"id": "m1"}, {"id": "m2"}]}
+    assert _branch_update(state, result, FUNDING_KEYS) == {"search_queries": ["q"], "messages": [{"id": "m2"}]}
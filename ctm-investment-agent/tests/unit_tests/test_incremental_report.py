@@ -0,0 +1,88 @@
+import asyncio
+
+import agent.nodes.analysis as analysis
+from agent.nodes.analysis import SOTA_SECTIONS, generate_specific_report, generate_state_of_the_art_report
+from agent.nodes.storage import save_report_as_pdf
+
+
+def _paper(title: str) -> dict:
+    return {"title": title, "source": "Arxiv", "url": f"https://arxiv.org/pdf/{title}", "content": "Abstract."}
+
+
+def _sections(papers_by_section: dict) -> dict:
+    return {
+        section_id: {"content": f"Texto {section_id}", "papers": papers_by_section.get(section_id, ["a"])}
+        for section_id, _, _ in SOTA_SECTIONS
+    }
+
+
+def test_only_sections_affected_by_new_papers_are_rewritten(monkeypatch) -> None:
+    calls = []
+
+    async def fake_write(state, section_ids, papers, llm, current=None):
+        calls.append((section_ids, [p["title"] for p in papers]))
+        return {section_id: {"content": f"Nuevo {section_id}", "papers": ["b"]} for section_id in section_ids}
+
+    async def fake_affected(state, sections, new_papers, llm):
+        return ["2.1"]
+
+    async def budget_ok():
+        return "ok"
+
+    monkeypatch.setattr(analysis, "SOTA_REPORT_MODE", "incremental")
+    monkeypatch.setattr(analysis, "llm_budget_level", budget_ok)
+    monkeypatch.setattr(analysis, "get_llm", lambda cheap=False: None)
+    monkeypatch.setattr(analysis, "_write_sections", fake_write)
+    monkeypatch.setattr(analysis, "_affected_sections", fake_affected)
+
+    state = {
+        "project_title": "AUV", "project_description": "Inspección de cascos",
+        "academic_papers": [_paper("a"), _paper("c"), _paper("b")],
+        "report_sections": _sections({"2.1": ["c"]}),
+        "report_paper_keys": ["a", "c"],
+    }
+    result = asyncio.run(generate_state_of_the_art_report(state))
+
+    # Solo se reescribe 2.1, con los papers que ya la alimentaban más el nuevo
+    assert calls == [(["2.1"], ["c", "b"])]
+    assert result["report_sections"]["2.1"]["content"] == "Nuevo 2.1"
+    assert result["report_sections"]["1.1"]["content"] == "Texto 1.1"
+    assert "### 1.1. Conceptos Fundamentales\nTexto 1.1" in result["improvement_report"]
+    assert result["report_paper_keys"] == ["a", "c", "b"]
+
+
+def test_without_previous_sections_the_whole_report_is_written(monkeypatch) -> None:
+    calls = []
+
+    async def fake_write(state, section_ids, papers, llm, current=None):
+        calls.append(section_ids)
+        return {section_id: {"content": "x", "papers": []} for section_id in section_ids}
+
+    async def budget_ok():
+        return "ok"
+
+    monkeypatch.setattr(analysis, "llm_budget_level", budget_ok)
+    monkeypatch.setattr(analysis, "get_llm", lambda cheap=False: None)
+    monkeypatch.setattr(analysis, "_write_sections", fake_write)
+
+    state = {"project_title": "AUV", "project_description": "x", "academic_papers": [_paper("a")]}
+    asyncio.run(generate_state_of_the_art_report(state))
+    assert calls == [[section_id for section_id, _, _ in SOTA_SECTIONS]]
+
+
+def test_specific_report_without_budget_saves_no_pdf(monkeypatch) -> None:
+    async def budget_exhausted():
+        return "exhausted"
+
+    monkeypatch.setattr(analysis, "llm_budget_level", budget_exhausted)
+
+    # El reporte anterior (el de estado del arte) sigue en el estado
+    state = {
+        "improvement_report": "# Estado del arte", "report_type": "general", "action_input": 0,
+        "all_opportunities_history": [{"origin": "Fondo"}], "report_paths": ["sota.pdf"],
+    }
+    update = asyncio.run(generate_specific_report(state))
+    assert update["improvement_report"] is None
+    assert "presupuesto" in update["messages"][0]["content"]
+    # El borde fijo lleva a 'save_report_as_pdf', que no debe guardar nada
+    assert asyncio.run(save_report_as_pdf({**state, **update})) == {}
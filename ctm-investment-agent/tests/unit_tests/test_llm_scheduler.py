@@ -0,0 +1,45 @@
+import asyncio
+import contextvars
+
+import agent.llm_scheduler as llm_scheduler
+from agent.llm_scheduler import PriorityRateLimiter
+
+_caller = contextvars.ContextVar("caller")
+
+
+def _run_calls(monkeypatch, limiter, callers):
+    """Lanza una llamada por (clase, hilo) en ese orden y devuelve el orden en que pasan."""
+    monkeypatch.setattr(llm_scheduler, "_caller", lambda: (*_caller.get(), 1.0))
+    served = []
+
+    async def call(name, priority, thread_id):
+        _caller.set((priority, thread_id))
+        await limiter.aacquire()
+        served.append(name)
+
+    async def scenario():
+        await asyncio.gather(*(call(f"{p}:{t}:{i}", p, t) for i, (p, t) in enumerate(callers)))
+
+    asyncio.run(scenario())
+    return served
+
+
+def test_interactive_calls_skip_the_bulk_queue(monkeypatch) -> None:
+    limiter = PriorityRateLimiter(requests_per_second=50)
+    served = _run_calls(monkeypatch, limiter, [
+        ("bulk", "a"), ("bulk", "a"), ("report", "b"), ("interactive", "c"),
+    ])
+    assert served == ["interactive:c:3", "report:b:2", "bulk:a:0", "bulk:a:1"]
+
+
+def test_threads_of_the_same_class_take_turns(monkeypatch) -> None:
+    limiter = PriorityRateLimiter(requests_per_second=50)
+    served = _run_calls(monkeypatch, limiter, [("bulk", "a")] * 4 + [("bulk", "b")] * 2)
+    assert [name.split(":")[1] for name in served] == ["a", "b", "a", "b", "a", "a"]
+    assert not limiter._queue and not limiter._last_finish
+
+
+def test_fifo_when_prioritization_is_disabled(monkeypatch) -> None:
+    limiter = PriorityRateLimiter(requests_per_second=50, prioritize=False)
+    served = _run_calls(monkeypatch, limiter, [("bulk", "a"), ("bulk", "a"), ("interactive", "c")])
+    assert served == ["bulk:a:0", "bulk:a:1", "interactive:c:2"]
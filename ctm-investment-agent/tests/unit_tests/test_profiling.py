@@ -0,0 +1,38 @@
+import asyncio
+import json
+import time
+
+import agent.profiling as profiling
+
+
+def _busy(seconds: float) -> int:
+    total, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def test_profiled_node_writes_cpu_and_allocation_reports(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_thread_id", lambda: "hilo-1")
+
+    async def build_report(state):
+        _busy(0.1)
+        await asyncio.sleep(0.1)  # espera: no cuenta como CPU
+        await profiling.to_thread(_busy, 0.1)
+        return {"report": ["x" * 1000 for _ in range(100)]}
+
+    node = profiling.profiled("build_report", build_report)
+    asyncio.run(node({"academic_papers": [{}, {}]}))
+
+    summary = json.loads((tmp_path / "hilo-1" / "summary.json").read_text())["build_report"]
+    assert summary["runs"] == 1
+    assert summary["state_sizes"] == {"academic_papers": 2}
+    assert 0 < summary["sampled_seconds"] < summary["wall_seconds"]
+    assert summary["thread_seconds"] > 0
+
+    folded = (tmp_path / "hilo-1" / "build_report.folded").read_text()
+    assert "build_report;build_report (test_profiling.py" in folded
+    assert "build_report;[thread]" in folded
+    assert (tmp_path / "hilo-1" / "build_report.alloc.txt").exists()
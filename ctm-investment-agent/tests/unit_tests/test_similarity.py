@@ -0,0 +1,59 @@
+import sys
+import types
+
+import agent.similarity as similarity
+from agent.similarity import merge_papers
+
+
+def test_merge_papers_keeps_seeded_copy_and_skips_untitled() -> None:
+    seeded = [{"title": "Sonar Mapping", "source": "Arxiv"}]
+    found = [{"title": "sonar mapping ", "source": "Semantic Scholar"}, {"title": "N/A"}, {"title": "AUV Control"}]
+    merged = merge_papers(seeded, found)
+    assert [p["title"] for p in merged] == ["Sonar Mapping", "AUV Control"]
+    assert merged[0]["source"] == "Arxiv"
+
+
+def test_collection_is_retried_after_a_failed_connection(monkeypatch) -> None:
+    attempts = []
+
+    def http_client(host, port):
+        attempts.append(host)
+        if len(attempts) == 1:
+            raise ConnectionError("chroma is starting")
+        return types.SimpleNamespace(get_or_create_collection=lambda name, **kwargs: name)
+
+    chromadb = types.ModuleType("chromadb")
+    chromadb.HttpClient = http_client
+    embedding_functions = types.ModuleType("chromadb.utils.embedding_functions")
+    embedding_functions.SentenceTransformerEmbeddingFunction = lambda model_name: None
+    monkeypatch.setitem(sys.modules, "chromadb", chromadb)
+    monkeypatch.setitem(sys.modules, "chromadb.utils", types.ModuleType("chromadb.utils"))
+    monkeypatch.setitem(sys.modules, "chromadb.utils.embedding_functions", embedding_functions)
+    monkeypatch.setattr(similarity, "PROJECT_SIMILARITY_ENABLED", True)
+    monkeypatch.setattr(similarity, "_collection", None)
+    monkeypatch.setattr(similarity, "_retry_at", 0.0)
+    clock = [100.0]
+    monkeypatch.setattr(similarity.time, "monotonic", lambda: clock[0])
+
+    assert similarity._get_collection() is None
+    # Dentro de la ventana de espera no se vuelve a conectar
+    assert similarity._get_collection() is None
+    assert len(attempts) == 1
+
+    clock[0] += similarity.PROJECT_SIMILARITY_RETRY_SECONDS
+    assert similarity._get_collection() == similarity.COLLECTION_NAME
+    assert len(attempts) == 2
+
+
+def test_only_the_most_cited_papers_are_indexed(monkeypatch) -> None:
+    monkeypatch.setattr(similarity, "PROJECT_SIMILARITY_MAX_PAPERS", 2)
+    monkeypatch.setattr(similarity, "PROJECT_SIMILARITY_ABSTRACT_CHARS", 5)
+    papers = [
+        {"title": "A", "content": "Abstract A", "citation_count": 1},
+        {"title": "B", "content": "Abstract B", "citation_count": None},
+        {"title": "C", "content": "Abstract C", "citation_count": 7},
+    ]
+    indexed = similarity._indexed_papers(papers)
+    assert [paper["title"] for paper in indexed] == ["C", "A"]
+    assert indexed[0]["content"] == "Abstr"
+    assert papers[2]["content"] == "Abstract C"
@@ -0,0 +1,51 @@
+import asyncio
+
+import agent.singleflight as singleflight
+
+
+def test_concurrent_identical_calls_share_one_call(monkeypatch) -> None:
+    monkeypatch.setattr(singleflight, "_redis", None)
+    calls = []
+
+    async def search(query):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return [{"url": f"https://example.com/{query}"}]
+
+    async def scenario():
+        return await asyncio.gather(
+            *(singleflight.single_flight("search", ("grants",), lambda: search("grants")) for _ in range(3)),
+            singleflight.single_flight("search", ("otra",), lambda: search("otra")),
+        )
+
+    results = asyncio.run(scenario())
+    assert sorted(calls) == ["grants", "otra"]
+    assert results[0] == results[1] == results[2]
+    # Cada seguidor recibe su copia
+    assert results[1] is not results[0]
+    assert not singleflight._inflight and not singleflight._waiters
+
+
+def test_call_is_cancelled_when_nobody_waits_for_it(monkeypatch) -> None:
+    monkeypatch.setattr(singleflight, "_redis", None)
+    cancelled = []
+
+    async def slow_call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        waiters = [asyncio.ensure_future(singleflight.single_flight("page", ("u",), slow_call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled  # todavía la espera el segundo
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
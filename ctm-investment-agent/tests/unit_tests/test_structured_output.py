@@ -0,0 +1,36 @@
+import pytest
+
+from agent.nodes.analysis import AcademicQueries
+from agent.nodes.chat import ChatDecision
+from agent.nodes.research import FundingOpportunityList, QueryList, ScrutinyResult
+
+# Subconjunto de JSON Schema que acepta la salida estructurada de Gemini
+SUPPORTED_KEYS = {"type", "properties", "required", "items", "enum", "description", "title", "default", "anyOf", "$ref", "$defs"}
+
+
+def _walk(schema: dict, defs: dict, path: str):
+    unsupported = set(schema) - SUPPORTED_KEYS
+    assert not unsupported, f"{path}: claves no soportadas {unsupported}"
+    if "$ref" in schema:
+        yield from _walk(defs[schema["$ref"].split("/")[-1]], defs, path)
+        return
+    if "anyOf" in schema:
+        # Solo Optional[X]: una rama con tipo y otra nula
+        branches = [branch for branch in schema["anyOf"] if branch.get("type") != "null"]
+        assert len(branches) == 1, f"{path}: anyOf solo se admite para campos opcionales"
+        yield from _walk(branches[0], defs, path)
+        return
+    yield path, schema
+    for name, prop in schema.get("properties", {}).items():
+        # Sin instrucciones de formato en el prompt, la descripción es lo único que guía al modelo
+        assert prop.get("description"), f"{path}.{name}: falta la descripción"
+        yield from _walk(prop, defs, f"{path}.{name}")
+    if "items" in schema:
+        yield from _walk(schema["items"], defs, f"{path}[]")
+
+
+@pytest.mark.parametrize("model", [QueryList, ScrutinyResult, FundingOpportunityList, AcademicQueries, ChatDecision])
+def test_node_schemas_are_supported_by_structured_output(model) -> None:
+    schema = model.model_json_schema()
+    for path, node in _walk(schema, schema.get("$defs", {}), model.__name__):
+        assert node.get("type") in {"object", "array", "string", "integer", "number", "boolean"}, path